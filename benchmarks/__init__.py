@@ -0,0 +1,5 @@
+"""BENCHMARKS
+
+Synthetic genome-scale inputs for every plot operation and a runner timing
+them stage by stage against a stored baseline, see run.py.
+"""
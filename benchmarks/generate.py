@@ -0,0 +1,270 @@
+"""GENERATE
+
+Deterministic synthetic inputs in every format Chromograph plots, over the
+GRCh37 chromosomes. 'scale' is the fraction of a whole genome sequencing
+sample: record counts of BED files are those of a WGS sample times
+'scale' and WIG tracks cover the first 'scale' of every chromosome.
+Equal arguments write equal bytes.
+
+    $ python -m benchmarks.generate --scale 0.1 --outd /tmp/inputs
+"""
+
+import argparse
+import os
+import numpy
+
+# GRCh37 chromosome lengths
+CHROMOSOME_LENGTHS = {
+    "1": 249250621,
+    "2": 243199373,
+    "3": 198022430,
+    "4": 191154276,
+    "5": 180915260,
+    "6": 171115067,
+    "7": 159138663,
+    "8": 146364022,
+    "9": 141213431,
+    "10": 135534747,
+    "11": 135006516,
+    "12": 133851895,
+    "13": 115169878,
+    "14": 107349540,
+    "15": 102531392,
+    "16": 90354753,
+    "17": 81195210,
+    "18": 78077248,
+    "19": 59128983,
+    "20": 63025520,
+    "21": 48129895,
+    "22": 51304566,
+    "X": 155270560,
+    "Y": 59373566,
+}
+GENOME_LENGTH = sum(CHROMOSOME_LENGTHS.values())
+
+# Records of a WGS sample
+WGS_RECORDS = {
+    "cytoband": 862,
+    "autozyg": 1000,
+    "sites": 4600000,
+    "regions": 50,
+    "exom": 200000,
+}
+SCALES = {"small": 0.01, "medium": 0.1, "wgs": 1.0}
+MIN_BANDS = 8  # cytobands per chromosome at any scale
+
+CYTOBAND_STAINS = ["gneg", "gpos25", "gpos50", "gpos75", "gpos100", "gvar", "stalk"]
+SITE_TYPES = [
+    "UNINFORMATIVE",
+    "ANTI_UPD",
+    "PB_HETEROZYGOUS",
+    "PB_HOMOZYGOUS",
+    "UPD_MATERNAL_ORIGIN",
+    "UPD_PATERNAL_ORIGIN",
+]
+SITE_WEIGHTS = [0.3, 0.3, 0.2, 0.16, 0.02, 0.02]
+REGION_ORIGINS = ["MATERNAL", "PATERNAL"]
+REGION_TYPES = ["HETERODISOMY", "ISODISOMY", "ISODISOMY/DELETION", "HETERODISOMY/DELETION"]
+
+# Values as written, indexed by value * 10 for coverage and * 100 for fractions
+COVERAGE_TEXT = numpy.array(["{:.1f}".format(tenth / 10) for tenth in range(1000)], dtype=object)
+FRACTION_TEXT = numpy.array(
+    ["{:.2f}".format(hundredth / 100) for hundredth in range(101)], dtype=object
+)
+
+
+def parse_scale(text):
+    """Return scale named in SCALES or given as a number"""
+    if text in SCALES:
+        return SCALES[text]
+    scale = float(text)
+    if not 0 < scale:
+        raise ValueError("scale must be positive, not {}".format(text))
+    return scale
+
+
+def _records(kind, scale, length):
+    """Return number of records of 'kind' on a chromosome of 'length', at least one"""
+    return max(1, round(WGS_RECORDS[kind] * scale * length / GENOME_LENGTH))
+
+
+def _intervals(rng, count, length):
+    """Return sorted starts and ends of 'count' disjoint intervals within 'length'"""
+    bounds = numpy.sort(rng.integers(0, length, 2 * count))
+    return bounds[0::2], bounds[1::2]
+
+
+def _write_lines(path, header, lines):
+    with open(path, "w") as filestream:
+        if header is not None:
+            filestream.write(header + "\n")
+        for line in lines:
+            filestream.write(line)
+
+
+def write_wig(path, scale, seed=0, step=5000, track="coverage"):
+    """Write a fixedStep WIG of mean coverage, or with track="fracsnp" of
+    fractions of homozygous SNPs, with a value per 'step' bases"""
+    rng = numpy.random.default_rng(seed)
+    prefix = "chr" if track == "coverage" else ""
+
+    def blocks():
+        for chrom, length in CHROMOSOME_LENGTHS.items():
+            values = max(1, int(length * scale) // step)
+            if track == "coverage":
+                texts = COVERAGE_TEXT[numpy.clip(rng.normal(300, 80, values), 0, 999).astype(int)]
+            else:
+                texts = FRACTION_TEXT[rng.integers(0, 101, values)]
+            yield "fixedStep chrom={}{} start=1 step={}\n".format(prefix, chrom, step)
+            yield "\n".join(texts) + "\n"
+
+    _write_lines(path, 'track type=wiggle_0 name="{}"'.format(track), blocks())
+    return path
+
+
+def write_cytoband(path, scale, seed=0):
+    """Write an ideogram BED of chrom, start, end, name and gStain, every
+    chromosome covered by bands with the centromere as two 'acen' bands"""
+    rng = numpy.random.default_rng(seed)
+
+    def lines():
+        for chrom, length in CHROMOSOME_LENGTHS.items():
+            count = max(MIN_BANDS, _records("cytoband", scale, length))
+            bounds = numpy.concatenate(
+                ([0], numpy.sort(rng.integers(1, length, count - 1)), [length])
+            )
+            centromere = max(1, int(numpy.searchsorted(bounds, length * 0.4)) - 1)
+            stains = rng.choice(CYTOBAND_STAINS, count)
+            stains[centromere - 1 : centromere + 1] = "acen"
+            for band, (start, end) in enumerate(zip(bounds[:-1], bounds[1:])):
+                arm = "p" if band < centromere else "q"
+                yield "chr{}\t{}\t{}\t{}{}\t{}\n".format(chrom, start, end, arm, band, stains[band])
+
+    _write_lines(path, "#chrom\tchromStart\tchromEnd\tname\tgieStain", lines())
+    return path
+
+
+def write_autozyg(path, scale, seed=0):
+    """Write a BED of regions of autozygosity"""
+    rng = numpy.random.default_rng(seed)
+
+    def lines():
+        for chrom, length in CHROMOSOME_LENGTHS.items():
+            starts, ends = _intervals(rng, _records("autozyg", scale, length), length)
+            for start, end in zip(starts, ends):
+                yield "{}\t{}\t{}\n".format(chrom, start, end)
+
+    _write_lines(path, 'track name=rhocall description="regions of autozygosity"', lines())
+    return path
+
+
+def write_sites(path, scale, seed=0):
+    """Write a BED of UPD sites, chrom, start, end and site type"""
+    rng = numpy.random.default_rng(seed)
+
+    def blocks():
+        for chrom, length in CHROMOSOME_LENGTHS.items():
+            starts, ends = _intervals(rng, _records("sites", scale, length), length)
+            types = rng.choice(SITE_TYPES, len(starts), p=SITE_WEIGHTS)
+            yield "".join(
+                "{}\t{}\t{}\t{}\n".format(chrom, start, end, site_type)
+                for start, end, site_type in zip(starts.tolist(), ends.tolist(), types)
+            )
+
+    _write_lines(path, "#chrom\tstart\tend\ttype", blocks())
+    return path
+
+
+def write_regions(path, scale, seed=0):
+    """Write UPD regions, chrom, start, end and ';' separated key=value
+    description, without a header as the UPD tool writes them"""
+    rng = numpy.random.default_rng(seed)
+
+    def lines():
+        for chrom, length in CHROMOSOME_LENGTHS.items():
+            starts, ends = _intervals(rng, _records("regions", scale, length), length)
+            for start, end in zip(starts, ends):
+                yield (
+                    "{}\t{}\t{}\tOrigin={};TYPE={};LOW_SIZE={};INF_SITES={};SNPS={}\n".format(
+                        chrom,
+                        start,
+                        end,
+                        rng.choice(REGION_ORIGINS),
+                        rng.choice(REGION_TYPES),
+                        end - start,
+                        rng.integers(10, 1000),
+                        rng.integers(100, 10000),
+                    )
+                )
+
+    _write_lines(path, None, lines())
+    return path
+
+
+def write_exom(path, scale, seed=0):
+    """Write an exome coverage BED of 15 columns, mean coverage in the ninth"""
+    rng = numpy.random.default_rng(seed)
+
+    def blocks():
+        for chrom, length in CHROMOSOME_LENGTHS.items():
+            count = _records("exom", scale, length)
+            starts = numpy.sort(rng.integers(0, length - 1000, count))
+            ends = starts + rng.integers(50, 1000, count)
+            coverages = numpy.clip(rng.normal(40, 15, count), 0, None)
+            yield "".join(
+                "{}\t{}\t{}\t.\t.\t.\t.\t100\t{:.2f}\t1\t1\t1\t1\t1\tS1\n".format(
+                    chrom, start, end, coverage
+                )
+                for start, end, coverage in zip(starts.tolist(), ends.tolist(), coverages.tolist())
+            )
+
+    _write_lines(path, "#chrom\tstart\tend", blocks())
+    return path
+
+
+# Input files of the benchmark cases: writer and its keyword arguments
+INPUTS = {
+    "coverage_5000.wig": (write_wig, {"step": 5000}),
+    "coverage_1000.wig": (write_wig, {"step": 1000}),
+    "coverage_100.wig": (write_wig, {"step": 100}),
+    "fracsnp_10000.wig": (write_wig, {"step": 10000, "track": "fracsnp"}),
+    "cytoband.bed": (write_cytoband, {}),
+    "autozyg.bed": (write_autozyg, {}),
+    "sites.bed": (write_sites, {}),
+    "regions.bed": (write_regions, {}),
+    "exom.bed": (write_exom, {}),
+}
+
+
+def generate(name, outd, scale, seed=0):
+    """Write input 'name' of INPUTS at 'scale' in 'outd' unless it is there,
+    return its path"""
+    path = os.path.join(outd, name)
+    if not os.path.exists(path):
+        writer, options = INPUTS[name]
+        os.makedirs(outd, exist_ok=True)
+        writer(path + ".part", scale, seed, **options)
+        os.replace(path + ".part", path)
+    return path
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Write synthetic Chromograph inputs")
+    parser.add_argument(
+        "--scale",
+        default="small",
+        help="fraction of a WGS sample, or one of {}".format(sorted(SCALES)),
+    )
+    parser.add_argument("--seed", type=int, default=0, help="random seed (default 0)")
+    parser.add_argument("--outd", required=True, help="output dir")
+    parser.add_argument(
+        "inputs", nargs="*", default=sorted(INPUTS), help="inputs to write (default all)"
+    )
+    args = parser.parse_args(argv)
+    scale = parse_scale(args.scale)
+    for name in args.inputs:
+        print(generate(name, args.outd, scale, args.seed))
+
+
+if __name__ == "__main__":
+    main()
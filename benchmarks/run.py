@@ -0,0 +1,240 @@
+"""RUN
+
+Time every plot entry point on synthetic inputs, see generate.py:
+
+    $ python -m benchmarks.run --scale small
+    $ python -m benchmarks.run --scale wgs --cases sites exom --out results.json
+
+Each case runs in a fresh process, plotting its input 'repeat' times. The
+fastest run is kept with its stage totals from timing.py, next to input
+throughput in MB and rows per second and the peak resident memory of the
+process, which includes the interpreter and libraries.
+
+Results are compared to those stored in baseline.json for the same scale
+and engine; the run fails if a case is slower, or uses more memory, than
+the baseline by more than the tolerance. Timings depend on the machine,
+record a baseline of your own with --update-baseline before comparing.
+"""
+
+import argparse
+import json
+import multiprocessing
+import os
+import resource
+import sys
+import tempfile
+import time
+from . import generate
+
+BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baseline.json")
+STAGES = ("read", "transform", "render", "draw", "encode", "write")
+
+# Cases: plot function of chromograph.chromograph, input of generate.INPUTS
+CASES = {
+    "coverage_5000": ("plot_coverage_wig", "coverage_5000.wig"),
+    "coverage_1000": ("plot_coverage_wig", "coverage_1000.wig"),
+    "coverage_100": ("plot_coverage_wig", "coverage_100.wig"),
+    "fracsnp": ("plot_homosnp_wig", "fracsnp_10000.wig"),
+    "exom": ("plot_exom_coverage", "exom.bed"),
+    "ideogram": ("plot_ideogram", "cytoband.bed"),
+    "autozyg": ("plot_autozyg", "autozyg.bed"),
+    "sites": ("plot_upd_sites", "sites.bed"),
+    "regions": ("plot_upd_regions", "regions.bed"),
+}
+
+
+def _peak_rss_mb():
+    """Return peak resident memory of this process in MB"""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / 2 ** 20 if sys.platform == "darwin" else peak / 2 ** 10  # bytes or kB
+
+
+def run_case(function, filepath, outd, engine, repeat=1):
+    """Plot 'filepath' with 'function' 'repeat' times, return measures of the fastest run"""
+    from chromograph import chromograph, timing  # pylint: disable=import-outside-toplevel
+
+    plot = getattr(chromograph, function)
+    best = None
+    for _ in range(repeat):
+        with timing.recording() as stages:
+            start = time.perf_counter()
+            plot(filepath, outd=outd, engine=engine)
+            seconds = time.perf_counter() - start
+        if best is None or seconds < best[0]:
+            best = seconds, stages
+    seconds, stages = best
+    size = os.path.getsize(filepath)
+    rows = sum(record.get("rows", 0) for record in stages if record["stage"] == "read")
+    totals = timing.totals(stages)
+    return {
+        "function": function,
+        "input_mb": size / 1e6,
+        "rows": rows,
+        "seconds": seconds,
+        "mb_per_s": size / 1e6 / seconds,
+        "rows_per_s": rows / seconds,
+        "rss_mb": _peak_rss_mb(),
+        "stages": {name: totals[name]["wall"] for name in STAGES if name in totals},
+    }
+
+
+def run_cases(cases, scale, engine, workdir, repeat=1, seed=0):
+    """Return {case: measures} of 'cases', generating missing inputs in
+    'workdir', every case in a process of its own"""
+    inputs = os.path.join(workdir, "inputs_{}_{}".format(scale, seed))
+    results = {}
+    context = multiprocessing.get_context("spawn")  # no memory inherited from this process
+    for case in cases:
+        function, name = CASES[case]
+        filepath = generate.generate(name, inputs, scale, seed)
+        outd = os.path.join(workdir, "out", case)
+        with context.Pool(1) as pool:
+            results[case] = pool.apply(run_case, (function, filepath, outd, engine, repeat))
+    return results
+
+
+def baseline_key(scale, engine):
+    return "{}/{}".format(scale, engine)
+
+
+def compare(results, baseline, tolerance):
+    """Return a line for every case of 'results' slower, or using more
+    memory, than in 'baseline' by more than the fraction 'tolerance'"""
+    regressions = []
+    for case, measures in results.items():
+        if case not in baseline:
+            continue
+        for measure in ("seconds", "rss_mb"):
+            limit = baseline[case][measure] * (1 + tolerance)
+            if measures[measure] > limit:
+                regressions.append(
+                    "{}: {} {:.3f} > {:.3f}, baseline {:.3f}".format(
+                        case, measure, measures[measure], limit, baseline[case][measure]
+                    )
+                )
+    return regressions
+
+
+def read_baseline(path, key):
+    """Return the baseline {case: measures} stored under 'key', empty if none is"""
+    if not os.path.exists(path):
+        return {}
+    with open(path) as filestream:
+        return json.load(filestream).get(key, {})
+
+
+def update_baseline(path, key, results):
+    """Store seconds and peak memory of 'results' under 'key', keeping other cases"""
+    stored = {}
+    if os.path.exists(path):
+        with open(path) as filestream:
+            stored = json.load(filestream)
+    cases = stored.setdefault(key, {})
+    for case, measures in results.items():
+        cases[case] = {
+            "seconds": round(measures["seconds"], 4),
+            "rss_mb": round(measures["rss_mb"], 1),
+        }
+    with open(path, "w") as filestream:
+        json.dump(stored, filestream, indent=1, sort_keys=True)
+        filestream.write("\n")
+
+
+def print_results(results, baseline):
+    """Print a line of measures per case, with time relative to the baseline"""
+    header = ("case", "MB", "rows", "seconds", "MB/s", "rows/s", "RSS MB", "read", "transform")
+    print(
+        "{:<14} {:>8} {:>10} {:>8} {:>8} {:>11} {:>7} {:>7} {:>9} {:>7}  {}".format(
+            *header, "render", "vs baseline"
+        )
+    )
+    for case, measures in results.items():
+        stages = measures["stages"]
+        relative = ""
+        if case in baseline:
+            relative = "{:+.0%}".format(measures["seconds"] / baseline[case]["seconds"] - 1)
+        print(
+            "{:<14} {:>8.2f} {:>10} {:>8.3f} {:>8.2f} {:>11.0f} {:>7.0f} {:>7.3f} {:>9.3f} "
+            "{:>7.3f}  {}".format(
+                case,
+                measures["input_mb"],
+                measures["rows"],
+                measures["seconds"],
+                measures["mb_per_s"],
+                measures["rows_per_s"],
+                measures["rss_mb"],
+                stages.get("read", 0.0),
+                stages.get("transform", 0.0),
+                stages.get("render", 0.0),
+                relative,
+            )
+        )
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark Chromograph plot operations")
+    parser.add_argument(
+        "--scale",
+        default="small",
+        help="fraction of a WGS sample, or one of {}".format(sorted(generate.SCALES)),
+    )
+    parser.add_argument(
+        "--engine",
+        default="raster",
+        choices=["matplotlib", "raster"],
+        help="drawing engine (default raster)",
+    )
+    parser.add_argument(
+        "--cases",
+        nargs="+",
+        choices=sorted(CASES),
+        default=list(CASES),
+        help="cases to run (default all)",
+    )
+    parser.add_argument(
+        "--repeat", type=int, default=3, help="runs per case, the fastest is kept (default 3)"
+    )
+    parser.add_argument("--seed", type=int, default=0, help="random seed of the inputs (default 0)")
+    parser.add_argument(
+        "--workdir",
+        default=os.path.join(tempfile.gettempdir(), "chromograph-benchmarks"),
+        help="dir of generated inputs, kept between runs, and outputs",
+    )
+    parser.add_argument(
+        "--baseline", default=BASELINE, help="baseline JSON (default benchmarks/baseline.json)"
+    )
+    parser.add_argument(
+        "--update-baseline",
+        action="store_true",
+        help="store the results as baseline instead of comparing",
+    )
+    parser.add_argument(
+        "--tolerance",
+        type=float,
+        default=0.25,
+        help="allowed fraction over the baseline (default 0.25)",
+    )
+    parser.add_argument("--out", metavar="FILE", help="write all results as JSON")
+    args = parser.parse_args(argv)
+
+    scale = generate.parse_scale(args.scale)
+    key = baseline_key(scale, args.engine)
+    results = run_cases(args.cases, scale, args.engine, args.workdir, args.repeat, args.seed)
+    baseline = read_baseline(args.baseline, key)
+    print_results(results, baseline)
+    if args.out:
+        with open(args.out, "w") as filestream:
+            results_json = {"scale": scale, "engine": args.engine, "cases": results}
+            json.dump(results_json, filestream, indent=1)
+    if args.update_baseline:
+        update_baseline(args.baseline, key, results)
+        print("Baseline {} updated in {}".format(key, args.baseline))
+        return 0
+    regressions = compare(results, baseline, args.tolerance)
+    for line in regressions:
+        print("Regression: " + line)
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
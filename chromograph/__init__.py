@@ -1,6 +1,4 @@
-from pkg_resources import get_distribution
-
-__version__ = get_distribution('chromograph').version
+from .__version__ import __version__
 
 # Test files
 autozygosity_example = "tests/example_files/autozygosity.bed"
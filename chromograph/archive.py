@@ -0,0 +1,149 @@
+"""ARCHIVE
+
+Write the images of a run to one archive in the output directory instead
+of a file each:
+
+    $ chromograph --coverage s1.wig --outd out/ --output-format zip
+    $ chromograph --sites s1.bed --outd out/ --output-format sqlite
+
+The archive, out/chromograph.zip or out/chromograph.sqlite, is added to
+by every input written to that directory. Images are keyed by the names
+of the files they would have been written to, e.g. "s1_chr1.png", and
+identical images, like the transparent placeholders of --euploid, are
+stored once by their SHA-256. Read one without extracting the rest:
+
+    from chromograph.archive import read_image
+    png = read_image("out/chromograph.zip", "s1_chr1.png")
+
+Zip archives hold every image once as blobs/<sha256>.png, stored
+uncompressed as PNGs are already, and an index/<n>.json per write mapping
+names to hashes, later writes overriding earlier. Images are only ever
+appended, an image replaced by a later write stays in the archive. Zip
+archives are locked with flock while written or read, so several
+processes, e.g. workers of chromograph serve, can add to the archive of
+one output directory; on systems without fcntl they are not. SQLite
+archives hold tables blobs (sha256, png) and images (name, sha256), and
+are safe to write from several processes at once.
+"""
+
+import hashlib
+import json
+import os
+import sqlite3
+import zipfile
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+FORMATS = ("zip", "sqlite")
+ARCHIVE_NAME = "chromograph"
+SQLITE_MAGIC = b"SQLite format 3\0"
+SQLITE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS blobs (sha256 TEXT PRIMARY KEY, png BLOB NOT NULL);
+CREATE TABLE IF NOT EXISTS images (name TEXT PRIMARY KEY, sha256 TEXT NOT NULL);
+"""
+
+
+def archive_path(outd, output_format):
+    """Return path of the archive of 'output_format' in 'outd'"""
+    return os.path.join(outd, "{}.{}".format(ARCHIVE_NAME, output_format))
+
+
+def write_images(path, output_format, images):
+    """Add 'images', {name: PNG bytes}, to the archive at 'path' of
+    'output_format', creating it if needed"""
+    if output_format not in FORMATS:
+        raise ValueError("output format must be one of {}".format(FORMATS))
+    hashes = {name: hashlib.sha256(png).hexdigest() for name, png in images.items()}
+    blobs = {hashes[name]: png for name, png in images.items()}
+    if output_format == "zip":
+        _write_zip(path, hashes, blobs)
+    else:
+        _write_sqlite(path, hashes, blobs)
+
+
+@contextmanager
+def _locked_zip(path, mode):
+    """Yield zip archive at 'path' opened with 'mode', "r" or "a", holding
+    a shared or, to add to it, exclusive lock on it until the block ends"""
+    if mode == "r":
+        filestream, lock = open(path, "rb"), getattr(fcntl, "LOCK_SH", None)
+    else:
+        filestream = open(os.open(path, os.O_RDWR | os.O_CREAT, 0o666), "r+b")
+        lock = getattr(fcntl, "LOCK_EX", None)
+    with filestream:
+        if fcntl is not None:
+            fcntl.flock(filestream, lock)  # released when the file is closed
+        with zipfile.ZipFile(filestream, mode) as archive:
+            yield archive
+
+
+def _write_zip(path, hashes, blobs):
+    with _locked_zip(path, "a") as archive:
+        members = set(archive.namelist())
+        for sha256, png in blobs.items():
+            member = "blobs/{}.png".format(sha256)
+            if member not in members:
+                archive.writestr(member, png)
+        indexes = sum(member.startswith("index/") for member in members)
+        archive.writestr("index/{:06d}.json".format(indexes), json.dumps(hashes, indent=1))
+
+
+def _write_sqlite(path, hashes, blobs):
+    connection = sqlite3.connect(path, timeout=60)
+    try:
+        with connection:
+            connection.executescript(SQLITE_SCHEMA)
+            connection.executemany("INSERT OR IGNORE INTO blobs VALUES (?, ?)", blobs.items())
+            connection.executemany("INSERT OR REPLACE INTO images VALUES (?, ?)", hashes.items())
+            connection.execute(
+                "DELETE FROM blobs WHERE sha256 NOT IN (SELECT sha256 FROM images)"
+            )
+    finally:
+        connection.close()
+
+
+def _is_sqlite(path):
+    with open(path, "rb") as filestream:
+        return filestream.read(len(SQLITE_MAGIC)) == SQLITE_MAGIC
+
+
+def _zip_index(archive):
+    """Return {name: sha256} of a zip archive, later writes overriding earlier"""
+    index = {}
+    for member in sorted(name for name in archive.namelist() if name.startswith("index/")):
+        index.update(json.loads(archive.read(member)))
+    return index
+
+
+def list_images(path):
+    """Return sorted names of the images in the archive at 'path'"""
+    if _is_sqlite(path):
+        connection = sqlite3.connect(path)
+        try:
+            return [name for (name,) in connection.execute("SELECT name FROM images ORDER BY name")]
+        finally:
+            connection.close()
+    with _locked_zip(path, "r") as archive:
+        return sorted(_zip_index(archive))
+
+
+def read_image(path, name):
+    """Return PNG bytes of image 'name' in the archive at 'path', zip or
+    SQLite. Raise KeyError if there is none."""
+    if _is_sqlite(path):
+        connection = sqlite3.connect(path)
+        try:
+            row = connection.execute(
+                "SELECT png FROM images JOIN blobs USING (sha256) WHERE name = ?", (name,)
+            ).fetchone()
+        finally:
+            connection.close()
+        if row is None:
+            raise KeyError(name)
+        return row[0]
+    with _locked_zip(path, "r") as archive:
+        return archive.read("blobs/{}.png".format(_zip_index(archive)[name]))
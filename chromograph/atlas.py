@@ -0,0 +1,51 @@
+"""ATLAS
+
+Pack the per-chromosome images of a track into one PNG with a slot per
+chromosome, stacked top to bottom, and write a JSON index of the pixel
+rectangle of every slot next to it. A viewer fetches two files instead
+of one per chromosome and slices the atlas with the index:
+
+    {"image": "sample_atlas.png", "width": 2325, "height": 2875,
+     "chromosomes": {"chr1": {"x": 0, "y": 0, "width": 2325, "height": 115,
+                              "empty": false}, ...}}
+
+Slots of chromosomes missing from the input are transparent, like the
+files written for them with --euploid.
+"""
+
+import json
+import os
+from . import raster
+
+
+def pack_atlas(images, labels):
+    """Return (atlas, slots) of RGBA 'images' by label, one slot for every
+    label in 'labels' in that order. Slots are as large as the largest image."""
+    width = max(image.shape[1] for image in images.values())
+    height = max(image.shape[0] for image in images.values())
+    atlas = raster.new_image(width, height * len(labels))
+    slots = {}
+    for i, label in enumerate(labels):
+        top = i * height
+        slots[label] = {"x": 0, "y": top, "width": width, "height": height}
+        slots[label]["empty"] = label not in images
+        if label in images:
+            image = images[label]
+            atlas[top : top + image.shape[0], : image.shape[1]] = image
+    return atlas, slots
+
+
+def write_atlas(images, labels, outfile, indexfile, dpi=None, png=None):
+    """Write atlas of 'images' to 'outfile', encoded as given by PngOptions
+    'png', and its index to 'indexfile', return files written"""
+    atlas, slots = pack_atlas(images, labels)
+    raster.write_png(atlas, outfile, dpi, png)
+    index = {
+        "image": os.path.basename(outfile),
+        "width": atlas.shape[1],
+        "height": atlas.shape[0],
+        "chromosomes": slots,
+    }
+    with open(indexfile, "w") as filestream:
+        json.dump(index, filestream, indent=1)
+    return [outfile, indexfile]
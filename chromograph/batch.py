@@ -0,0 +1,130 @@
+"""BATCH
+
+Run many Chromograph jobs listed in a YAML manifest in one process, so
+libraries are imported and set up once instead of once per file:
+
+    defaults:
+      engine: raster
+    jobs:
+      - operation: coverage
+        input: sample1/coverage.wig
+        outd: out/sample1
+        options:
+          euploid: true
+      - operation: ideogram
+        input: cytoBand.bed
+
+Operations are named as the long command line options (autozyg, coverage,
+exom, fracsnp, ideogram, regions, sites) and options as their command
+line destinations (step, rgb, norm, euploid, jobs, ...). Job options
+override the manifest's defaults, which override options given on the
+command line. Relative paths are relative to the manifest.
+
+A failing job is reported and the batch goes on with the next one.
+"""
+
+import logging
+import os
+import time
+from collections import defaultdict
+import yaml
+
+LOG = logging.getLogger(__name__)
+
+MANIFEST_KEYS = {"operation", "input", "outd", "options"}
+
+
+def read_manifest(manifest_path):
+    """Return list of jobs in a manifest, as dicts with keys operation,
+    input, outd and options. Raise ValueError if it is malformed."""
+    with open(manifest_path) as filestream:
+        manifest = yaml.safe_load(filestream)
+    if isinstance(manifest, list):
+        manifest = {"jobs": manifest}
+    if not isinstance(manifest, dict) or not isinstance(manifest.get("jobs"), list):
+        raise ValueError("{}: expected a list of jobs".format(manifest_path))
+    defaults = manifest.get("defaults") or {}
+    basedir = os.path.dirname(os.path.abspath(manifest_path))
+
+    jobs = []
+    for number, job in enumerate(manifest["jobs"], 1):
+        if not isinstance(job, dict) or not {"operation", "input"} <= set(job):
+            raise ValueError(
+                "{}: job {} needs an operation and an input".format(manifest_path, number)
+            )
+        unknown = set(job) - MANIFEST_KEYS
+        if unknown:
+            raise ValueError(
+                "{}: job {} has unknown keys {}".format(manifest_path, number, sorted(unknown))
+            )
+        options = dict(defaults, **(job.get("options") or {}))
+        outd = job.get("outd", options.get("outd"))
+        jobs.append(
+            {
+                "operation": str(job["operation"]),
+                "input": os.path.join(basedir, str(job["input"])),
+                "outd": os.path.join(basedir, str(outd)) if outd else None,
+                "options": options,
+            }
+        )
+    return jobs
+
+
+def run_batch(manifest_path, operations, cli_options=None):
+    """Run every job in a manifest with the plot function 'operations'
+    maps its operation to. Log an error per failed job and a throughput
+    summary per operation. Return number of failed jobs."""
+    stats = defaultdict(lambda: {"jobs": 0, "failed": 0, "seconds": 0.0, "bytes": 0})
+    failed = 0
+    for number, job in enumerate(read_manifest(manifest_path), 1):
+        options = dict(cli_options or {}, **job["options"])
+        if job["outd"]:
+            options["outd"] = job["outd"]
+        operation = job["operation"]
+        stat = stats[operation]
+        stat["jobs"] += 1
+        start = time.perf_counter()
+        try:
+            if operation not in operations:
+                raise ValueError("unknown operation, expected one of {}".format(sorted(operations)))
+            size = os.path.getsize(job["input"])
+            operations[operation](job["input"], options)
+            stat["bytes"] += size
+        except Exception as error:  # pylint: disable=broad-except
+            stat["failed"] += 1
+            failed += 1
+            LOG.error(
+                "Error: job %d (%s %s) failed: %s: %s",
+                number,
+                operation,
+                job["input"],
+                type(error).__name__,
+                error,
+            )
+        stat["seconds"] += time.perf_counter() - start
+
+    log_summary(stats)
+    return failed
+
+
+def log_summary(stats):
+    """Log jobs, failures, time and input read per second for each operation"""
+    LOG.info(
+        "%s",
+        "{:<10} {:>6} {:>7} {:>9} {:>8} {:>8}".format(
+            "operation", "jobs", "failed", "seconds", "jobs/s", "MB/s"
+        ),
+    )
+    for operation, stat in stats.items():
+        seconds = max(stat["seconds"], 1e-9)
+        LOG.info(
+            "%s",
+            "{:<10} {:>6} {:>7} {:>9.2f} {:>8.2f} {:>8.2f}".format(
+                operation,
+                stat["jobs"],
+                stat["failed"],
+                stat["seconds"],
+                (stat["jobs"] - stat["failed"]) / seconds,
+                stat["bytes"] / 1e6 / seconds,
+            ),
+        )
@@ -0,0 +1,192 @@
+"""BGZF
+
+Read gzip compressed input, detected from its first bytes whatever the
+file is named. BGZF files, as written by bgzip, are series of independent
+gzip blocks of at most 64 KB with their compressed size in the header;
+batches of blocks are inflated on a thread pool, zlib releasing the GIL,
+and streamed to the parser in file order. Other gzip files are read with
+the standard gzip module.
+"""
+
+import gzip
+import io
+import os
+import struct
+import zlib
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+GZIP_MAGIC = b"\x1f\x8b"
+BGZF_HEADER = b"\x1f\x8b\x08\x04"  # magic, deflate, extra field present
+BLOCK_HEADER = 12  # bytes before the extra field
+BATCH_BYTES = 1 << 20  # compressed bytes inflated per task
+MAX_BLOCK = 1 << 16
+MAX_THREADS = 8
+
+
+def _default_threads():
+    return min(MAX_THREADS, os.cpu_count() or 1)
+
+
+def is_gzip(filepath):
+    """Return True if 'filepath' is gzip compressed, BGZF or not"""
+    with open(filepath, "rb") as filestream:
+        return filestream.read(len(GZIP_MAGIC)) == GZIP_MAGIC
+
+
+def _block_size(data, position):
+    """Return size of the BGZF block at 'position' of 'data', or None if
+    its header is not in 'data' or it is not a BGZF block"""
+    if len(data) - position < BLOCK_HEADER + 6:
+        return None
+    if data[position : position + 4] != BGZF_HEADER:
+        return None
+    (extra_length,) = struct.unpack_from("<H", data, position + 10)
+    field = position + BLOCK_HEADER
+    while field + 4 <= position + BLOCK_HEADER + extra_length:
+        if len(data) < field + 6:
+            return None
+        tag, length = data[field : field + 2], struct.unpack_from("<H", data, field + 2)[0]
+        if tag == b"BC" and length == 2:
+            return struct.unpack_from("<H", data, field + 4)[0] + 1
+        field += 4 + length
+    return None
+
+
+def is_bgzf(filepath):
+    """Return True if 'filepath' starts with a BGZF block"""
+    with open(filepath, "rb") as filestream:
+        return _block_size(filestream.read(1024), 0) is not None
+
+
+def _inflate(data, blocks):
+    """Return the decompressed contents of 'blocks', (start, end) in 'data'"""
+    view = memoryview(data)
+    parts = []
+    for start, end in blocks:
+        (extra_length,) = struct.unpack_from("<H", data, start + 10)
+        crc, size = struct.unpack_from("<II", data, end - 8)
+        part = zlib.decompress(view[start + BLOCK_HEADER + extra_length : end - 8], -15)
+        if len(part) != size or zlib.crc32(part) != crc:
+            raise ValueError("corrupt BGZF block at byte {}".format(start))
+        parts.append(part)
+    return b"".join(parts)
+
+
+def _batches(filestream):
+    """Yield (data, blocks) of about BATCH_BYTES of whole BGZF blocks"""
+    rest = b""
+    while True:
+        chunk = filestream.read(BATCH_BYTES)
+        data = rest + chunk
+        blocks, position = [], 0
+        while True:
+            size = _block_size(data, position)
+            if size is None or position + size > len(data):
+                break
+            blocks.append((position, position + size))
+            position += size
+        if blocks:
+            yield data, blocks
+        rest = data[position:]
+        if len(rest) > BATCH_BYTES:  # far more than any block header
+            raise ValueError("not a BGZF block at byte {} of {}".format(position, filestream.name))
+        if not chunk:
+            if rest:
+                raise ValueError("not a BGZF block at the end of {}".format(filestream.name))
+            return
+
+
+def inflate_blocks(filepath, threads=None):
+    """Yield decompressed contents of a BGZF file in order, batches of
+    blocks inflated on 'threads' threads"""
+    threads = threads or _default_threads()
+    with open(filepath, "rb") as filestream, ThreadPoolExecutor(threads) as executor:
+        pending = deque()
+        for data, blocks in _batches(filestream):
+            pending.append(executor.submit(_inflate, data, blocks))
+            if len(pending) > 2 * threads:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+
+def read_virtual(filepath, start, end, threads=None):
+    """Return decompressed bytes from virtual offset 'start' to 'end' of a
+    BGZF file, offsets as in tabix indexes: the file offset of a block
+    shifted 16 bits left plus the offset within the decompressed block"""
+    first, last = start >> 16, end >> 16
+    with open(filepath, "rb") as filestream:
+        filestream.seek(first)
+        raw = filestream.read(last - first + MAX_BLOCK)
+    blocks, position = [], 0
+    while position <= last - first:
+        size = _block_size(raw, position)
+        if size is None or position + size > len(raw):
+            break
+        blocks.append((position, position + size))
+        position += size
+    batches, batch = [], []
+    for block in blocks:
+        if batch and block[1] - batch[0][0] > BATCH_BYTES:
+            batches.append(batch)
+            batch = []
+        batch.append(block)
+    with ThreadPoolExecutor(threads or _default_threads()) as executor:
+        data = b"".join(executor.map(lambda blocks: _inflate(raw, blocks), batches + [batch]))
+    stop = len(data)
+    if blocks and blocks[-1][0] == last - first:  # cut the block 'end' points into
+        stop -= struct.unpack_from("<I", raw, blocks[-1][1] - 4)[0] - (end & 0xFFFF)
+    return data[start & 0xFFFF : stop]
+
+
+class BgzfReader(io.RawIOBase):
+    """Raw binary stream of the decompressed contents of a BGZF file"""
+
+    def __init__(self, filepath, threads=None):
+        super().__init__()
+        self.name = filepath
+        self._parts = inflate_blocks(filepath, threads)
+        self._part = memoryview(b"")
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        while not self._part:
+            part = next(self._parts, None)
+            if part is None:
+                return 0
+            self._part = memoryview(part)
+        size = min(len(buffer), len(self._part))
+        buffer[:size] = self._part[:size]
+        self._part = self._part[size:]
+        return size
+
+    def readall(self):
+        return b"".join([bytes(self._part)] + list(self._parts))
+
+    def close(self):
+        if not self.closed:
+            self._parts.close()
+        super().close()
+
+
+def open_input(filepath, mode="r", threads=None):
+    """Return 'filepath' opened for reading in text ('r') or binary ('rb')
+    'mode', decompressed if it is gzip or BGZF compressed"""
+    if not is_gzip(filepath):
+        return open(filepath, mode)
+    if is_bgzf(filepath):
+        stream = io.BufferedReader(BgzfReader(filepath, threads), BATCH_BYTES)
+    else:
+        stream = gzip.open(filepath, "rb")
+    return stream if "b" in mode else io.TextIOWrapper(stream)
+
+
+def read_input(filepath, threads=None):
+    """Return the contents of 'filepath' as bytes, decompressed as by open_input"""
+    if is_gzip(filepath) and is_bgzf(filepath):
+        return b"".join(inflate_blocks(filepath, threads))
+    with open_input(filepath, "rb") as filestream:
+        return filestream.read()
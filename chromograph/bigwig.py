@@ -0,0 +1,211 @@
+"""BIGWIG
+
+Read coverage from bigWig files, as specified by UCSC (Kent et al. 2010),
+in pure Python and numpy. bigWig files hold base-level data plus zoom
+levels of pre-computed summaries, each with an R-tree index of its
+blocks. Only the blocks of the wanted chromosomes at the wanted level are
+read, so a genome-wide render at screen resolution reads a few hundred KB
+of summaries instead of the full data.
+"""
+
+import struct
+import zlib
+from .lazy import lazy_import
+from .region import same_chromosome
+
+numpy = lazy_import("numpy")
+
+BIGWIG_MAGIC = 0x888FFC26
+CHROM_TREE_MAGIC = 0x78CA8C91
+R_TREE_MAGIC = 0x2468ACE0
+HEADER = "IHHQQQHHQQIQ"  # 64 bytes
+ZOOM_HEADER = "IIQQ"  # 24 bytes per zoom level
+SECTION_HEADER = "IIIIIBBH"  # 24 bytes
+BEDGRAPH, VARIABLE_STEP, FIXED_STEP = 1, 2, 3  # section types
+
+
+def byte_order(filepath):
+    """Return '<' or '>' if 'filepath' is a bigWig file in that byte order, else None"""
+    with open(filepath, "rb") as filestream:
+        magic = filestream.read(4)
+    for order in "<>":
+        if len(magic) == 4 and struct.unpack(order + "I", magic)[0] == BIGWIG_MAGIC:
+            return order
+    return None
+
+
+def read_header(filestream, order):
+    """Return dict of the offsets in the header of an open bigWig file,
+    with zoom levels as (bases per summary, data offset, index offset)
+    sorted from finest to coarsest"""
+    filestream.seek(0)
+    fields = struct.unpack(order + HEADER, filestream.read(struct.calcsize(order + HEADER)))
+    zoom_levels = [
+        struct.unpack(order + ZOOM_HEADER, filestream.read(struct.calcsize(order + ZOOM_HEADER)))
+        for _ in range(fields[2])
+    ]
+    return {
+        "order": order,
+        "chrom_tree": fields[3],
+        "full_index": fields[5],
+        "compressed": fields[10] > 0,
+        "zoom_levels": sorted((level, data, index) for level, _, data, index in zoom_levels),
+    }
+
+
+def _read(filestream, order, fmt, offset=None):
+    if offset is not None:
+        filestream.seek(offset)
+    return struct.unpack(order + fmt, filestream.read(struct.calcsize(order + fmt)))
+
+
+def read_chromosomes(filestream, header):
+    """Return {name: (id, size)} from the chromosome B+ tree"""
+    order = header["order"]
+    magic, _, key_size, _, _, _ = _read(filestream, order, "IIIIQQ", header["chrom_tree"])
+    if magic != CHROM_TREE_MAGIC:
+        raise ValueError("bad chromosome tree in bigWig file")
+    chromosomes = {}
+    nodes = [filestream.tell()]
+    while nodes:
+        is_leaf, _, count = _read(filestream, order, "BBH", nodes.pop())
+        for _ in range(count):
+            key = filestream.read(key_size).rstrip(b"\0").decode()
+            if is_leaf:
+                chromosomes[key] = _read(filestream, order, "II")
+            else:
+                nodes.append(_read(filestream, order, "Q")[0])
+    return chromosomes
+
+
+def chromosome_names(filepath):
+    """Return names of the chromosomes of a bigWig file, in file order"""
+    order = byte_order(filepath)
+    with open(filepath, "rb") as filestream:
+        chromosomes = read_chromosomes(filestream, read_header(filestream, order))
+    return sorted(chromosomes, key=lambda name: chromosomes[name][0])
+
+
+def _find_blocks(filestream, order, index_offset, chrom_ids):
+    """Return (offset, size) of data blocks overlapping chromosomes
+    'chrom_ids', searched in the R-tree index at 'index_offset'"""
+    magic = _read(filestream, order, "I", index_offset)[0]
+    if magic != R_TREE_MAGIC:
+        raise ValueError("bad R-tree index in bigWig file")
+    blocks = set()
+    nodes = [index_offset + 48]  # first node follows the 48 byte header
+    while nodes:
+        is_leaf, _, count = _read(filestream, order, "BBH", nodes.pop())
+        item = "IIIIQQ" if is_leaf else "IIIIQ"
+        for start_chrom, _, end_chrom, _, *location in (
+            _read(filestream, order, item) for _ in range(count)
+        ):
+            if start_chrom <= max(chrom_ids) and end_chrom >= min(chrom_ids):
+                if is_leaf:
+                    blocks.add(tuple(location))
+                else:
+                    nodes.append(location[0])
+    return sorted(blocks)
+
+
+def _read_blocks(filestream, header, blocks):
+    """Yield the contents of data blocks, decompressed"""
+    for offset, size in blocks:
+        filestream.seek(offset)
+        data = filestream.read(size)
+        yield zlib.decompress(data) if header["compressed"] else data
+
+
+def _section_intervals(block, order):
+    """Return (chrom ids, starts, ends, values) of the sections in a full
+    data block"""
+    chroms, starts, ends, values = [], [], [], []
+    position = 0
+    while position < len(block):
+        chrom_id, start, _, step, span, kind, _, count = struct.unpack_from(
+            order + SECTION_HEADER, block, position
+        )
+        position += struct.calcsize(order + SECTION_HEADER)
+        if kind == BEDGRAPH:
+            items = numpy.frombuffer(block, order + "u4,{0}u4,{0}f4".format(order), count, position)
+            item_starts, item_ends, item_values = items["f0"], items["f1"], items["f2"]
+            position += 12 * count
+        elif kind == VARIABLE_STEP:
+            items = numpy.frombuffer(block, order + "u4,{}f4".format(order), count, position)
+            item_starts, item_values = items["f0"], items["f1"]
+            item_ends = item_starts + span
+            position += 8 * count
+        elif kind == FIXED_STEP:
+            item_values = numpy.frombuffer(block, order + "f4", count, position)
+            item_starts = start + step * numpy.arange(count, dtype=numpy.int64)
+            item_ends = item_starts + span
+            position += 4 * count
+        else:
+            raise ValueError("unknown bigWig section type {}".format(kind))
+        chroms.append(numpy.full(count, chrom_id))
+        starts.append(item_starts)
+        ends.append(item_ends)
+        values.append(item_values)
+    return chroms, starts, ends, values
+
+
+ZOOM_RECORD = ["chrom", "start", "end", "valid", "min", "max", "sum", "sum_squares"]
+
+
+def _zoom_intervals(block, order):
+    """Return (chrom ids, starts, ends, mean values) of the summaries in a
+    zoom data block"""
+    dtype = numpy.dtype(
+        [(name, order + "u4") for name in ZOOM_RECORD[:4]]
+        + [(name, order + "f4") for name in ZOOM_RECORD[4:]]
+    )
+    records = numpy.frombuffer(block, dtype)
+    means = records["sum"] / numpy.maximum(records["valid"], 1)
+    return [records["chrom"]], [records["start"]], [records["end"]], [means]
+
+
+def zoom_level(header, column_width):
+    """Return the coarsest zoom level (bases per summary, data offset, index
+    offset) giving at least one summary per 'column_width' bases, or None
+    to read the full data"""
+    levels = [level for level in header["zoom_levels"] if level[0] <= (column_width or 0)]
+    return levels[-1] if levels else None
+
+
+def read_intervals(filepath, column_width=None, chrom=None):
+    """Return (names, chrom codes, starts, ends, values) of all intervals of
+    a bigWig file, or of chromosome 'chrom' only. Summaries of the coarsest
+    zoom level with at least one summary per 'column_width' bases are
+    returned if there is one, their mean value being the value. Codes index
+    'names'."""
+    order = byte_order(filepath)
+    if order is None:
+        raise ValueError("not a bigWig file: {}".format(filepath))
+    with open(filepath, "rb") as filestream:
+        header = read_header(filestream, order)
+        chromosomes = read_chromosomes(filestream, header)
+        level = zoom_level(header, column_width)
+        index_offset, parse = header["full_index"], _section_intervals
+        if level is not None:
+            index_offset, parse = level[2], _zoom_intervals
+        names = sorted(chromosomes, key=lambda name: chromosomes[name][0])
+        if chrom is not None:
+            names = [name for name in names if same_chromosome(name, chrom)]
+        ids = numpy.array([chromosomes[name][0] for name in names])
+        parts = [[], [], [], []]
+        blocks = _find_blocks(filestream, order, index_offset, ids) if names else []
+        for block in _read_blocks(filestream, header, blocks):
+            for part, values in zip(parts, parse(block, order)):
+                part += values
+    if not parts[0]:
+        empty = numpy.array([], dtype=numpy.int64)
+        return names, empty, empty, empty, numpy.array([])
+    chroms, starts, ends, values = (numpy.concatenate(part) for part in parts)
+    keep = numpy.isin(chroms, ids)  # a block may hold other chromosomes too
+    return (
+        names,
+        numpy.searchsorted(ids, chroms[keep]),
+        starts[keep].astype(numpy.int64),
+        ends[keep].astype(numpy.int64),
+        values[keep].astype(float),
+    )
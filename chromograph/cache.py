@@ -0,0 +1,171 @@
+"""CACHE
+
+Opt-in on-disk cache of parsed and filtered tracks. Every entry is a
+directory holding one `.npy` file per dataframe column, read back with
+`numpy.load(mmap_mode="r")` so later runs skip parsing entirely.
+
+Entries are keyed on input path, size, mtime, CACHE_VERSION and the
+parameters given by the reader (e.g. WIG step). A changed input gets a
+new key, stale entries for the same input are removed when a new one is
+written.
+"""
+
+import hashlib
+import json
+import logging
+import os
+import shutil
+import tempfile
+from .lazy import lazy_import
+
+numpy = lazy_import("numpy")
+pandas = lazy_import("pandas")
+
+LOG = logging.getLogger(__name__)
+
+CACHE_VERSION = 2  # bump when parsers or the entry layout change
+CACHE_DIRNAME = ".chromograph_cache"
+META_FILE = "meta.json"
+INDEX_FILE = "index.npy"
+
+
+def default_cache_dir(filepath):
+    """Return cache directory next to the input file"""
+    return os.path.join(os.path.dirname(os.path.abspath(filepath)), CACHE_DIRNAME)
+
+
+def _entry_prefix(filepath):
+    """Return name prefix shared by all cache entries of an input file"""
+    path = os.path.abspath(filepath)
+    path_hash = hashlib.sha1(path.encode()).hexdigest()[:16]
+    return "{}-{}-".format(os.path.basename(path), path_hash)
+
+
+def cache_key(filepath, *params):
+    """Return name of the cache entry for 'filepath' as it is on disk now,
+    read with 'params'"""
+    key = json.dumps([os.path.abspath(filepath)] + _input_version(filepath) + [params], default=str)
+    return _entry_prefix(filepath) + hashlib.sha1(key.encode()).hexdigest()[:16]
+
+
+def load_dataframe(cache_dir, filepath, *params):
+    """Return cached dataframe for 'filepath', or None if not cached"""
+    entry = os.path.join(cache_dir, cache_key(filepath, *params))
+    try:
+        with open(os.path.join(entry, META_FILE)) as filestream:
+            meta = json.load(filestream)
+    except (OSError, ValueError):
+        return None
+    columns = {}
+    for i, name in enumerate(meta["columns"]):
+        values = numpy.load(os.path.join(entry, "{}.npy".format(i)), mmap_mode="r")
+        if name in meta["categorical"]:
+            ordered = meta["categorical"][name]
+            values = pandas.Categorical.from_codes(values, meta["categories"][name], ordered)
+        elif name in meta["categories"]:
+            # code -1 picks the trailing NaN, as returned by pandas.factorize
+            categories = numpy.array(meta["categories"][name] + [numpy.nan], dtype=object)
+            values = categories[values]
+        columns[name] = values
+    index = numpy.load(os.path.join(entry, INDEX_FILE), mmap_mode="r")
+    return pandas.DataFrame(columns, index=index, copy=False)
+
+
+def save_dataframe(cache_dir, filepath, dataframe, *params):
+    """Write 'dataframe' to the cache, replacing older entries of 'filepath'.
+    Dataframes with object columns holding other values than strings are
+    not cached. Categorical columns are stored as their codes."""
+    categories = {}
+    categorical = {}  # name -> ordered
+    arrays = []
+    for name in dataframe.columns:
+        column = dataframe[name]
+        if isinstance(column.dtype, pandas.CategoricalDtype):
+            if not all(isinstance(value, str) for value in column.cat.categories):
+                return
+            categories[name] = list(column.cat.categories)
+            categorical[name] = bool(column.cat.ordered)
+            arrays.append(column.cat.codes.to_numpy())
+        elif column.dtype == object:
+            codes, uniques = pandas.factorize(column)
+            if not all(isinstance(value, str) for value in uniques):
+                return
+            categories[name] = list(uniques)
+            arrays.append(codes.astype(numpy.int32))
+        else:
+            arrays.append(column.to_numpy())
+
+    os.makedirs(cache_dir, exist_ok=True)
+    name = cache_key(filepath, *params)
+    tmp_entry = tempfile.mkdtemp(prefix=".tmp-", dir=cache_dir)
+    try:
+        for i, values in enumerate(arrays):
+            numpy.save(os.path.join(tmp_entry, "{}.npy".format(i)), values)
+        numpy.save(os.path.join(tmp_entry, INDEX_FILE), dataframe.index.to_numpy())
+        with open(os.path.join(tmp_entry, META_FILE), "w") as filestream:
+            meta = {
+                "columns": list(dataframe.columns),
+                "categories": categories,
+                "categorical": categorical,
+                "input": _input_version(filepath),
+            }
+            json.dump(meta, filestream)
+        _clear_stale(cache_dir, filepath)
+        os.rename(tmp_entry, os.path.join(cache_dir, name))
+    except OSError:
+        shutil.rmtree(tmp_entry, ignore_errors=True)
+        raise
+
+
+def _input_version(filepath):
+    """Return what tells versions of 'filepath' apart in cache keys"""
+    stat = os.stat(filepath)
+    return [stat.st_size, stat.st_mtime_ns, CACHE_VERSION]
+
+
+def _clear_stale(cache_dir, filepath):
+    """Remove cache entries of 'filepath' written for another version of it,
+    keeping those of the current version read with other parameters"""
+    prefix = _entry_prefix(filepath)
+    current = _input_version(filepath)
+    for name in os.listdir(cache_dir):
+        if not name.startswith(prefix) or name.startswith(".tmp-"):
+            continue
+        entry = os.path.join(cache_dir, name)
+        try:
+            with open(os.path.join(entry, META_FILE)) as filestream:
+                version = json.load(filestream).get("input")
+        except (OSError, ValueError):
+            version = None
+        if version != current:
+            shutil.rmtree(entry, ignore_errors=True)
+
+
+def clear_cache(cache_dir, filepath=None):
+    """Remove cache entries of 'filepath', or every entry if not given"""
+    if not os.path.isdir(cache_dir):
+        return
+    prefix = _entry_prefix(filepath) if filepath else ""
+    for name in os.listdir(cache_dir):
+        if name.startswith(prefix) and not name.startswith(".tmp-"):
+            shutil.rmtree(os.path.join(cache_dir, name), ignore_errors=True)
+
+
+def cached_dataframe(cache_dir, filepath, reader, *params, partial=False):
+    """Return dataframe for 'filepath' from cache, or call 'reader' and
+    cache its result. Caching is bypassed when 'cache_dir' is None. If
+    'partial', 'reader' reads only part of the input: the cached dataframe
+    of the whole input is returned if there is one, the part is not cached."""
+    if cache_dir is None:
+        return reader()
+    dataframe = load_dataframe(cache_dir, filepath, *params)
+    if dataframe is not None:
+        return dataframe
+    dataframe = reader()
+    if partial:
+        return dataframe
+    try:
+        save_dataframe(cache_dir, filepath, dataframe, *params)
+    except OSError as error:
+        LOG.warning("could not write cache %s: %s", cache_dir, error)
+    return dataframe
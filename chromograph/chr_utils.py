@@ -4,24 +4,183 @@
 A collection of auxillary functions for Chromograph
 """
 
+import logging
 import os
-import pkg_resources
+from . import bigwig, pyramid, raster
+from .bgzf import open_input
+from .lazy import lazy_import
+
+numpy = lazy_import("numpy")
+pandas = lazy_import("pandas")
+
+LOG = logging.getLogger(__name__)
+
+LINE_WORD = 8  # bytes of a line hashed at a time by factorize_lines
+LINE_WORD_MASKS = tuple((1 << (8 * i)) - 1 for i in range(LINE_WORD + 1))  # by bytes kept
+COVERED_TOLERANCE = 1e-9  # pixels covered less, or less short of fully, are empty or full
+COMPRESSED_SUFFIXES = (".gz", ".bgz")
 
 
 def filter_dataframe(frame, list_of_chromosomes):
     """Delete dataframe entries where 'chrome' does not appear in the
-    list `list_of_chromosomes`
+    list `list_of_chromosomes`, and store 'chrom' as a Categorical ordered
+    as the list
 
         Args:
             frame(dataframe)
             list_of_chromosomes
     """
-    return frame[frame.chrom.apply(lambda x: x in list_of_chromosomes)]
+    chrom_type = pandas.CategoricalDtype(list_of_chromosomes, ordered=True)
+    frame = frame[frame.chrom.isin(list_of_chromosomes)]
+    return frame.assign(chrom=frame.chrom.astype(chrom_type))
+
+
+def factorize_lines(data):
+    """Split `data` (bytes) into lines and give identical lines the same
+    code, without creating a Python object per line. Lines are hashed
+    LINE_WORD bytes at a time.
+
+        Returns:
+            starts, ends -- byte offsets of every line, excluding newline
+            codes -- code of every line
+            first_lines -- index of the first line holding each code
+    """
+    buf = numpy.frombuffer(data, dtype=numpy.uint8)
+    ends = numpy.flatnonzero(buf == ord("\n"))
+    if len(buf) > 0 and (len(ends) == 0 or ends[-1] != len(buf) - 1):
+        ends = numpy.append(ends, len(buf))  # last line lacks newline
+    starts = numpy.zeros(len(ends), dtype=numpy.int64)
+    starts[1:] = ends[:-1] + 1
+    lengths = ends - starts
+    padded = numpy.concatenate((buf, numpy.zeros(LINE_WORD, dtype=numpy.uint8)))
+    # unaligned view, element i holds the LINE_WORD bytes starting at byte i
+    byte_words = numpy.ndarray(shape=(len(buf) + 1,), dtype="<u8", buffer=padded, strides=(1,))
+    masks = numpy.array(LINE_WORD_MASKS, dtype=numpy.uint64)
+
+    def words(rows, offset):
+        row_words = byte_words[starts[rows] + offset]
+        return row_words & masks[numpy.minimum(lengths[rows] - offset, LINE_WORD)]
+
+    codes, uniques = pandas.factorize(words(slice(None), 0))
+    n_codes = len(uniques)
+    rows = numpy.arange(len(starts))
+    for offset in range(LINE_WORD, lengths.max(initial=0), LINE_WORD):
+        # give lines longer than offset new codes, taking their next word into account
+        rows = rows[lengths[rows] > offset]
+        word_codes, word_uniques = pandas.factorize(words(rows, offset))
+        row_codes, row_uniques = pandas.factorize(codes[rows] * len(word_uniques) + word_codes)
+        codes[rows] = n_codes + row_codes
+        n_codes += len(row_uniques)
+
+    first_lines = numpy.full(n_codes, -1, dtype=numpy.int64)
+    first_lines[codes[::-1]] = numpy.arange(len(codes) - 1, -1, -1)
+    if n_codes > len(uniques):  # drop codes no longer in use
+        in_use = first_lines >= 0
+        codes = (numpy.cumsum(in_use) - 1)[codes]
+        first_lines = first_lines[in_use]
+    return starts, ends, codes, first_lines
+
+
+def decimate_area(x, y, column_width, row_height, top):
+    """Reduce polyline (x, y), drawn as an area filled down to y = 0 and
+    clipped at y = 'top', to two vertices per pixel it partly covers, for
+    pixels 'column_width' wide and 'row_height' high.
+
+    Anti-aliased pixels only depend on how much of them is covered, not
+    on the shape within. Each pixel column is therefore replaced by a
+    falling staircase with a step per row, as wide as the covered part of
+    its pixel. Every pixel keeps its exact coverage, so the area is drawn
+    the same. Returns (x, y) unchanged unless that at least halves the
+    vertices."""
+    x = numpy.asarray(x, dtype=float)
+    y = numpy.asarray(y, dtype=float)
+    if len(x) < 2:
+        return x, y
+    first = numpy.floor(x[0] / column_width)
+    n_columns = int(numpy.floor(x[-1] / column_width) - first) + 1
+    if len(x) < 2 * n_columns * 2:  # at least two vertices per column
+        return x, y
+
+    # covered part of every pixel, and of its row, as columns x rows from the bottom
+    n_rows = int(numpy.ceil(top / row_height))
+    pixel_y = numpy.clip(y, 0, top) / row_height
+    covered = raster.area_coverage(x / column_width - first, pixel_y, n_columns, n_rows).T
+    numpy.minimum.accumulate(covered, axis=1, out=covered)  # no row covers more than one below
+    full_rows = (covered >= 1 - COVERED_TOLERANCE).sum(axis=1)
+    partial = (covered > COVERED_TOLERANCE) & (covered < 1 - COVERED_TOLERANCE)
+    partial_rows = partial.sum(axis=1)
+    counts = 2 * partial_rows + 2
+    if 2 * counts.sum() > len(x):
+        return x, y
+
+    # per column: top left corner, a step per partial row from the top
+    # down and the bottom right corner
+    borders = (first + numpy.arange(n_columns + 1)) * column_width
+    column_left = numpy.maximum(borders[:-1], x[0])
+    column_right = numpy.minimum(borders[1:], x[-1])
+    ends = numpy.cumsum(counts)
+    starts = ends - counts
+    decimated_x = numpy.empty(ends[-1])
+    decimated_y = numpy.empty(ends[-1])
+    decimated_x[starts] = column_left
+    decimated_y[starts] = (full_rows + partial_rows) * row_height
+    decimated_x[ends - 1] = column_right
+    decimated_y[ends - 1] = full_rows * row_height
+    columns, flipped_rows = numpy.nonzero(partial[:, ::-1])
+    rows = n_rows - 1 - flipped_rows
+    steps = starts[columns] + 1 + 2 * (
+        numpy.arange(len(columns)) - (numpy.cumsum(partial_rows) - partial_rows)[columns]
+    )
+    step_x = column_left[columns] + covered[columns, rows] * column_width
+    decimated_x[steps] = decimated_x[steps + 1] = step_x
+    decimated_y[steps] = (rows + 1) * row_height
+    decimated_y[steps + 1] = rows * row_height
+    return decimated_x, decimated_y
+
+
+def decimate_bars(x, heights, widths, column_width):
+    """Reduce bars centered on x to one bar per run of pixel columns of
+    'column_width' with the same height. Bars are opaque and snapped to
+    whole pixels when drawn, so every column shows the highest bar
+    covering it and the result looks the same."""
+    x = numpy.asarray(x, dtype=float)
+    heights = numpy.asarray(heights, dtype=float)
+    widths = numpy.asarray(widths, dtype=float)
+    # columns covered by every bar, with edges rounded as when drawn
+    first = numpy.floor((x - widths / 2) / column_width + 0.5).astype(int)
+    last = numpy.floor((x + widths / 2) / column_width + 0.5).astype(int)
+    counts = numpy.where(heights > 0, numpy.maximum(last - first, 0), 0)
+    if counts.sum() == 0:
+        return x, heights, widths
+
+    offset = first.min()
+    covered = numpy.repeat(first - offset, counts) + numpy.arange(counts.sum())
+    covered -= numpy.repeat(numpy.cumsum(counts) - counts, counts)
+    skyline = numpy.zeros(covered.max() + 3)  # zero before and after
+    numpy.maximum.at(skyline, covered + 1, numpy.repeat(heights, counts))
+    edges = numpy.flatnonzero(numpy.diff(skyline))  # column where a run starts
+    run_first, run_last = edges[:-1], edges[1:]
+    run_heights = skyline[run_first + 1]
+    keep = run_heights > 0
+    run_first, run_last, run_heights = run_first[keep], run_last[keep], run_heights[keep]
+    if len(run_heights) >= len(x):
+        return x, heights, widths
+    return (
+        (run_first + run_last + 2 * offset) / 2 * column_width,
+        run_heights,
+        (run_last - run_first) * column_width,
+    )
+
+
+def strip_compression(filepath):
+    """Return 'filepath' without a suffix of gzip compression"""
+    (filename, ending) = os.path.splitext(filepath)
+    return filename if ending in COMPRESSED_SUFFIXES else filepath
 
 
 def png_filename(infile, label):
     """Return filename with 'label' and suffix 'png'"""
-    (filename, _ending) = os.path.splitext(infile)
+    (filename, _ending) = os.path.splitext(strip_compression(infile))
     return filename + "_" + label + ".png"
 
 
@@ -41,14 +200,43 @@ def parse_wig_declaration(wigfile, separator=" "):
     """
     max_iterations = 12         # parse no more lines after
     i = 0
-    fp = open(wigfile)
-    while i < max_iterations:
-        line = fp.readline()
-        x, *xs = line.split(separator)
-        if x.lower() == 'fixedstep' and 'chrM' not in xs[0]:
-            declaration = make_dict(xs)   # split xs on '=' to get a dict
-            return cast(declaration)
-        i += 1
+    with open_input(wigfile) as fp:
+        while i < max_iterations:
+            line = fp.readline()
+            x, *xs = line.split(separator)
+            if x.lower() == 'fixedstep' and 'chrM' not in xs[0]:
+                declaration = make_dict(xs)   # split xs on '=' to get a dict
+                return cast(declaration)
+            i += 1
+    raise Warning('declarationNotFound')
+
+
+def parse_track_header(filepath, max_lines=12):
+    """Detect the format of a coverage track from its first lines. Return
+    dict of 'format', one of 'fixedStep', 'variableStep', 'bedGraph',
+    'bigWig' or 'pyramid', 'chrom', chromosome naming as by chr_type_format,
+    and 'step', the step of fixedStep tracks else None. Track, browser and
+    comment lines are skipped."""
+    if pyramid.is_pyramid(filepath):
+        names = pyramid.chromosome_names(filepath) or [""]
+        return {"format": "pyramid", "chrom": chr_type_format(names[0]), "step": None}
+    if bigwig.byte_order(filepath):
+        names = bigwig.chromosome_names(filepath) or [""]
+        return {"format": "bigWig", "chrom": chr_type_format(names[0]), "step": None}
+    with open_input(filepath) as fp:
+        for _ in range(max_lines):
+            x, *xs = fp.readline().split() or [""]
+            if x.lower() == "fixedstep":
+                return dict(parse_wig_declaration(filepath), format="fixedStep")
+            if x.lower() == "variablestep":
+                declaration = make_dict(xs)
+                return {
+                    "format": "variableStep",
+                    "chrom": chr_type_format(declaration["chrom"]),
+                    "step": None,
+                }
+            if len(xs) == 3 and x not in ("track", "browser") and not x.startswith("#"):
+                return {"format": "bedGraph", "chrom": chr_type_format(x), "step": None}
     raise Warning('declarationNotFound')
 
 
@@ -57,14 +245,14 @@ def parse_bed(filepath, separator="\t"):
     starting with '#' are treated as comments. """
     max_iterations = 12         # parse no more lines after
     i = 0
-    fp = open(filepath)
-    while i < max_iterations:
-        line = fp.readline()
-        if line.startswith("#"):
-            continue
-        x, *xs = line.split(separator)
-        print("line: {}".format(x))
-        return chr_type_format(x)
+    with open_input(filepath) as fp:
+        while i < max_iterations:
+            line = fp.readline()
+            if line.startswith("#"):
+                continue
+            x, *xs = line.split(separator)
+            LOG.debug("line: %s", x)
+            return chr_type_format(x)
 
     raise Warning('declarationNotFound')
 
@@ -12,41 +12,80 @@ Project on Github:
     https://github.com/mikaell/chromograph
 
 """
+import functools
+import io
+import logging
 import os
 import re
 import sys
 from argparse import ArgumentParser
-import pandas
-import matplotlib
-from matplotlib import pyplot as plt
-from matplotlib.collections import BrokenBarHCollection
 from chromograph import __version__
+from . import bigwig, inmemory, pipeline, pyramid, raster, timing
+from .archive import FORMATS, archive_path, write_images
+from .atlas import write_atlas
+from .bgzf import open_input, read_input
+from .cache import cached_dataframe, default_cache_dir
+from .incremental import up_to_date, write_manifest
+from .region import parse_region, read_tabix_region, read_wig_region, same_chromosome
 from .chr_utils import (
     chr_type_format,
+    decimate_area,
+    decimate_bars,
+    factorize_lines,
     filter_dataframe,
+    make_dict,
     outpath,
     parse_bed,
+    parse_track_header,
     parse_upd_regions,
-    parse_wig_declaration,
+    strip_compression,
 )
+from .lazy import lazy_import
 
-matplotlib.use("Agg")
+numpy = lazy_import("numpy")
+pandas = lazy_import("pandas")
+
+LOG = logging.getLogger(__name__)
+
+
+class NoDataError(ValueError):
+    """Raised when an input has no rows to draw"""
 
 
 # TODO: instead of padding look-ahead and contsrict if overlap
 # TODO: combined ROH image
 
+HELP_STR_ATLAS = "Write all chromosomes to one PNG with a JSON index of their positions"
+HELP_STR_BATCH = "Run every job in a YAML manifest in one process [OPERATION]"
 HELP_STR_COMBINE = "Write all graphs to one file (default one plot per file)"
 HELP_STR_COV = "Plot coverage from fixed step wig file"
+HELP_STR_ENGINE = "Draw images with Matplotlib (default) or the faster raster engine"
 HELP_STR_EU = "Always output an euploid amount of files -even if some are empty"
 HELP_STR_EXOM = "Plot exom coverage from bed-file"
+HELP_STR_INCREMENTAL = "Skip inputs whose output files are up to date with input and settings"
 HELP_STR_IDEO = "Plot ideograms from bed-file on format {}"
+HELP_STR_JOBS = "Render chromosomes in N parallel processes (default 1)"
+HELP_STR_MEMORY = "Parse BED input in chunks of at most MB megabytes (default {})"
+HELP_STR_PROFILE = "Write wall and CPU time of every stage and chromosome to FILE as JSON"
 HELP_STR_NORM = "Normalize data (wig/coverage)"
+HELP_STR_OUTPUT_FORMAT = "Write PNG files (default) or all images to one zip or SQLite archive"
+HELP_STR_PALETTE = "Write PNGs with an indexed palette of the colors drawn, several times smaller"
+HELP_STR_PNG_LEVEL = "zlib level 0-9 of PNGs written (default 1 with --small)"
+HELP_STR_PNG_FILTER = "PNG filter of every row (default up)"
+HELP_STR_PNG_STRATEGY = "zlib strategy of PNGs written (default rle with --palette)"
+HELP_STR_REGION = (
+    "Draw only chromosome CHROM, or bases START to END of it over the whole image"
+    " (WIG files are scanned whole unless --cache keeps their offset index)"
+)
+HELP_STR_VERBOSE = "Log arguments and settings besides the files written"
 HELP_STR_RGB = "Set color (RGB hex, only with --coverage option)"
 HELP_STR_UPD_REGIONS = "Plot UPD regions from bed file"
 HELP_STR_UPD_SITE = "Plot UPD sites from bed file "
 HELP_STR_EXOM = "Plot exom coverage from bed file "
 HELP_STR_VSN = "Display program version ({}) and exit."
+HELP_STR_CACHE = "Cache parsed input next to the input file, reused by later runs"
+HELP_STR_CACHE_DIR = "Cache parsed input in DIR (implies --cache)"
+HELP_STR_NO_CACHE = "Neither read nor write the cache"
 
 DPI_SMALL = 100
 DPI_MEDIUM = 300
@@ -59,6 +98,7 @@ SPACE = 1
 FIGSIZE = (6, 8)  # 7750 x 385
 FIGSIZE_WIG = (8.05, 0.685)  # 7750 x 385
 FIGSIZE_SINGLE = (8, 8)
+AXES_SIZE = (7.75, 0.385)  # inches, visible part of FIGSIZE_WIG and (10, 0.5) figures
 UPD_FORMAT = ["chrom", "start", "end", "updType"]
 ROH_BED_FORMAT = ["chrom", "start", "end"]
 IDEOGRAM_FORMAT = ["chrom", "start", "end", "name", "gStain"]
@@ -81,11 +121,17 @@ EXOM_FORMAT = [
 ]
 EXOM_GAP = 10000
 
+MEMORY_BUDGET = 64  # MB for parsing a chunk of BED, see _read_dataframe
+BED_BYTES_PER_FIELD = 64  # about, with strings as Python objects
+
 WIG_FORMAT = ["chrom", "coverage", "pos"]
 WIG_ORANGE = "#DB6400"
 WIG_MAX = 70.0
+WIG_CHROM_NAME = re.compile(r"chrom=(\w*)")
+WIG_VARIABLE_STEP = re.compile(rb"^variableStep[ \t]+([^\r\n]*)", re.MULTILINE)
 DARK_GOLD = "#A98200"
 
+IN_MEMORY = ":memory:"  # outfile of renders returning PNG bytes, see inmemory.py
 TRANSPARENT_PNG = b'\x89PNG\r\n\x1a\n\x00\x00\x00\rIHDR\x00\x00\x00\x10\x00\x00\x00\x10\x01\x03\x00\x00\x00%=m"\x00\x00\x00\x03PLTE\xff\xff\xff\xa7\xc4\x1b\xc8\x00\x00\x00\x01tRNS\x00@\xe6\xd8f\x00\x00\x00\x0cIDAT\x08\x1dc` \r\x00\x00\x000\x00\x01\x84\xac\xf1z\x00\x00\x00\x00IEND\xaeB`\x82'
 
 
@@ -154,6 +200,9 @@ get_color = {
     "EXOM_COV": "#FF5965",  # Salmon red
 }
 
+# Colors of get_color, what images with --palette are quantized to besides the track color
+PALETTE = tuple(dict.fromkeys(get_color.values()))
+
 
 # TODO: skapa pytest med md5-sum för att automatisera körningar
 
@@ -170,55 +219,100 @@ def horizontal_bar_generator_combine(dataframe, y_positions):
     Yields:
         BrokenBarHCollection
     """
-    for chrom, group in dataframe.groupby("chrom"):
-        print("chrom: {}".format(chrom))
+    from matplotlib.collections import BrokenBarHCollection
+
+    for chrom, group in dataframe.groupby("chrom", observed=True):
+        LOG.debug("chrom: %s", chrom)
         yrange = (y_positions[chrom], HEIGHT)
         xranges = group[["start", "width"]].values
-        yield BrokenBarHCollection(xranges, yrange, facecolors=group["colors"], label=chrom)
+        colors = group["colors"].to_numpy()
+        yield BrokenBarHCollection(xranges, yrange, facecolors=colors, label=chrom)
 
 
 def horizontal_bar_generator(dataframe):
-    """Iterate dataframe and create horizontal bar graphs for printing
-    Yeilds:
-    Brokenbarhcollection --from BED DF to be plotted
-    """
-    for chrom, group in dataframe.groupby("chrom"):
-        yrange = (0, HEIGHT)
-        xranges = group[["start", "width"]].values
-        yield BrokenBarHCollection(xranges, yrange, facecolors=group["colors"], label=chrom)
-
-
-def vertical_bar_generator(dataframe, x_axis, y_axis):
-    """Iterate dataframe and yeild dict representing an vertical bar graph i.e. coverage"""
-    for chrom, group in dataframe.groupby("chrom"):
-        yield {
-            "label": chrom,
-            "x": group[x_axis].values,
-            "y": group[y_axis].values,
-            "bar_width": group["bar_width"].values,
-        }
-
-
-def area_graph_generator(dataframe, x_axis, y_axis):
-    """Iterate dataframe and yeild dict representing an area graph i.e. coverage"""
-    for chrom, group in dataframe.groupby("chrom"):
+    """Iterate dataframe and yield dict representing horizontal bars, i.e. ideogram"""
+    for chrom, group in dataframe.groupby("chrom", observed=True):
         yield {
             "label": chrom,
-            "x": group[x_axis].values,
-            "y": group[y_axis].values,
+            "xranges": group[["start", "width"]].values,
+            "colors": group["colors"].to_numpy(),
         }
 
 
-def area_graph_generator_combine(dataframe, height):
-    # TODO: combining area graphs into one png is not implemented
-    yield False
+def vertical_bar_generator(dataframe, x_axis, y_axis, column_width=None):
+    """Iterate dataframe and yeild dict representing an vertical bar graph i.e. coverage.
+    Bars are merged per pixel column if 'column_width' is given"""
+    for chrom, group in dataframe.groupby("chrom", observed=True):
+        x, y, bar_width = group[x_axis].values, group[y_axis].values, group["bar_width"].values
+        if column_width:
+            x, y, bar_width = decimate_bars(x, y, bar_width, column_width)
+        yield {"label": chrom, "x": x, "y": y, "bar_width": bar_width}
+
+
+def area_graph_generator(dataframe, x_axis, y_axis, pixel=None, top=None):
+    """Iterate dataframe and yeild dict representing an area graph i.e. coverage.
+    Points are reduced to two per partly covered pixel if 'pixel', (width,
+    height) of a pixel, and 'top' of the y axis are given, see decimate_area"""
+    for chrom, group in dataframe.groupby("chrom", observed=True):
+        x, y = group[x_axis].values, group[y_axis].values
+        if pixel:
+            x, y = decimate_area(x, y, *pixel, top)
+        yield {"label": chrom, "x": x, "y": y}
+
+
+def _chromosome_order(chrom):
+    """Sort key placing chromosomes, on format '12' or 'chr12', as in CHROMOSOMES"""
+    name = chrom[3:] if chrom.startswith("chr") else chrom
+    return CHROMOSOMES.index(name) if name in CHROMOSOMES else len(CHROMOSOMES)
+
+
+def area_graph_combine(dataframe, x_axis, y_axis, pixel=None, top=None):
+    """Return dict representing one area graph of all chromosomes after each
+    other, each shifted by where the one before it ends. The graph drops to
+    0 between chromosomes. Points are reduced as in area_graph_generator.
+    Returns None if there is nothing to draw."""
+    groups = dict(tuple(dataframe.groupby("chrom", observed=True)))
+    xs, ys = [], []
+    offset = 0
+    for chrom in sorted(groups, key=_chromosome_order):
+        group = groups[chrom]
+        group = group[group[x_axis] < CHROM_END_POS]  # drop padding to the end of the axis
+        if group.empty:
+            continue
+        x = group[x_axis].values.astype(float) + offset  # beyond int32 positions
+        y = group[y_axis].values
+        xs += [x[:1], x, x[-1:]]
+        ys += [[0], y, [0]]
+        offset = x[-1]
+    if not xs:
+        return None
+    x, y = numpy.concatenate(xs).astype(float), numpy.concatenate(ys).astype(float)
+    if pixel:
+        column_width, row_height = pixel
+        x, y = decimate_area(x, y, column_width * offset / CHROM_END_POS, row_height, top)
+    return {"label": "combined", "x": x, "y": y, "end": offset}
 
 
 ## Library functions
 ## -----------------
+# rcParams from the command line, applied when Matplotlib is used
+MATPLOTLIB_RC = {}
+
+
+def _pyplot():
+    """Import Matplotlib on first use, the raster engine never needs it"""
+    import matplotlib
+
+    matplotlib.use("Agg")
+    from matplotlib import pyplot
+
+    pyplot.rcParams.update(MATPLOTLIB_RC)
+    return pyplot
+
+
 def _assure_dir(outd):
     """Create directory 'outd' if it does not exist"""
-    print("outd: {}".format(outd))
+    LOG.debug("outd: %s", outd)
     if not os.path.exists(outd):
         os.makedirs(outd)
 
@@ -247,19 +341,204 @@ def _is_chr_str(chrom):
         return "str"
 
 
-def _read_dataframe(filepath, format):
+def _chunk_rows(columns, memory):
+    """Return number of BED rows with 'columns' parsed within 'memory' MB"""
+    return max(1, int(memory * 2**20) // (BED_BYTES_PER_FIELD * len(columns)))
+
+
+def _region_chromosomes(chromosome_list, region):
+    """Return the chromosomes of 'chromosome_list' drawn for 'region', all if it is None"""
+    if region is None:
+        return chromosome_list
+    return [chrom for chrom in chromosome_list if same_chromosome(chrom, region.chrom)]
+
+
+def _window(starts, ends, region):
+    """Return (kept, starts, ends) of the intervals [starts, ends) overlapping
+    the window of 'region', clipped to it and scaled so that the window
+    spans the x-axis from 0 to CHROM_END_POS. 'kept' marks the overlapping."""
+    starts = numpy.asarray(starts, dtype=float)
+    ends = numpy.asarray(ends, dtype=float)
+    kept = (ends > region.start) & (starts < region.end)
+    scale = CHROM_END_POS / (region.end - region.start)
+
+    def scaled(values):
+        return (numpy.clip(values[kept], region.start, region.end) - region.start) * scale
+
+    return kept, scaled(starts), scaled(ends)
+
+
+def _window_fraction(region):
+    """Return the part of the x-axis the window of 'region' takes unscaled"""
+    if region is None or region.start is None:
+        return 1
+    return (region.end - region.start) / CHROM_END_POS
+
+
+def _window_bars(dataframe, region):
+    """Return bars of horizontal_bar_generator in the window of 'region'"""
+    if region is None or region.start is None:
+        return dataframe
+    kept, starts, ends = _window(dataframe.start, dataframe.start + dataframe.width, region)
+    return dataframe[kept].assign(
+        start=starts.astype(numpy.int32), width=(ends - starts).astype(numpy.int32)
+    )
+
+
+def _window_centered_bars(dataframe, region):
+    """Return bars of vertical_bar_generator, centered on 'start', in the
+    window of 'region'"""
+    if region is None or region.start is None:
+        return dataframe
+    half_width = dataframe.bar_width / 2
+    kept, lefts, rights = _window(
+        dataframe.start - half_width, dataframe.start + half_width, region
+    )
+    return dataframe[kept].assign(start=(lefts + rights) / 2, bar_width=rights - lefts)
+
+
+def _window_area(dataframe, region, x_axis, y_axis):
+    """Return area graph points in the window of 'region', the graph cut at
+    the window edges"""
+    if region is None or region.start is None:
+        return dataframe
+    frames = []
+    for chrom, group in dataframe.groupby("chrom", observed=True):
+        x, y = group[x_axis].values.astype(float), group[y_axis].values.astype(float)
+        inside = (x > region.start) & (x < region.end)
+        edges = numpy.interp([region.start, region.end], x, y, left=0, right=0)
+        x = numpy.concatenate([[region.start], x[inside], [region.end]])
+        y = numpy.concatenate([edges[:1], y[inside], edges[1:]])
+        frames.append(
+            pandas.DataFrame(
+                {
+                    "chrom": pandas.Categorical([chrom] * len(x), dataframe.chrom.cat.categories),
+                    x_axis: (x - region.start) * (CHROM_END_POS / (region.end - region.start)),
+                    y_axis: y.astype(numpy.float32),
+                }
+            )
+        )
+    return pandas.concat(frames) if frames else dataframe
+
+
+def _read_dataframe(
+    filepath, format, cache_dir=None, derive=None, usecols=None, memory=None, region=None
+):
     """Read a bed file into a Pandas dataframe according to 'format'. Do
-    some checks and return dataframe"""
-    dataframe = pandas.read_csv(filepath, dtype={"chrom": str}, names=format, sep="\t", skiprows=1)
-    # dataframe = pandas.read_csv(filepath, dtype={'chrom':str, 'start':int,  'end':int,'meanCoverage':int}, names=format, sep="\t", skiprows=1)
-    if dataframe.empty:
-        print("Warning: No suitable data found: {}!".format(filepath))
-        sys.exit(0)
-    # cast chromosome to string (read as int)
-    dataframe.chrom = dataframe.chrom.astype(str)
-    # delete chromosomes not in CHROMOSOME_LIST
-    chromosome_list = _get_chromosome_list(_is_chr_str(dataframe.chrom[0]))
-    return filter_dataframe(dataframe, chromosome_list)
+    some checks and return dataframe. Parsed data is cached in 'cache_dir'
+    if given.
+
+    The file is read in chunks parsed within 'memory' MB. Only columns
+    'usecols' are parsed, rows of other chromosomes than CHROMOSOMES, or
+    than the chromosome of 'region', are dropped and 'derive' is applied
+    to each chunk, so only the compact columns it returns are kept for the
+    whole file. Of files indexed with tabix only the lines of 'region' are
+    read."""
+    _reject_pyramid(filepath)
+    usecols = usecols or format
+    memory = memory or MEMORY_BUDGET
+
+    def read():
+        chunks = []
+        rows = 0
+        chromosome_list = None
+        if region is not None and os.path.exists(filepath + ".tbi"):
+            source, skiprows = io.BytesIO(read_tabix_region(filepath, region)), 0
+        else:
+            source, skiprows = open_input(filepath, "rb"), 1
+        with source as filestream:
+            reader = pandas.read_csv(
+                filestream,
+                dtype={"chrom": str},
+                names=format,
+                usecols=usecols,
+                sep="\t",
+                skiprows=skiprows,
+                chunksize=_chunk_rows(usecols, memory),
+            )
+            for chunk in reader:
+                rows += len(chunk)
+                if chromosome_list is None and rows > 0:
+                    chromosome_list = _region_chromosomes(
+                        _get_chromosome_list(_is_chr_str(chunk.chrom.iloc[0])), region
+                    )
+                # delete chromosomes not in CHROMOSOME_LIST
+                chunk = filter_dataframe(chunk, chromosome_list or [])
+                chunks.append(derive(chunk) if derive else chunk)
+        if rows == 0 and region is None:
+            raise NoDataError("No suitable data found: {}".format(filepath))
+        if rows == 0:
+            LOG.warning("No data in region %s: %s", region.chrom, filepath)
+            chrom_type = pandas.CategoricalDtype([region.chrom], ordered=True)
+            return chunks[0].assign(chrom=chunks[0].chrom.astype(str).astype(chrom_type))
+        return pandas.concat(chunks) if len(chunks) > 1 else chunks[0]
+
+    derived = derive.__name__ if derive else None
+    with timing.stage("read") as fields:
+        dataframe = cached_dataframe(
+            cache_dir, filepath, read, "bed", format, usecols, derived, partial=region is not None
+        )
+        fields["rows"] = len(dataframe)
+    if region is not None:  # a cached dataframe holds all chromosomes
+        chromosome_list = list(dataframe.chrom.cat.categories)
+        dataframe = filter_dataframe(dataframe, _region_chromosomes(chromosome_list, region))
+    return dataframe
+
+
+def _reject_pyramid(filepath):
+    """Raise ValueError if 'filepath' is a track pyramid, which holds no BED records"""
+    if pyramid.is_pyramid(filepath):
+        raise ValueError(
+            "{} is a track pyramid, only --coverage, --fracsnp and --exom read it".format(filepath)
+        )
+
+
+def _color_type():
+    """Return dtype of color columns, small integer codes into the colors of get_color"""
+    return pandas.CategoricalDtype(list(dict.fromkeys(get_color.values())))
+
+
+def _map_colors(values):
+    """Return colors of 'values' as given by get_color"""
+    colors = values.map(get_color)
+    unknown = values[colors.isna()]
+    if len(unknown) > 0:
+        raise KeyError(unknown.iloc[0])
+    return colors
+
+
+def _bars(chunk, colors, padding=0):
+    """Return chromosome, start, width and color of bars from BED rows"""
+    frame = pandas.DataFrame(
+        {
+            "chrom": chunk.chrom,
+            "start": chunk.start,
+            "width": chunk.end - chunk.start + padding,
+            "colors": colors,
+        }
+    )
+    return frame.astype({"start": numpy.int32, "width": numpy.int32, "colors": _color_type()})
+
+
+def _ideogram_bars(chunk):
+    return _bars(chunk, _map_colors(chunk.gStain))
+
+
+def _autozyg_bars(chunk):
+    return _bars(chunk, get_color["PB_HOMOZYGOUS"], PADDING)
+
+
+def _upd_site_bars(chunk):
+    return _bars(chunk, _map_colors(chunk.updType), PADDING)
+
+
+def _exom_weights(chunk):
+    """Return exoms with their coverage weighted by width"""
+    weight = (chunk.end - chunk.start) * chunk.meanCoverage
+    frame = pandas.DataFrame(
+        {"chrom": chunk.chrom, "start": chunk.start, "end": chunk.end, "weight": weight}
+    )
+    return frame.astype({"start": numpy.int32, "end": numpy.int32, "weight": numpy.float32})
 
 
 def _get_tint_color(disomy_type, parent):
@@ -295,32 +574,70 @@ def _args_to_dict(filepath, args):
 
     Returns: Dict
     """
-    print("ARGS______")
-    print(args)
-    settings = DEFAULT_SETTING
+    LOG.debug("ARGS______\n%s", args)
+    settings = dict(DEFAULT_SETTING)
     settings["outd"] = os.path.dirname(filepath)
     head, *_tail = list(args)
-    print(head.get("small"))
 
-    settings["combine"] = head.get("combine") == "combine"
-    settings["normalize"] = head.get("norm") == "norm"
-    settings["euploid"] = head.get("euploid") == "euploid"
+    # flags are strings from the command line, booleans from parse_lib_call
+    settings["combine"] = head.get("combine") in ("combine", True)
+    settings["normalize"] = head.get("norm") in ("norm", True) or head.get("normalize") is True
+    settings["euploid"] = head.get("euploid") in ("euploid", True)
     if "outd" in head and head["outd"] is not None:
         _assure_dir(head["outd"])
         settings["outd"] = head["outd"]
     settings["step"] = head.get("step")
+    settings["jobs"] = head.get("jobs") or 1
+    settings["engine"] = head.get("engine") or "matplotlib"
+    settings["cache_dir"] = head.get("cache_dir")
+    settings["incremental"] = bool(head.get("incremental"))
+    settings["atlas"] = bool(head.get("atlas"))
+    settings["memory"] = head.get("memory") or MEMORY_BUDGET
+    settings["region"] = _parse_region(head.get("region"))
+    settings["profile_json"] = head.get("profile_json")
+    settings["in_memory"] = bool(head.get("in_memory"))
+    settings["output_format"] = head.get("output_format") or "png"
+    if settings["output_format"] in FORMATS:
+        for option in ("atlas", "incremental"):
+            if settings[option]:
+                raise ValueError("option {} can't write to an archive".format(option))
+        settings["in_memory"] = True  # images are rendered in memory, then archived
+    elif settings["output_format"] != "png":
+        raise ValueError("output format must be png or one of {}".format(FORMATS))
+    if head.get("cache") and settings["cache_dir"] is None:
+        settings["cache_dir"] = default_cache_dir(filepath)
+    if head.get("no_cache"):
+        settings["cache_dir"] = None
     if head.get("small"):
         settings["dpi"] = DPI_SMALL
     elif head.get("large"):
         settings["dpi"] = DPI_LARGE
     else:
         settings["dpi"] = DPI_MEDIUM
+    level = head.get("png_level")
+    if level is None and head.get("small"):
+        level = raster.FAST_LEVEL  # thumbnails are many and small, compress them fast
+    settings["png"] = raster.png_options(
+        PALETTE if head.get("palette") else None,
+        level,
+        head.get("png_filter"),
+        head.get("png_strategy"),
+    )
 
-    print("SETTINGS")
-    print(settings)
+    LOG.debug("SETTINGS\n%s", settings)
     return settings
 
 
+def _parse_region(region):
+    """Return Region of 'region', given as text or as Region, or None if not given"""
+    if not region:
+        return None
+    region = parse_region(region) if isinstance(region, str) else region
+    if region.chrom.replace("chr", "", 1) not in CHROMOSOMES:
+        raise ValueError("unknown chromosome in region: {}".format(region.chrom))
+    return region
+
+
 def _wig_args_to_dict(header, filepath, args):
     """Override default settings if argument is given, return settings dict for coverage/wig"""
     settings = _args_to_dict(filepath, args)
@@ -328,6 +645,9 @@ def _wig_args_to_dict(header, filepath, args):
     settings["fixedStep"] = header["step"]
     if "rgb" in args and args.rgb is not None:
         settings["color"] = _rgb_str(args.rgb)
+    if settings["png"] is not None and settings["png"].palette:
+        palette = tuple(dict.fromkeys(settings["png"].palette + (settings["color"],)))
+        settings["png"] = settings["png"]._replace(palette=palette)
     if "step" in args and args.step is not None:
         settings["fixedStep"] = args.step
     return settings
@@ -341,21 +661,42 @@ def _rgb_str(color):
     return "#" + str(color)
 
 
-def regions_to_hbar(region_list_chr):
-    """Make a MathPlotLIb 'BrokenbarCollection' from upd sites data,
-    Isodisomy will have one block and one color. Heterodisomy will
-    be two adjecent bars with two colors. Both plots will have a
-    transperant middle line for aestetics."""
-    return_list = []
-    for i in region_list_chr:
-        hbar_upper = BrokenBarHCollection(
-            i["xranges"], (0.52, 1), facecolors=i["upper"], label=i["chr"]
-        )
-        hbar_lower = BrokenBarHCollection(
-            i["xranges"], (0, 0.48), facecolors=i["lower"], label=i["chr"]
-        )
-        return_list.append([hbar_upper, hbar_lower])
-    return return_list
+def _unchanged(operation, filepath, settings):
+    """Return output files of 'filepath' if rendering incrementally and
+    they are up to date, else None"""
+    if not settings["incremental"]:
+        return None
+    outfiles = up_to_date(filepath, operation, settings, __version__)
+    if outfiles is not None:
+        LOG.info("Up to date, skipping: %s", filepath)
+    return outfiles
+
+
+def _rendered(operation, filepath, settings, outfiles):
+    """Record output files of 'filepath' if rendering incrementally, return
+    them. Images rendered for an archive are written to it, the archive is
+    returned."""
+    if settings["output_format"] in FORMATS:
+        return _archived(filepath, settings, outfiles)
+    if settings["incremental"]:
+        write_manifest(filepath, operation, settings, __version__, outfiles)
+    return outfiles
+
+
+def _archived(filepath, settings, images):
+    """Add 'images', {label: PNG bytes}, to the archive in the output
+    directory, named as the files they would have been written to"""
+    if not images:
+        return []
+    outfile = archive_path(settings["outd"], settings["output_format"])
+    names = {
+        os.path.basename(outpath(settings["outd"], filepath, label)): png
+        for label, png in images.items()
+    }
+    with timing.stage("write"):
+        write_images(outfile, settings["output_format"], names)
+    LOG.info("outfile: %s, %d images", outfile, len(names))
+    return [outfile]
 
 
 def region_to_dict(region):
@@ -380,70 +721,422 @@ def region_to_dict(region):
 
 def compile_per_chrom(hbar_list):
     """Return [{chr: upper: lower:}]"""
-    if hbar_list == []:
-        return []
+    per_chrom = {}
+    for i in hbar_list:
+        comp = per_chrom.setdefault(
+            i["chr"], {"chr": i["chr"], "xranges": [], "upper": [], "lower": []}
+        )
+        comp["xranges"].append(i["xranges"])
+        comp["upper"].append(i["hbar_upper"])
+        comp["lower"].append(i["hbar_lower"])
+    return list(per_chrom.values())
+
+
+def _window_upd_regions(per_chrom, region):
+    """Return regions of compile_per_chrom of the chromosome of 'region', in its window"""
+    if region is None:
+        return per_chrom
+    windowed = []
+    for comp in per_chrom:
+        if not same_chromosome(comp["chr"], region.chrom):
+            continue
+        if region.start is not None:
+            xranges = numpy.asarray(comp["xranges"], dtype=float).reshape(-1, 2)
+            kept, starts, ends = _window(xranges[:, 0], xranges.sum(axis=1), region)
+            comp = {
+                "chr": comp["chr"],
+                "xranges": list(zip(starts, ends - starts)),
+                "upper": [color for color, keep in zip(comp["upper"], kept) if keep],
+                "lower": [color for color, keep in zip(comp["lower"], kept) if keep],
+            }
+        if comp["xranges"]:
+            windowed.append(comp)
+    return windowed
+
+
+## Functions to render one chromosome, run in worker processes if jobs > 1
+## -----------------------------------------------------------------------
+def _set_resolution(resolution):
+    """Set DPI before the figure is created, output is then the same
+    whether rendered in this process or in a worker"""
+    plt = _pyplot()
+    plt.rcParams["figure.dpi"] = resolution
+    plt.rcParams["savefig.dpi"] = resolution
+
+
+def _save(fig, outfile, resolution, png=None):
+    """Save figure to 'outfile', return it as PNG bytes if 'outfile' is
+    IN_MEMORY or as an RGBA array if 'outfile' is None. PngOptions 'png'
+    other than the zlib level are applied by encoding Agg's pixels again
+    with the raster encoder."""
+    encode_again = png is not None and bool(png.palette or png.filter or png.strategy)
+    pil_kwargs = None
+    if encode_again:
+        pil_kwargs = {"compress_level": 0}  # only decoded again
+    elif png is not None and png.level is not None:
+        pil_kwargs = {"compress_level": png.level}
+    buffer = io.BytesIO()
+    with timing.stage("draw"):  # Agg draws the figure while saving it
+        fig.savefig(
+            buffer,
+            format="png",
+            transparent=True,
+            bbox_inches="tight",
+            pad_inches=0,
+            dpi=resolution,
+            pil_kwargs=pil_kwargs,
+        )
+    if outfile is not None:
+        data = buffer.getvalue()
+        if encode_again:
+            data = lambda saved=data: raster.encode_png(_png_pixels(saved), resolution, png)
+        return _output(outfile, data)
+    buffer.seek(0)
+    image = _pyplot().imread(buffer, format="png")  # floats from 0 to 1
+    return (image * 255 + 0.5).astype(numpy.uint8)
 
-    mylist = []
-    comp = {"chr": None, "xranges": [], "upper": [], "lower": []}
-    mylist.append(comp)
 
-    for i in hbar_list:
-        # same chromosome, add to lists
-        if mylist[-1]["chr"] is None:
-            mylist[-1]["chr"] = i["chr"]
-            mylist[-1]["xranges"].append(i["xranges"])
-            mylist[-1]["upper"].append(i["hbar_upper"])
-            mylist[-1]["lower"].append(i["hbar_lower"])
-        elif mylist[-1]["chr"] == i["chr"]:
-            mylist[-1]["xranges"].append(i["xranges"])
-            mylist[-1]["upper"].append(i["hbar_upper"])
-            mylist[-1]["lower"].append(i["hbar_lower"])
-        else:
-            mylist.append(
-                {
-                    "chr": i["chr"],
-                    "xranges": [i["xranges"]],
-                    "upper": [i["hbar_upper"]],
-                    "lower": [i["hbar_lower"]],
-                }
-            )
-    return mylist
+def _png_pixels(data):
+    """Return RGBA pixels of PNG bytes saved by Matplotlib"""
+    from PIL import Image  # pylint: disable=import-outside-toplevel
+
+    return numpy.asarray(Image.open(io.BytesIO(data)).convert("RGBA"))
+
+
+def _output(outfile, data):
+    """Return 'data', PNG bytes or a function encoding them, as bytes if
+    'outfile' is IN_MEMORY, else write it to 'outfile' and return None"""
+    if outfile != IN_MEMORY:
+        pipeline.write(outfile, data)
+        return None
+    if callable(data):
+        with timing.stage("encode"):
+            return data()
+    return data
+
+
+# Figures set up once per process and track type, see _figure_template
+_FIGURES = {}
+
+
+def _figure_template(kind, resolution, setup):
+    """Return (fig, axis, artists) made by 'setup' the first time 'kind' is
+    rendered at 'resolution' in this process. Later chromosomes only update
+    the data of the artists, sparing figure creation and layout."""
+    key = (kind, resolution)
+    if key not in _FIGURES:
+        _set_resolution(resolution)
+        _FIGURES[key] = setup()
+    return _FIGURES[key]
+
+
+def _bar_verts(starts, widths, bottom, top):
+    """Return vertices of rectangles as drawn by BrokenBarHCollection"""
+    left = numpy.asarray(starts, dtype=float)
+    right = left + numpy.asarray(widths, dtype=float)
+    verts = numpy.empty((len(left), 5, 2))
+    verts[:, :, 0] = numpy.stack([left, left, right, right, left], axis=1)
+    verts[:, :, 1] = [bottom, top, top, bottom, bottom]
+    return verts
+
+
+def _horizontal_bars_template(n_collections):
+    """Figure with 'n_collections' empty bar collections spanning y 0 to HEIGHT"""
+    from matplotlib.collections import PolyCollection
+
+    fig = _pyplot().figure(figsize=(10, 0.5))
+    axis = fig.add_subplot(111)
+    collections = [PolyCollection([]) for _ in range(n_collections)]
+    for collection in collections:
+        axis.add_collection(collection, autolim=False)
+    _common_settings(axis)
+    axis.set_ylim(0, HEIGHT)
+    axis.set_xlim(0, CHROM_END_POS)  # bounds within maximum chromosome length
+    return fig, axis, collections
+
+
+def _render_horizontal_bars(chrom_data, outfile, resolution, png=None):
+    """Render one chromosome from horizontal_bar_generator"""
+    fig, _axis, (bars,) = _figure_template(
+        "horizontal_bars", resolution, lambda: _horizontal_bars_template(1)
+    )
+    xranges = numpy.asarray(chrom_data["xranges"], dtype=float).reshape(-1, 2)
+    bars.set_verts(_bar_verts(xranges[:, 0], xranges[:, 1], 0, HEIGHT))
+    bars.set_facecolor(chrom_data["colors"])
+    return _save(fig, outfile, resolution, png)
+
+
+def _area_graph_template():
+    fig, axis = _pyplot().subplots(figsize=FIGSIZE_WIG)
+    _common_settings(axis)
+    (area,) = axis.stackplot([0, 1], [0, 0])
+    axis.set_ylim(bottom=0)
+    fig.tight_layout()
+    return fig, axis, area
+
+
+def _render_area_graph(chrom_data, outfile, color, ylim_height, resolution, png=None):
+    """Render one chromosome from area_graph_generator"""
+    fig, axis, area = _figure_template("area_graph", resolution, _area_graph_template)
+    axis.set_xlim(0, chrom_data.get("end", CHROM_END_POS))
+    x = numpy.asarray(chrom_data["x"], dtype=float)
+    y = numpy.asarray(chrom_data["y"], dtype=float)
+    # polygon as made by stackplot's fill_between(x, 0, y): out along y = 0
+    # from (x[0], y[0]) to (x[-1], y[-1]) and back along the data
+    verts = numpy.zeros((2 * len(x) + 2, 2))
+    verts[0] = x[0], y[0]
+    verts[1 : len(x) + 1, 0] = x
+    verts[len(x) + 1] = x[-1], y[-1]
+    verts[len(x) + 2 :, 0] = x[::-1]
+    verts[len(x) + 2 :, 1] = y[::-1]
+    area.set_verts([verts])
+    area.set_facecolor(color)
+    axis.set_ylim(0, ylim_height)
+    return _save(fig, outfile, resolution, png)
+
+
+def _bar_chart_template():
+    from matplotlib.collections import PolyCollection
+
+    fig, axis = _pyplot().subplots(figsize=FIGSIZE_WIG)
+    _common_settings(axis)
+    bars = PolyCollection([], linewidth=0)
+    axis.add_collection(bars, autolim=False)
+    axis.set_xlim(0, CHROM_END_POS)  # bounds within maximum chromosome length
+    fig.tight_layout()
+    return fig, axis, bars
+
+
+def _render_bar_chart(chrom_data, outfile, color, ylim_height, resolution, png=None):
+    """Render one chromosome from vertical_bar_generator"""
+    fig, axis, bars = _figure_template("bar_chart", resolution, _bar_chart_template)
+    width = numpy.asarray(chrom_data["bar_width"], dtype=float)
+    left = numpy.asarray(chrom_data["x"], dtype=float) - width / 2  # bars are centered
+    verts = _bar_verts(left, width, 0, 0)
+    verts[:, 1:3, 1] = numpy.asarray(chrom_data["y"], dtype=float)[:, None]
+    bars.set_verts(verts)
+    bars.set_facecolor(color)
+    axis.set_ylim(0, ylim_height)
+    return _save(fig, outfile, resolution, png)
+
+
+def _render_upd_regions(region, outfile, resolution, png=None):
+    """Render one chromosome from compile_per_chrom"""
+    fig, _axis, (upper, lower) = _figure_template(
+        "upd_regions", resolution, lambda: _horizontal_bars_template(2)
+    )
+    xranges = numpy.asarray(region["xranges"], dtype=float).reshape(-1, 2)
+    upper.set_verts(_bar_verts(xranges[:, 0], xranges[:, 1], 0.52, 1))
+    upper.set_facecolor(region["upper"])
+    lower.set_verts(_bar_verts(xranges[:, 0], xranges[:, 1], 0, 0.48))
+    lower.set_facecolor(region["lower"])
+    return _save(fig, outfile, resolution, png)
+
+
+def _column_width(resolution):
+    """Return base pairs per pixel column of images at 'resolution'"""
+    return CHROM_END_POS / (AXES_SIZE[0] * resolution)
+
+
+def _pixel_size(resolution, ylim_height):
+    """Return (width, height) of a pixel of track images at 'resolution',
+    in base pairs and units of a y axis up to 'ylim_height'"""
+    return _column_width(resolution), ylim_height / (AXES_SIZE[1] * resolution)
+
+
+def _raster_size(resolution):
+    """Return (width, height) in pixels of the axes area and of the image"""
+    width, height = AXES_SIZE[0] * resolution, AXES_SIZE[1] * resolution
+    return width, height, int(width), int(height)
+
+
+def _save_raster(image, outfile, resolution, png=None):
+    """Write image to 'outfile' as PNG encoded as given by PngOptions 'png',
+    return the PNG bytes if 'outfile' is IN_MEMORY or the image if 'outfile'
+    is None"""
+    if outfile is None:
+        return image
+    return _output(outfile, lambda: raster.encode_png(image, resolution, png))
+
+
+def _raster_horizontal_bars(chrom_data, outfile, resolution, png=None):
+    """Render one chromosome from horizontal_bar_generator without Matplotlib"""
+    width, _, image_width, image_height = _raster_size(resolution)
+    with timing.stage("draw"):
+        image = raster.new_image(image_width, image_height)
+        scale = width / CHROM_END_POS
+        xranges = numpy.asarray(chrom_data["xranges"], dtype=float).reshape(-1, 2)
+        x0 = xranges[:, 0] * scale
+        x1 = (xranges[:, 0] + xranges[:, 1]) * scale
+        raster.fill_rectangles(image, x0, x1, 0, image_height, list(chrom_data["colors"]))
+    return _save_raster(image, outfile, resolution, png)
+
+
+def _raster_area_graph(chrom_data, outfile, color, ylim_height, resolution, png=None):
+    """Render one chromosome from area_graph_generator without Matplotlib"""
+    width, height, image_width, image_height = _raster_size(resolution)
+    with timing.stage("draw"):
+        image = raster.new_image(image_width, image_height)
+        end = chrom_data.get("end", CHROM_END_POS)  # combined graphs span all chromosomes
+        x = numpy.asarray(chrom_data["x"], dtype=float) * (width / end)
+        y = numpy.asarray(chrom_data["y"], dtype=float) * (height / ylim_height)
+        raster.fill_area(image, x, y, color)
+    return _save_raster(image, outfile, resolution, png)
+
+
+def _raster_bar_chart(chrom_data, outfile, color, ylim_height, resolution, png=None):
+    """Render one chromosome from vertical_bar_generator without Matplotlib"""
+    width, height, image_width, image_height = _raster_size(resolution)
+    with timing.stage("draw"):
+        image = raster.new_image(image_width, image_height)
+        scale = width / CHROM_END_POS
+        x = numpy.asarray(chrom_data["x"], dtype=float)
+        half_width = numpy.asarray(chrom_data["bar_width"], dtype=float) / 2  # bars are centered
+        y = numpy.asarray(chrom_data["y"], dtype=float) * (height / ylim_height)
+        x0, x1 = (x - half_width) * scale, (x + half_width) * scale
+        raster.fill_rectangles(image, x0, x1, 0, y, color)
+    return _save_raster(image, outfile, resolution, png)
+
+
+def _raster_upd_regions(region, outfile, resolution, png=None):
+    """Render one chromosome from compile_per_chrom without Matplotlib"""
+    width, height, image_width, image_height = _raster_size(resolution)
+    with timing.stage("draw"):
+        image = raster.new_image(image_width, image_height)
+        scale = width / CHROM_END_POS
+        xranges = numpy.asarray(region["xranges"], dtype=float).reshape(-1, 2)
+        x0 = xranges[:, 0] * scale
+        x1 = (xranges[:, 0] + xranges[:, 1]) * scale
+        raster.fill_rectangles(image, x0, x1, 0.52 * height, height, region["upper"])
+        raster.fill_rectangles(image, x0, x1, 0, 0.48 * height, region["lower"])
+    return _save_raster(image, outfile, resolution, png)
+
+
+RENDERERS = {
+    "matplotlib": {
+        "horizontal_bars": _render_horizontal_bars,
+        "area_graph": _render_area_graph,
+        "bar_chart": _render_bar_chart,
+        "upd_regions": _render_upd_regions,
+    },
+    "raster": {
+        "horizontal_bars": _raster_horizontal_bars,
+        "area_graph": _raster_area_graph,
+        "bar_chart": _raster_bar_chart,
+        "upd_regions": _raster_upd_regions,
+    },
+}
+
+
+def _init_worker(matplotlib_rc):
+    """Give worker processes the same Matplotlib settings as the main process"""
+    MATPLOTLIB_RC.update(matplotlib_rc)
+
+
+def _vertices(chrom_data):
+    """Return number of vertices drawn of one chromosome, 4 per bar"""
+    if "xranges" in chrom_data:
+        return 4 * len(numpy.reshape(chrom_data["xranges"], (-1, 2)))
+    if "bar_width" in chrom_data:
+        return 4 * len(chrom_data["x"])
+    return 2 * len(chrom_data["x"]) + 2
+
+
+def _render_task(render, task, label):
+    """Call render(*task), timed as stage 'render' of chromosome 'label'"""
+    with timing.stage("render", chrom=label, vertices=_vertices(task[0])):
+        return render(*task)
+
+
+def _render_per_chromosome(render, tasks, jobs, labels):
+    """Call render(*task) for every task of chromosomes 'labels', return list
+    of results. If jobs > 1 tasks are spread over a pool of processes, every
+    worker gets only the data of its task."""
+    if jobs > 1 and len(tasks) > 1:
+        from concurrent.futures import (  # pylint: disable=import-outside-toplevel
+            ProcessPoolExecutor,
+        )
+
+        with ProcessPoolExecutor(
+            max_workers=min(jobs, len(tasks)),
+            initializer=_init_worker,
+            initargs=(MATPLOTLIB_RC,),
+        ) as executor:
+            if not timing.recording_active():
+                futures = [executor.submit(render, *task) for task in tasks]
+                return [future.result() for future in futures]  # raises errors from workers
+            fields = timing.current_fields()
+            futures = [
+                executor.submit(timing.call_recorded, _render_task, (render, task, label), fields)
+                for task, label in zip(tasks, labels)
+            ]
+            results = []
+            for future in futures:
+                result, records = future.result()
+                timing.add_records(records)
+                results.append(result)
+            return results
+    return [_render_task(render, task, label) for task, label in zip(tasks, labels)]
+
+
+def _render_tracks(kind, tasks, labels, filepath, settings):
+    """Render chromosomes 'labels' from 'tasks' with the renderer of 'kind',
+    to one file per chromosome or to one atlas. Return files written, or
+    {label: PNG bytes} if rendering in memory."""
+    render = RENDERERS[settings["engine"]][kind]
+    if settings["in_memory"]:
+        in_memory = [task[:1] + (IN_MEMORY,) + task[2:] for task in tasks]
+        images = _render_per_chromosome(render, in_memory, settings["jobs"], labels)
+        images = dict(zip(labels, images))
+        if settings["euploid"] and settings["region"] is None:
+            images.update((label, TRANSPARENT_PNG) for label in _missing_labels(labels))
+        return images
+    if settings["atlas"]:
+        in_memory = [task[:1] + (None,) + task[2:] for task in tasks]  # outfile is None
+        images = _render_per_chromosome(render, in_memory, settings["jobs"], labels)
+        return print_atlas(dict(zip(labels, images)), filepath, settings)
+    with pipeline.writing():  # encode and write while drawing the next chromosome
+        _render_per_chromosome(render, tasks, settings["jobs"], labels)
+    outfiles = [task[1] for task in tasks]
+    for outfile in outfiles:
+        LOG.info("outfile: %s", outfile)
+    if settings["euploid"] and settings["region"] is None:
+        outfiles += print_transparent_pngs(filepath, settings["outd"], labels)
+    return outfiles
 
 
 ## Functions to create PNGS
 ## ------------------------
+def _timed_transform(chrom_datas):
+    """Yield 'chrom_datas' of a generator above, timing each as stage 'transform'"""
+    return timing.timed(
+        "transform",
+        chrom_datas,
+        lambda chrom_data: {"chrom": chrom_data["label"], "vertices": _vertices(chrom_data)},
+    )
+
+
 # rename print_broken_horizontal_bar
 def print_individual_pics(dataframe, infile, settings):
     """Print one chromosomes per image file"""
     outd = settings["outd"]
-    euploid = settings["euploid"]
     resolution = settings["dpi"]
-    fig = plt.figure(figsize=(10, 0.5))
-    axis = fig.add_subplot(111)
-    plt.rcParams.update({"figure.max_open_warning": 0})
+    tasks = []
     is_printed = []
-    for collection in horizontal_bar_generator(dataframe):
-        axis.add_collection(collection)
-        _common_settings(axis)
-        axis.set_xlim(0, CHROM_END_POS)  # bounds within maximum chromosome length
-        plt.rcParams['figure.dpi'] = resolution
-        plt.rcParams['savefig.dpi'] = resolution
-        outfile = outpath(outd, infile, collection.get_label())
-        print("outfile: {}".format(outfile))
-        fig.savefig(outfile, transparent=True, bbox_inches="tight", pad_inches=0)
-        axis.cla()  # clear canvas before next iteration
-        is_printed.append(collection.get_label())
-    if euploid:
-        print_transparent_pngs(infile, outd, is_printed)
+    for chrom_data in _timed_transform(horizontal_bar_generator(dataframe)):
+        outfile = outpath(outd, infile, chrom_data["label"])
+        tasks.append((chrom_data, outfile, resolution, settings["png"]))
+        is_printed.append(chrom_data["label"])
+    return _render_tracks("horizontal_bars", tasks, is_printed, infile, settings)
 
 
 def print_combined_pic(dataframe, chrom_ybase, chrom_centers, infile, settings, chr_list):
-    """Print all chromosomes in a single PNG picture"""
-    outd = settings["outd"]
+    """Print all chromosomes in a single PNG picture. Return files written,
+    or {"combined": PNG bytes} if rendering in memory."""
+    plt = _pyplot()
+    _set_resolution(settings["dpi"])
     fig = plt.figure(figsize=FIGSIZE)
     axis = fig.add_subplot(111)
-    plt.rcParams['figure.dpi'] = settings["dpi"]
-    plt.rcParams['savefig.dpi'] = settings["dpi"]
 
     for collection in horizontal_bar_generator_combine(dataframe, chrom_ybase):
         axis.add_collection(collection)
@@ -451,95 +1144,282 @@ def print_combined_pic(dataframe, chrom_ybase, chrom_centers, infile, settings,
     axis.set_yticks([chrom_centers[i] for i in chr_list])
     axis.set_yticklabels(chr_list)
     axis.axis("tight")
-    outfile = outpath(outd, infile, "combined")
-    print("outfile: {}".format(outfile))
-    fig.savefig(outfile, transparent=True, bbox_inches="tight", pad_inches=0, dpi=resolution)
+    outfile = IN_MEMORY if settings["in_memory"] else outpath(settings["outd"], infile, "combined")
+    try:
+        png = _save(fig, outfile, settings["dpi"], settings["png"])
+    finally:
+        plt.close(fig)
+    if settings["in_memory"]:
+        return {"combined": png}
+    LOG.info("outfile: %s", outfile)
+    return [outfile]
+
+
+def print_atlas(images, infile, settings):
+    """Write images by chromosome to one atlas PNG with a slot for every
+    chromosome, plus its JSON index. Return files written."""
+    if not images:
+        return []
+    prefix = "chr" if chr_type_format(next(iter(images))) == "str" else ""
+    outfile = outpath(settings["outd"], infile, "atlas")
+    indexfile = os.path.splitext(outfile)[0] + ".json"
+    LOG.info("outfile: %s", outfile)
+    labels = [prefix + chrom for chrom in CHROMOSOMES]
+    return write_atlas(images, labels, outfile, indexfile, settings["dpi"], settings["png"])
+
+
+def _missing_labels(is_printed):
+    """Return labels of CHROMOSOMES not in 'is_printed', named as those"""
+    prefix = "chr" if chr_type_format(is_printed[0]) == "str" else ""
+    return [
+        prefix + chrom
+        for chrom in CHROMOSOMES
+        if chrom not in is_printed and "chr" + chrom not in is_printed
+    ]
 
 
 def print_transparent_pngs(file, outd, is_printed):
     """Write an empty png file to disk for every chromosome what has, always including Y.
     Motivated by auxilary software not being able to handle missing output
-    chromosome are missing in the wig."""
-
-    gene_build = chr_type_format(is_printed[0])
-    for chrom in CHROMOSOMES:
-        if chrom in is_printed:
-            continue
-        if "chr" + chrom in is_printed:
-            continue
+    chromosome are missing in the wig. Return files written."""
 
-        prefix = "chr" if gene_build == "str" else ""
-        outfile = outpath(outd, file, prefix + chrom)
-        print("print transparent: {}".format(outfile))
+    outfiles = []
+    for label in _missing_labels(is_printed):
+        outfile = outpath(outd, file, label)
+        LOG.info("print transparent: %s", outfile)
         filestream = open(outfile, "bw")
         filestream.write(TRANSPARENT_PNG)
         filestream.close()
+        outfiles.append(outfile)
+    return outfiles
 
 
-def print_bar_chart(dataframe, filepath, x_axis, y_axis, color, ylim_height, settings):
-    """Print vertical bar chart"""
-    is_printed = []
+def _parse_wig_line(line):
+    """Parse one unique line of a wig file. Return (value, chrom) where
+    value is None for non-numeric lines and chrom is None for lines that
+    are not declarations."""
+    try:
+        return float(line), None
+    except ValueError:
+        reresult = WIG_CHROM_NAME.search(line.decode(errors="replace"))
+        return None, reresult.group(1) if reresult else None
+
+
+def wig_to_dataframe(infile, step, col_format, data=None):
+    """Read a wig file into a Pandas dataframe. Identical lines are parsed
+    only once, the rest of the conversion is done in bulk with numpy. NaN is
+    read as 0 and values are clamped to WIG_MAX. Two zero valued entries
+    are added at the end of every chromosome followed by another
+    declaration, one right after its last value to avoid a linear slope and
+    one at CHROM_END_POS to keep scale when plotting. 'data' is read from
+    'infile' if not given.
+
+    Returns:  Dataframe"""
+    data = read_input(infile) if data is None else data
+    if not data:
+        return pandas.DataFrame({name: [] for name in col_format})
+    starts, ends, codes, first_lines = factorize_lines(data)
+    # Parse every distinct line once, then look up values by line code
+    table = numpy.zeros(len(first_lines))
+    is_value = numpy.zeros(len(first_lines), dtype=bool)
+    is_declaration = numpy.zeros(len(first_lines), dtype=bool)
+    chrom_names = {}  # code of declaration line -> chromosome name
+    for code, line in enumerate(first_lines):
+        value, chrom = _parse_wig_line(data[starts[line] : ends[line]])
+        if value is not None:
+            table[code] = value
+            is_value[code] = True
+        elif chrom is not None:
+            is_declaration[code] = True
+            chrom_names[code] = chrom
+    table[numpy.isnan(table)] = 0
+    numpy.minimum(table, WIG_MAX, out=table)
+
+    declarations = numpy.flatnonzero(is_declaration[codes])
+    chroms = [""] + [chrom_names[code] for code in codes[declarations]]
+    keep = numpy.flatnonzero(is_value[codes])
+    values = table[codes[keep]]
+    value_block = numpy.searchsorted(declarations, keep)
+    block_sizes = numpy.bincount(value_block, minlength=len(chroms))
+    block_starts = numpy.cumsum(block_sizes) - block_sizes
+
+    # Every block but the last is followed by two sentinel rows
+    n_sentinels = 2 * (len(chroms) - 1)
+    coverage = numpy.zeros(len(values) + n_sentinels, dtype=numpy.float32)
+    pos = numpy.empty(len(values) + n_sentinels, dtype=numpy.int32)
+    rows = numpy.arange(len(values)) + 2 * value_block
+    coverage[rows] = values
+    pos[rows] = (numpy.arange(len(values)) - block_starts[value_block]) * step
+    stop_rows = block_starts[:-1] + block_sizes[:-1] + 2 * numpy.arange(len(chroms) - 1)
+    pos[stop_rows] = block_sizes[:-1] * step + 1
+    pos[stop_rows + 1] = CHROM_END_POS
+    counts = block_sizes + 2
+    counts[-1] -= 2
+    names, chrom_codes = numpy.unique(numpy.array(chroms, dtype=object), return_inverse=True)
+    dataframe = pandas.DataFrame(
+        {
+            col_format[0]: pandas.Categorical.from_codes(numpy.repeat(chrom_codes, counts), names),
+            col_format[1]: coverage,
+            col_format[2]: pos,
+        }
+    )
+    return dataframe
 
-    outd = settings["outd"]
-    combine = settings["combine"]
-    euploid = settings["euploid"]
-    resolution = settings["dpi"]
-    for chrom_data in vertical_bar_generator(dataframe, x_axis, y_axis):
-        fig, axis = plt.subplots(figsize=FIGSIZE_WIG)
-        _common_settings(axis)
-        axis.bar(
-            chrom_data["x"],
-            chrom_data["y"],
-            width=chrom_data["bar_width"],
-            color=color,
-            linewidth=0,
+
+def _intervals_to_dataframe(chrom_codes, names, starts, ends, values, col_format):
+    """Return dataframe of an area graph of 'values' over intervals [starts,
+    ends) on chromosomes 'names[chrom_codes]'. Every interval is drawn as a
+    flat top between two drops to 0, so gaps between intervals are 0. NaN
+    is read as 0 and values are clamped to WIG_MAX, as by wig_to_dataframe."""
+    order = numpy.lexsort((starts, chrom_codes))
+    starts, ends = starts[order], ends[order]
+    values = numpy.minimum(numpy.nan_to_num(values[order]), WIG_MAX)
+    zeros = numpy.zeros(len(values))
+    dataframe = pandas.DataFrame(
+        {
+            col_format[0]: pandas.Categorical.from_codes(
+                numpy.repeat(chrom_codes[order], 4), names
+            ),
+            col_format[1]: numpy.column_stack([zeros, values, values, zeros])
+            .ravel()
+            .astype(numpy.float32),
+            col_format[2]: numpy.column_stack([starts, starts, ends, ends])
+            .ravel()
+            .astype(numpy.int32),
+        }
+    )
+    return dataframe
+
+
+def bedgraph_to_dataframe(infile, col_format):
+    """Read a bedGraph file, lines of <chrom> <start> <end> <value> with
+    0-based half-open intervals, into a dataframe as wig_to_dataframe.
+
+    Returns:  Dataframe"""
+    header_lines = 0
+    with open_input(infile) as filestream:
+        for line in filestream:
+            if not line.startswith(("track", "browser", "#")):
+                break
+            header_lines += 1
+    with open_input(infile, "rb") as filestream:
+        frame = pandas.read_csv(
+            filestream,
+            sep=r"\s+",
+            names=["chrom", "start", "end", "value"],
+            usecols=[0, 1, 2, 3],
+            dtype={"chrom": str, "start": numpy.int64, "end": numpy.int64, "value": float},
+            skiprows=header_lines,
+            comment="#",
         )
-        plt.ylim(0, ylim_height)
-        plt.rcParams['figure.dpi'] = resolution
-        plt.rcParams['savefig.dpi'] = resolution
-        axis.set_ylim(bottom=0)
-        fig.tight_layout()
-        axis.set_xlim(0, CHROM_END_POS)  # bounds within maximum chromosome length
-        outfile = outpath(outd, filepath, chrom_data["label"])
-        print("outfile: {}".format(outfile))
-        fig.savefig(outfile, transparent=True, bbox_inches="tight", pad_inches=0)
-        is_printed.append(chrom_data["label"])
-        plt.close(fig)  # save memory
-    if euploid:
-        print_transparent_pngs(filepath, outd, is_printed)
-
-
-def wig_to_dataframe(infile, step, col_format):
-    """Read a wig file into a Pandas dataframe.  Returns:  Dataframe"""
-    filestream = open(infile, "r")
-    coverage_data = []
-    pos = 0
-    chrom = ""
-    for line in filestream.readlines():
-        try:
-            if line == "NaN\n":
-                wig_value = 0
-            else:
-                wig_value = float(line)
-            wig_value = wig_value if wig_value < WIG_MAX else WIG_MAX
-            coverage_data.append([chrom, wig_value, pos])
-            pos += step
-        except ValueError:
-            reresult = re.search("chrom=(\w*)", line)  # find chromosome name in line
-            if reresult:
-                start_pos = [chrom, 0, 1]  # write 0 in beginning, works against bug
-                stop_pos = [chrom, 0, pos + 1]  # write 0 at end removes linear slope
-                last_pos = [chrom, 0, CHROM_END_POS]  # write trailing char for scale when plotting
-                #               coverage_data.insert(start_pos)
-                coverage_data.append(stop_pos)
-                coverage_data.append(last_pos)
-                chrom = reresult.group(1)  # start working on next chromosome
-                pos = 0
-    filestream.close()
-    dataframe = pandas.DataFrame(coverage_data, columns=col_format)
+    chrom = frame.chrom.astype("category")
+    return _intervals_to_dataframe(
+        chrom.cat.codes.to_numpy(),
+        chrom.cat.categories,
+        frame.start.to_numpy(),
+        frame.end.to_numpy(),
+        frame.value.to_numpy(),
+        col_format,
+    )
+
+
+def variable_step_to_dataframe(infile, col_format, data=None):
+    """Read a variableStep wig file into a dataframe as wig_to_dataframe.
+    Every value covers 'span' (default 1) bases from its 1-based position.
+    The lines following each declaration are parsed in bulk.
+
+    Returns:  Dataframe"""
+    data = read_input(infile) if data is None else data
+    declarations = list(WIG_VARIABLE_STEP.finditer(data))
+    names = sorted({make_dict(match.group(1).decode().split())["chrom"] for match in declarations})
+    codes, starts, ends, values = [], [], [], []
+    for i, match in enumerate(declarations):
+        stop = declarations[i + 1].start() if i + 1 < len(declarations) else len(data)
+        block = data[match.end() : stop]
+        if not block.strip():
+            continue
+        declaration = make_dict(match.group(1).decode().split())
+        frame = pandas.read_csv(
+            io.BytesIO(block),
+            sep=r"\s+",
+            names=["pos", "value"],
+            dtype={"pos": numpy.int64, "value": float},
+            comment="#",
+        )
+        start = frame.pos.to_numpy() - 1
+        starts.append(start)
+        ends.append(start + int(declaration.get("span", 1)))
+        values.append(frame.value.to_numpy())
+        codes.append(numpy.full(len(frame), names.index(declaration["chrom"])))
+    if not values:
+        return pandas.DataFrame({name: [] for name in col_format})
+    return _intervals_to_dataframe(
+        numpy.concatenate(codes),
+        names,
+        numpy.concatenate(starts),
+        numpy.concatenate(ends),
+        numpy.concatenate(values),
+        col_format,
+    )
+
+
+def bigwig_to_dataframe(infile, col_format, column_width=None, chrom=None):
+    """Read a bigWig file, or chromosome 'chrom' of it, into a dataframe as
+    bedgraph_to_dataframe. The summaries of the coarsest zoom level with at
+    least one summary per 'column_width' bases are read if there is one,
+    else the full data.
+
+    Returns:  Dataframe"""
+    names, codes, starts, ends, values = bigwig.read_intervals(infile, column_width, chrom)
+    return _intervals_to_dataframe(codes, names, starts, ends, values, col_format)
+
+
+def pyramid_to_dataframe(infile, col_format, column_width=None, chrom=None):
+    """Read a track pyramid, or chromosome 'chrom' of it, at the level picked
+    for 'column_width' bases per pixel column into a dataframe as
+    wig_to_dataframe, every bin drawn as by pyramid.profile.
+
+    Returns:  Dataframe"""
+    names, codes, xs, ys = [], [], [], []
+    for code, (name, bin_size, summaries) in enumerate(
+        pyramid.read_levels(infile, column_width, chrom)
+    ):
+        x, y = pyramid.profile(summaries, bin_size)
+        names.append(name)
+        codes.append(numpy.full(len(x), code))
+        xs.append(x)
+        ys.append(y)
+    if not names:
+        return pandas.DataFrame({name: [] for name in col_format})
+    dataframe = pandas.DataFrame(
+        {
+            col_format[0]: pandas.Categorical.from_codes(numpy.concatenate(codes), names),
+            col_format[1]: numpy.minimum(numpy.concatenate(ys), WIG_MAX).astype(numpy.float32),
+            col_format[2]: numpy.concatenate(xs).astype(numpy.int32),
+        }
+    )
     return dataframe
 
 
+def _read_track(filepath, track_format, step, column_width=None, region=None, cache_dir=None):
+    """Return dataframe of a coverage track of format 'fixedStep',
+    'variableStep', 'bedGraph', 'bigWig' or 'pyramid'. Only bigWig tracks
+    and track pyramids are read at the resolution of 'column_width' bases
+    per pixel column. Given a 'region', only its chromosome is read of all
+    but bedGraph tracks, WIG through an offset index kept in 'cache_dir'."""
+    chrom = region.chrom if region is not None else None
+    if track_format == "pyramid":
+        return pyramid_to_dataframe(filepath, WIG_FORMAT, column_width, chrom)
+    if track_format == "bigWig":
+        return bigwig_to_dataframe(filepath, WIG_FORMAT, column_width, chrom)
+    if track_format == "bedGraph":
+        return bedgraph_to_dataframe(filepath, WIG_FORMAT)
+    data = read_wig_region(filepath, region, cache_dir) if region is not None else None
+    if track_format == "variableStep":
+        return variable_step_to_dataframe(filepath, WIG_FORMAT, data)
+    return wig_to_dataframe(filepath, step, WIG_FORMAT, data)
+
+
 def graph_coordinates(list_of_chromosomes):
     """Iterate through list of chromosomes and return X
     (as center for graph) and Y coordinates for plotting.
@@ -563,39 +1443,106 @@ def graph_coordinates(list_of_chromosomes):
 ## Lib Interface
 ## -------------
 def plot_autozyg(filepath, *args, **kwargs):
-    _plot_autozyg(filepath, parse_lib_call(args) | kwargs)
+    return _plot_autozyg(filepath, parse_lib_call(args) | kwargs)
 
 
 def plot_coverage_wig(filepath, *args, **kwargs):
-    _plot_coverage_wig(filepath, parse_lib_call(args) | kwargs)
+    return _plot_coverage_wig(filepath, parse_lib_call(args) | kwargs)
 
 
 def plot_exom_coverage(filepath, *args, **kwargs):
-    _plot_exom_coverage(filepath, parse_lib_call(args) | kwargs)
+    return _plot_exom_coverage(filepath, parse_lib_call(args) | kwargs)
 
 
 def plot_homosnp_wig(filepath, *args, **kwargs):
-    _plot_homosno_wig(filepath, parse_lib_call(args) | kwargs)
+    return _plot_homosnp_wig(filepath, parse_lib_call(args) | kwargs)
 
 
 def plot_ideogram(filepath, *args, **kwargs):
-    _plot_ideogram(filepath, parse_lib_call(args) | kwargs)
+    return _plot_ideogram(filepath, parse_lib_call(args) | kwargs)
 
 
 def plot_upd_regions(filepath, *args, **kwargs):
-    _plot_upd_regions(filepath, parse_lib_call(args) | kwargs)
+    return _plot_upd_regions(filepath, parse_lib_call(args) | kwargs)
 
 
 def plot_upd_sites(filepath, *args, **kwargs):
-    _plot_upd_sites(filepath, parse_lib_call(args) | kwargs)
+    return _plot_upd_sites(filepath, parse_lib_call(args) | kwargs)
 
 
-def plot_upd_sites(filepath, *args, **kwargs):
-    _plot_upd_sites(filepath, parse_lib_call(args) | kwargs)
+def render_autozyg(source, *args, **kwargs):
+    return _render(_plot_autozyg, source, parse_lib_call(args) | kwargs)
+
+
+def render_coverage_wig(source, *args, **kwargs):
+    return _render(_plot_coverage_wig, source, parse_lib_call(args) | kwargs)
+
+
+def render_exom_coverage(source, *args, **kwargs):
+    return _render(_plot_exom_coverage, source, parse_lib_call(args) | kwargs)
+
+
+def render_homosnp_wig(source, *args, **kwargs):
+    return _render(_plot_homosnp_wig, source, parse_lib_call(args) | kwargs)
+
+
+def render_ideogram(source, *args, **kwargs):
+    return _render(_plot_ideogram, source, parse_lib_call(args) | kwargs)
+
+
+def render_upd_regions(source, *args, **kwargs):
+    return _render(_plot_upd_regions, source, parse_lib_call(args) | kwargs, header=False)
+
+
+def render_upd_sites(source, *args, **kwargs):
+    return _render(_plot_upd_sites, source, parse_lib_call(args) | kwargs)
+
+
+def _render(plot, source, options, header=True):
+    """Return {label: PNG bytes} of the images 'plot' draws of 'source', a
+    path, an open file, bytes or a table, writing nothing. Raise
+    NoDataError if it has nothing to draw. See inmemory.py."""
+    for option in ("atlas", "incremental"):
+        if options.get(option):
+            raise ValueError("option {} writes files, it can't render in memory".format(option))
+    options = dict(options, in_memory=True, outd=None, output_format=None)
+    if not inmemory.is_path(source):  # no file to key a cache entry by
+        options.update(cache=False, cache_dir=None)
+    with inmemory.input_path(source, header) as filepath:
+        try:
+            return plot(filepath, options)
+        except NoDataError:  # name what was given, not the in-memory file
+            raise NoDataError("No suitable data found: {}".format(_describe(source))) from None
+
+
+def _describe(source):
+    """Return 'source' of _render as named in messages"""
+    if inmemory.is_path(source):
+        return os.fspath(source)
+    return getattr(source, "name", "<{}>".format(type(source).__name__))
 
 
 ##
 ## ----------------------
+def _profiled(operation):
+    """Decorate a plot function to time it as stage 'plot' of 'operation',
+    recording to the file given as 'profile_json', see timing.py"""
+
+    def decorate(plot):
+        @functools.wraps(plot)
+        def plot_profiled(filepath, *args):
+            options = args[0] if args else {}
+            with timing.recording(options.get("profile_json")), timing.stage(
+                "plot", operation=operation, input=filepath
+            ):
+                return plot(filepath, *args)
+
+        return plot_profiled
+
+    return decorate
+
+
+@_profiled("ideogram")
 def _plot_ideogram(filepath, *args):
     """Visualize chromosome ideograms from bed-file. Format:
 
@@ -603,49 +1550,70 @@ def _plot_ideogram(filepath, *args):
        args:argparse.Namespace
 
     Returns:
-          None
+          list of files written
     """
     settings = _args_to_dict(filepath, args)
-    print(
-        "Plot ideograms with settings\ncombine:{}\noutd:{}".format(
-            settings["combine"], settings["outd"]
-        )
+    LOG.debug(
+        "Plot ideograms with settings\ncombine:%s\noutd:%s", settings["combine"], settings["outd"]
     )
+    skipped = _unchanged("ideogram", filepath, settings)
+    if skipped is not None:
+        return skipped
 
-    dataframe = _read_dataframe(filepath, IDEOGRAM_FORMAT)
-    dataframe["width"] = dataframe.end - dataframe.start
-    dataframe["colors"] = dataframe["gStain"].apply(lambda x: get_color[x])
-    chromosome_list = _get_chromosome_list(_is_chr_str(dataframe.chrom[0]))
+    dataframe = _read_dataframe(
+        filepath,
+        IDEOGRAM_FORMAT,
+        settings["cache_dir"],
+        _ideogram_bars,
+        ["chrom", "start", "end", "gStain"],
+        settings["memory"],
+        settings["region"],
+    )
+    dataframe = _window_bars(dataframe, settings["region"])
+    chromosome_list = _get_chromosome_list(_is_chr_str(dataframe.chrom.cat.categories[0]))
     if settings["combine"]:
         chrom_ybase, chrom_centers = graph_coordinates(chromosome_list)
-        print_combined_pic(
-            dataframe, chrom_ybase, chrom_centers, filepath, settings["outd"], chromosome_list
+        outfiles = print_combined_pic(
+            dataframe, chrom_ybase, chrom_centers, filepath, settings, chromosome_list
         )
     else:
-        print_individual_pics(dataframe, filepath, settings)
+        outfiles = print_individual_pics(dataframe, filepath, settings)
+    return _rendered("ideogram", filepath, settings, outfiles)
 
 
+@_profiled("autozyg")
 def _plot_autozyg(filepath, *args):
     """Plot ROH file for analysis of isodisomy"""
     settings = _args_to_dict(filepath, args)
-    print(
-        "Plot RoH Sites with settings\ncombine:{}\neuploid:{}".format(
-            settings["combine"], settings["euploid"]
-        )
+    LOG.debug(
+        "Plot RoH Sites with settings\ncombine:%s\neuploid:%s",
+        settings["combine"],
+        settings["euploid"],
+    )
+    skipped = _unchanged("autozyg", filepath, settings)
+    if skipped is not None:
+        return skipped
+    dataframe = _read_dataframe(
+        filepath,
+        ROH_BED_FORMAT,
+        settings["cache_dir"],
+        _autozyg_bars,
+        memory=settings["memory"],
+        region=settings["region"],
     )
-    dataframe = _read_dataframe(filepath, ROH_BED_FORMAT)
-    dataframe["width"] = (dataframe.end - dataframe.start) + PADDING
-    dataframe["colors"] = get_color["PB_HOMOZYGOUS"]
-    chromosome_list = _get_chromosome_list(_is_chr_str(dataframe.chrom[0]))
+    dataframe = _window_bars(dataframe, settings["region"])
+    chromosome_list = _get_chromosome_list(_is_chr_str(dataframe.chrom.cat.categories[0]))
     if settings["combine"]:
         chrom_ybase, chrom_centers = graph_coordinates(chromosome_list)
-        print_combined_pic(
-            dataframe, chrom_ybase, chrom_centers, filepath, settings["outd"], chromosome_list
+        outfiles = print_combined_pic(
+            dataframe, chrom_ybase, chrom_centers, filepath, settings, chromosome_list
         )
     else:
-        print_individual_pics(dataframe, filepath, settings)
+        outfiles = print_individual_pics(dataframe, filepath, settings)
+    return _rendered("autozyg", filepath, settings, outfiles)
 
 
+@_profiled("sites")
 def _plot_upd_sites(filepath, *args):
     """Visualize UPD data from bed-file. Bed format as:
 
@@ -661,31 +1629,42 @@ def _plot_upd_sites(filepath, *args):
         combine -- output all graphs in one png
         normalize -- normalize to mean
         outd=<str> -- output directory
-    Returns: None
+    Returns: list of files written
 
     """
     settings = _args_to_dict(filepath, args)
 
-    print(
-        "Plot UPD Sites with settings\ncombine:{}\neuploid:{}".format(
-            settings["combine"], settings["euploid"]
-        )
+    LOG.debug(
+        "Plot UPD Sites with settings\ncombine:%s\neuploid:%s",
+        settings["combine"],
+        settings["euploid"],
     )
+    skipped = _unchanged("sites", filepath, settings)
+    if skipped is not None:
+        return skipped
 
-    dataframe = _read_dataframe(filepath, UPD_FORMAT)
-    dataframe["width"] = (dataframe.end - dataframe.start) + PADDING
-    dataframe["colors"] = dataframe["updType"].apply(lambda x: get_color[x])
-    chromosome_list = _get_chromosome_list(_is_chr_str(dataframe.chrom[0]))
+    dataframe = _read_dataframe(
+        filepath,
+        UPD_FORMAT,
+        settings["cache_dir"],
+        _upd_site_bars,
+        memory=settings["memory"],
+        region=settings["region"],
+    )
+    dataframe = _window_bars(dataframe, settings["region"])
+    chromosome_list = _get_chromosome_list(_is_chr_str(dataframe.chrom.cat.categories[0]))
     chrom_ybase, chrom_centers = graph_coordinates(chromosome_list)
 
     if settings["combine"]:
-        print_combined_pic(
-            dataframe, chrom_ybase, chrom_centers, filepath, settings["outd"], chromosome_list
+        outfiles = print_combined_pic(
+            dataframe, chrom_ybase, chrom_centers, filepath, settings, chromosome_list
         )
     else:
-        print_individual_pics(dataframe, filepath, settings)
+        outfiles = print_individual_pics(dataframe, filepath, settings)
+    return _rendered("sites", filepath, settings, outfiles)
 
 
+@_profiled("exom")
 def _plot_exom_coverage(filepath, *args):
     """Plot exom coverage from bed file."""
     settings = _args_to_dict(filepath, args)
@@ -693,27 +1672,23 @@ def _plot_exom_coverage(filepath, *args):
     x_axis = "start"
     y_axis = "bar_height"
 
-    print(
-        "Plot Exom coverage with settings\ncombine:{}\neuploid:{}".format(
-            settings["combine"], settings["euploid"]
-        )
+    LOG.debug(
+        "Plot Exom coverage with settings\ncombine:%s\neuploid:%s",
+        settings["combine"],
+        settings["euploid"],
     )
-
-    # Regard exoms as one if distance between two adjecent entries are less than exom gap.
-    # Weights of exoms included in such a added and divided by the total width to create
-    # representative value (bar height).
-    dataframe = _read_dataframe(filepath, EXOM_FORMAT)
-    df = dataframe.drop(dataframe[dataframe.meanCoverage < 10.0].index).copy()
-    mask = dataframe["start"].sub(dataframe["end"].shift(fill_value=0)).gt(EXOM_GAP).cumsum()
-    dataframe["weight"] = (dataframe["end"] - dataframe["start"]) * dataframe["meanCoverage"]
-    dataframe2 = dataframe.groupby([mask, "chrom"]).agg(
-        start=("start", "first"), end=("end", "last"), sum=("weight", "sum")
-    )
-    dataframe2["bar_width"] = dataframe2["end"] - dataframe2["start"] + PADDING
-    dataframe2["bar_height"] = dataframe2["sum"] / dataframe2["bar_width"]
-    dataframe2["bar_height"].clip(upper=80, inplace=True)
-
-    print_bar_chart(
+    skipped = _unchanged("exom", filepath, settings)
+    if skipped is not None:
+        return skipped
+
+    region = settings["region"]
+    if pyramid.is_pyramid(filepath):
+        column_width = _column_width(settings["dpi"]) * _window_fraction(region)
+        dataframe2 = _pyramid_bars(filepath, column_width, region)
+    else:
+        dataframe2 = _exom_bars(filepath, settings["cache_dir"], settings["memory"], region)
+    dataframe2 = _window_centered_bars(dataframe2, region)
+    outfiles = print_bar_chart(
         dataframe2,
         filepath,
         x_axis,
@@ -722,48 +1697,163 @@ def _plot_exom_coverage(filepath, *args):
         settings,
         ylim_height,
     )
+    return _rendered("exom", filepath, settings, outfiles)
+
+
+def _exom_bars(filepath, cache_dir=None, memory=None, region=None):
+    """Return dataframe of the bars of an exom coverage BED file, centered on
+    'start', of 'bar_width' and 'bar_height', of the chromosome of 'region'
+    if given"""
+    # Regard exoms as one if distance between two adjecent entries are less than exom gap.
+    # Weights of exoms included in such a added and divided by the total width to create
+    # representative value (bar height).
+    dataframe = _read_dataframe(
+        filepath,
+        EXOM_FORMAT,
+        cache_dir,
+        _exom_weights,
+        ["chrom", "start", "end", "meanCoverage"],
+        memory,
+        region,
+    )
+    with timing.stage("transform"):
+        mask = dataframe["start"].sub(dataframe["end"].shift(fill_value=0)).gt(EXOM_GAP).cumsum()
+        dataframe2 = dataframe.groupby([mask, "chrom"], observed=True).agg(
+            start=("start", "first"), end=("end", "last"), sum=("weight", "sum")
+        )
+        dataframe2["bar_width"] = dataframe2["end"] - dataframe2["start"] + PADDING
+        dataframe2["bar_height"] = dataframe2["sum"] / dataframe2["bar_width"]
+        dataframe2["bar_height"].clip(upper=80, inplace=True)
+    return dataframe2
+
+
+def _pyramid_bars(filepath, column_width, region=None):
+    """Return dataframe of bars as _exom_bars, one per bin of a track
+    pyramid at the level picked for 'column_width', as high as its maximum"""
+    chrom = region.chrom if region is not None else None
+    with timing.stage("read") as fields:
+        names, codes, starts, ends, values = pyramid.read_intervals(
+            filepath, column_width, chrom=chrom
+        )
+        fields["rows"] = len(values)
+    return pandas.DataFrame(
+        {
+            "chrom": pandas.Categorical.from_codes(codes, names),
+            "start": (starts + ends) / 2,
+            "bar_width": ends - starts,
+            "bar_height": values,
+        }
+    )
 
 
+def index_track(filepath, outfile=None, exom=False, step=None, memory=None):
+    """Write a track pyramid, see pyramid.py, of a coverage track or of the
+    bars of an exom coverage BED file if 'exom'. Return the file written,
+    by default the input with suffix .pyramid."""
+    outfile = outfile or os.path.splitext(strip_compression(filepath))[0] + ".pyramid"
+    chromosomes = []
+    if exom:
+        bars = _exom_bars(filepath, memory=memory)
+        bars["left"] = bars["start"] - bars["bar_width"] / 2
+        bars["right"] = bars["start"] + bars["bar_width"] / 2
+        # bars are at least PADDING wide, bins of a sixteenth of a bar are plenty
+        bin_size = pyramid.finest_bin(bars["bar_width"].median() / 16)
+        for chrom, group in bars.groupby("chrom", observed=True):
+            end = group["right"].max()
+            left, right = group["left"].values, group["right"].values
+            summaries = pyramid.summarize_bars(left, right, group["bar_height"], bin_size, end)
+            chromosomes.append((chrom, end, pyramid.build_levels(summaries, bin_size)))
+        track = "bars"
+    else:
+        header = parse_track_header(filepath)
+        dataframe = filter_dataframe(
+            _read_track(filepath, header["format"], step or header["step"]),
+            _get_chromosome_list(header["chrom"]),
+        )
+        dataframe = dataframe[dataframe["pos"] < CHROM_END_POS]  # drop padding to the axis end
+        spacing = numpy.diff(dataframe["pos"].values)
+        spacing = spacing[spacing > 0]
+        bin_size = pyramid.finest_bin(numpy.median(spacing) if len(spacing) else 0)
+        for chrom, group in dataframe.groupby("chrom", observed=True):
+            x, y = group["pos"].values, group["coverage"].values
+            summaries = pyramid.summarize_area(x, y, bin_size, x[-1])
+            chromosomes.append((chrom, x[-1], pyramid.build_levels(summaries, bin_size)))
+        track = "area"
+    LOG.info("outfile: %s", outfile)
+    return pyramid.write_pyramid(outfile, chromosomes, track, os.path.basename(filepath))
+
+
+@_profiled("coverage")
 def _plot_coverage_wig(filepath, *args):
     """Plot a wig file representing coverage"""
     ylim_height = 75
-    plot_wig_aux(filepath, ylim_height, WIG_ORANGE, args)
+    return plot_wig_aux(filepath, ylim_height, WIG_ORANGE, args, "coverage")
 
 
+@_profiled("fracsnp")
 def _plot_homosnp_wig(filepath, *args):
     """Plot a wig file where entries represent percent of homozygous SNPs"""
     ylim_height = 1
-    plot_wig_aux(filepath, ylim_height, DARK_GOLD, args)
+    return plot_wig_aux(filepath, ylim_height, DARK_GOLD, args, "fracsnp")
 
 
-def plot_wig_aux(filepath, ylim_height, default_color, args):
-    """Outputs png:s of data given on WIG format."""
-    header = parse_wig_declaration(filepath)
+def plot_wig_aux(filepath, ylim_height, default_color, args, operation):
+    """Outputs png:s of data given on WIG (fixedStep or variableStep) or
+    bedGraph format."""
+    header = parse_track_header(filepath)
     settings = _wig_args_to_dict(header, filepath, args)
 
-    print(
-        "Plot WIG with settings \nstep: {}\noutd:{}\ncombine:{}\nnormalize:{}\neuploid:{}".format(
+    LOG.debug(
+        "Plot %s with settings \nstep: %s\noutd:%s\ncombine:%s\nnormalize:%s\neuploid:%s",
+        header["format"],
+        settings["fixedStep"],
+        settings["outd"],
+        settings["combine"],
+        settings["normalize"],
+        settings["euploid"],
+    )
+    skipped = _unchanged(operation, filepath, settings)
+    if skipped is not None:
+        return skipped
+
+    region = settings["region"]
+    chromosome_list = _region_chromosomes(_get_chromosome_list(header["chrom"]), region)
+    column_width = _column_width(settings["dpi"]) * _window_fraction(region)
+    with timing.stage("read") as fields:
+        dataframe = cached_dataframe(
+            settings["cache_dir"],
+            filepath,
+            lambda: filter_dataframe(  # delete chromosomes not in CHROMOSOMES
+                _read_track(
+                    filepath,
+                    header["format"],
+                    settings["fixedStep"],
+                    column_width,
+                    region,
+                    settings["cache_dir"],
+                ),
+                chromosome_list,
+            ),
+            "wig",
+            header["format"],
             settings["fixedStep"],
-            settings["outd"],
-            settings["combine"],
-            settings["normalize"],
-            settings["euploid"],
+            column_width if header["format"] in ("bigWig", "pyramid") else None,
+            partial=region is not None,
         )
-    )
-
-    chromosome_list = _get_chromosome_list(header["chrom"])
-    dataframe = wig_to_dataframe(filepath, settings["fixedStep"], WIG_FORMAT)
-    dataframe = filter_dataframe(
-        dataframe, chromosome_list
-    )  # delete chromosomes not in CHROMOSOMES
+        fields["rows"] = len(dataframe)
 
     x_axis = "pos"
     y_axis = "coverage"
-    if settings["normalize"]:
-        dataframe["normalized_coverage"] = (dataframe.coverage / dataframe.coverage.mean()).round(0)
-        y_axis = "normalized_coverage"
-
-    print_area_graph(
+    with timing.stage("transform"):
+        if region is not None:  # a cached dataframe holds all chromosomes
+            dataframe = filter_dataframe(dataframe, chromosome_list)
+            dataframe = _window_area(dataframe, region, x_axis, y_axis)
+        if settings["normalize"]:
+            normalized = (dataframe.coverage / dataframe.coverage.mean()).round(0)
+            dataframe["normalized_coverage"] = normalized
+            y_axis = "normalized_coverage"
+
+    outfiles = print_area_graph(
         dataframe,
         filepath,
         x_axis,
@@ -771,6 +1861,7 @@ def plot_wig_aux(filepath, ylim_height, default_color, args):
         settings,
         ylim_height,
     )
+    return _rendered(operation, filepath, settings, outfiles)
 
 
 def print_area_graph(dataframe, filepath, x_axis, y_axis, settings, ylim_height):
@@ -778,68 +1869,52 @@ def print_area_graph(dataframe, filepath, x_axis, y_axis, settings, ylim_height)
 
     color = settings["color"]
     combine = settings["combine"]
-    euploid = settings["euploid"]
     outd = settings["outd"]
     resolution = settings["dpi"]
+    # points are reduced to what Matplotlib needs to cover every pixel as
+    # much as all of them do, the raster engine computes that itself
+    pixel = None if settings["engine"] == "raster" else _pixel_size(resolution, ylim_height)
 
     if not combine:  # Plot one chromosome per png
+        tasks = []
         is_printed = []
-        for chrom_data in area_graph_generator(dataframe, x_axis, y_axis):
-            fig, axis = plt.subplots(figsize=FIGSIZE_WIG)
-            _common_settings(axis)
-            axis.stackplot(chrom_data["x"], chrom_data["y"], colors=color)
-            axis.set_ylim(bottom=0)
-            fig.tight_layout()
-            plt.ylim(0, ylim_height)
-            plt.rcParams['figure.dpi'] = resolution
-            plt.rcParams['savefig.dpi'] = resolution
-            axis.set_xlim(0, CHROM_END_POS)  # bounds within maximum chromosome length
+        chrom_datas = area_graph_generator(dataframe, x_axis, y_axis, pixel, ylim_height)
+        for chrom_data in _timed_transform(chrom_datas):
             outfile = outpath(outd, filepath, chrom_data["label"])
-            print("outfile: {}".format(outfile))
-            fig.savefig(
-                outfile, transparent=True, bbox_inches="tight", pad_inches=0)
+            tasks.append((chrom_data, outfile, color, ylim_height, resolution, settings["png"]))
             is_printed.append(chrom_data["label"])
-            plt.close(fig)  # save memory
-        if euploid:
-            print_transparent_pngs(filepath, outd, is_printed)
-    else:
-        print("WARNING: Combined area graphs are not implemented!")
-        False
+        return _render_tracks("area_graph", tasks, is_printed, filepath, settings)
+    # Plot all chromosomes after each other in one png
+    with timing.stage("transform", chrom="combined"):
+        chrom_data = area_graph_combine(dataframe, x_axis, y_axis, pixel, ylim_height)
+    if chrom_data is None:
+        return {} if settings["in_memory"] else []
+    render = RENDERERS[settings["engine"]]["area_graph"]
+    if settings["in_memory"]:
+        task = (chrom_data, IN_MEMORY, color, ylim_height, resolution, settings["png"])
+        return {chrom_data["label"]: _render_task(render, task, chrom_data["label"])}
+    outfile = outpath(outd, filepath, chrom_data["label"])
+    LOG.info("outfile: %s", outfile)
+    task = (chrom_data, outfile, color, ylim_height, resolution, settings["png"])
+    _render_task(render, task, chrom_data["label"])
+    return [outfile]
 
 
 def print_bar_chart(dataframe, file_path, x_axis, y_axis, color, settings, ylim_height):
     """Print vertical bar chart"""
-    combine = settings["combine"]
-    euploid = settings["euploid"]
     outd = settings["outd"]
     resolution = settings["dpi"]
+    tasks = []
     is_printed = []
-    for chrom_data in vertical_bar_generator(dataframe, x_axis, y_axis):
-        fig, axis = plt.subplots(figsize=FIGSIZE_WIG)
-        _common_settings(axis)
-        axis.bar(
-            chrom_data["x"],
-            chrom_data["y"],
-            width=chrom_data["bar_width"],
-            color=color,
-            linewidth=0,
-        )
-        plt.ylim(0, ylim_height)
-        plt.rcParams['figure.dpi'] = resolution
-        plt.rcParams['savefig.dpi'] = resolution
-        axis.set_ylim(bottom=0)
-        axis.set_xlim(0, CHROM_END_POS)  # bounds within maximum chromosome length
-        fig.tight_layout()
+    chrom_datas = vertical_bar_generator(dataframe, x_axis, y_axis, _column_width(resolution))
+    for chrom_data in _timed_transform(chrom_datas):
         outfile = outpath(outd, file_path, chrom_data["label"])
-        print("outfile: {}".format(outfile))
-        fig.savefig(
-            outfile, transparent=True, bbox_inches="tight", pad_inches=0)
+        tasks.append((chrom_data, outfile, color, ylim_height, resolution, settings["png"]))
         is_printed.append(chrom_data["label"])
-        plt.close(fig)  # save memory
-    if euploid:
-        print_transparent_pngs(file_path, outd, is_printed)
+    return _render_tracks("bar_chart", tasks, is_printed, file_path, settings)
 
 
+@_profiled("regions")
 def _plot_upd_regions(filepath, *args):
     """Print region as PNG file
     <chrom>  <start>  <stop>   <desc>
@@ -850,54 +1925,103 @@ def _plot_upd_regions(filepath, *args):
     # Parse sites upd file to brokenbarcollection
     read_line = []
     settings = _args_to_dict(filepath, args)
-    print(
-        "Plot UPD REGIONS with settings \noutd:{}\neuploid: {}".format(
-            settings["outd"], settings["euploid"]
-        )
+    LOG.debug(
+        "Plot UPD REGIONS with settings \noutd:%s\neuploid: %s",
+        settings["outd"],
+        settings["euploid"],
     )
-    with open(filepath) as filepointer:
+    skipped = _unchanged("regions", filepath, settings)
+    if skipped is not None:
+        return skipped
+    _reject_pyramid(filepath)
+    with timing.stage("read") as fields, open_input(filepath) as filepointer:
         for line in filepointer:
             if len(line.strip()) > 0:  # don't parse empty strings
                 read_line.append(parse_upd_regions(line))
-    region_list = [region_to_dict(i) for i in read_line]
-    region_list_chr = compile_per_chrom(region_list)
-    hbar_list = regions_to_hbar(region_list_chr)
-    resolution = settings["dpi"]
-    # Prepare canvas and plot
-    fig = plt.figure(figsize=(10, 0.5))
-    x_axis = fig.add_subplot(111)
-    is_printed = []
+        fields["rows"] = len(read_line)
+    with timing.stage("transform"):
+        region_list = [region_to_dict(i) for i in read_line]
+        region_list_chr = _window_upd_regions(compile_per_chrom(region_list), settings["region"])
+    tasks = [
+        (
+            region,
+            outpath(settings["outd"], filepath, region["chr"]),
+            settings["dpi"],
+            settings["png"],
+        )
+        for region in region_list_chr
+    ]
+    is_printed = [region["chr"] for region in region_list_chr]
+    outfiles = _render_tracks("upd_regions", tasks, is_printed, filepath, settings)
+    return _rendered("regions", filepath, settings, outfiles)
+
+
+# Operations by their long command line option, as named in batch manifests
+OPERATIONS = {
+    "autozyg": _plot_autozyg,
+    "coverage": _plot_coverage_wig,
+    "exom": _plot_exom_coverage,
+    "fracsnp": _plot_homosnp_wig,
+    "ideogram": _plot_ideogram,
+    "regions": _plot_upd_regions,
+    "sites": _plot_upd_sites,
+}
 
-    for bars in hbar_list:
-        for bar in bars:
-            x_axis.add_collection(bar)
-            _common_settings(x_axis)
-            x_axis.set_xlim(0, CHROM_END_POS)  # try to mimic nice bounds
-            outfile = outpath(settings["outd"], filepath, bar.get_label())
-            is_printed.append(bar.get_label())
-
-        outfile = outpath(settings["outd"], filepath, bar.get_label())
-        plt.rcParams['figure.dpi'] = resolution
-        plt.rcParams['savefig.dpi'] = resolution
-        fig.savefig(
-            outfile, transparent=True, bbox_inches="tight", pad_inches=0)
-        x_axis.cla()  # clear canvas before next iteration
+# Command line destination of each operation's input file
+OPERATION_DESTS = {
+    "autozyg": "autozyg",
+    "coverage": "coverage_file",
+    "exom": "exom_coverage",
+    "fracsnp": "hozysnp_file",
+    "ideogram": "ideofile",
+    "regions": "upd_regions",
+    "sites": "upd_sites",
+}
+
+
+def _flag_options(options):
+    """Return options with flags set as the strings the plot functions expect,
+    to make command line and library interfaces behave identical"""
+    options = dict(options)
+    for flag in ("norm", "combine", "euploid"):
+        options[flag] = flag if options.get(flag) else None
+    return options
 
-    # print each name only once
-    for name in dict.fromkeys(is_printed):
-        print("outfile: {}".format(outpath(settings["outd"], filepath, name)))
-    if settings["euploid"]:
-        print_transparent_pngs(file, settings["outd"], is_printed)
+
+def _run_batch(manifest_path, cli_options):
+    """Run jobs of a batch manifest, on top of options given on the command line"""
+    from .batch import run_batch  # pylint: disable=import-outside-toplevel
+
+    operations = {
+        name: lambda filepath, options, plot=plot: plot(filepath, _flag_options(options))
+        for name, plot in OPERATIONS.items()
+    }
+    given = {
+        key: value
+        for key, value in cli_options.items()
+        if value not in (None, False) and key not in OPERATION_DESTS.values() and key != "batch"
+    }
+    return run_batch(manifest_path, operations, given)
 
 
 def main():
     """Main function for Chromograph
 
     Parse incoming args and call correct function"""
+    if sys.argv[1:2] == ["serve"]:
+        from .server import main as serve  # pylint: disable=import-outside-toplevel
+
+        serve(sys.argv[2:])
+        return
+    if sys.argv[1:2] == ["index"]:
+        pyramid.main(sys.argv[2:])
+        return
     parser = ArgumentParser(
         epilog=(
             """\
-         One OPERATION Command is needed for Chromograph to produce output
+         One OPERATION Command is needed for Chromograph to produce output.
+         Run 'chromograph serve --help' for the render server,
+         'chromograph index --help' to write track pyramids.
 
          """
         )
@@ -945,6 +2069,8 @@ def main():
         metavar="FILE",
     )
 
+    parser.add_argument("--batch", help=HELP_STR_BATCH, metavar="MANIFEST")
+
     parser.add_argument("--step", type=int, help="fixed step size (default 5000)")
     parser.add_argument(
         "--version",
@@ -953,6 +2079,8 @@ def main():
         version="chromograph {}".format(__version__),
     )
     parser.add_argument("-d", "--outd", dest="outd", help="output dir", metavar="FILE")
+    parser.add_argument("-j", "--jobs", type=int, help=HELP_STR_JOBS, metavar="N")
+    parser.add_argument("--engine", choices=sorted(RENDERERS), help=HELP_STR_ENGINE)
     parser.add_argument("-e", "--euploid", help=HELP_STR_EU, action="store_true")
     parser.add_argument("-k", "--rgb", dest="rgb", help=HELP_STR_RGB, metavar="FILE")
     parser.add_argument("-n", "--norm", dest="norm", help=HELP_STR_NORM, action="store_true")
@@ -960,33 +2088,66 @@ def main():
         "-u", "--chunk", type=int, help="Set Matplotlib.agg.path.chunksize (default 10000)"
     )
     parser.add_argument("-x", "--combine", help=HELP_STR_COMBINE, action="store_true")
+    parser.add_argument("--cache", help=HELP_STR_CACHE, action="store_true")
+    parser.add_argument("--cache-dir", dest="cache_dir", help=HELP_STR_CACHE_DIR, metavar="DIR")
+    parser.add_argument("--no-cache", dest="no_cache", help=HELP_STR_NO_CACHE, action="store_true")
+    parser.add_argument("--incremental", help=HELP_STR_INCREMENTAL, action="store_true")
+    parser.add_argument("--atlas", help=HELP_STR_ATLAS, action="store_true")
+    parser.add_argument("--region", help=HELP_STR_REGION, metavar="CHROM[:START-END]")
+    parser.add_argument(
+        "--output-format",
+        dest="output_format",
+        choices=("png",) + FORMATS,
+        help=HELP_STR_OUTPUT_FORMAT,
+    )
+    parser.add_argument("--palette", help=HELP_STR_PALETTE, action="store_true")
+    parser.add_argument(
+        "--png-level", dest="png_level", type=int, help=HELP_STR_PNG_LEVEL, metavar="N"
+    )
+    parser.add_argument(
+        "--png-filter",
+        dest="png_filter",
+        choices=tuple(raster.FILTERS),
+        help=HELP_STR_PNG_FILTER,
+    )
+    parser.add_argument(
+        "--png-strategy",
+        dest="png_strategy",
+        choices=tuple(raster.STRATEGIES),
+        help=HELP_STR_PNG_STRATEGY,
+    )
+    parser.add_argument(
+        "--profile-json", dest="profile_json", help=HELP_STR_PROFILE, metavar="FILE"
+    )
+    parser.add_argument("-v", "--verbose", help=HELP_STR_VERBOSE, action="store_true")
+    parser.add_argument(
+        "--memory", type=int, help=HELP_STR_MEMORY.format(MEMORY_BUDGET), metavar="MB"
+    )
     parser.add_argument("--small", action="store_true")
     parser.add_argument("--medium", action="store_true")
     parser.add_argument("--large", action="store_true")
 
     args = parser.parse_args()
+    logging.basicConfig(
+        stream=sys.stdout,
+        format="%(message)s",
+        level=logging.DEBUG if args.verbose else logging.INFO,
+    )
 
-    # Make command line and library interfaces behave identical regarding args
-    args.norm = "norm" if args.norm else None
-    args.combine = "combine" if args.combine else None
-    args.euploid = "euploid" if args.euploid else None
-    agg_chunks_size = args.chunk if args.chunk else DEFAULT_SETTING["agg_chunk_size"]
-    matplotlib.rcParams["agg.path.chunksize"] = agg_chunks_size
-
-    if args.autozyg:
-        _plot_autozyg(args.autozyg, vars(args))
-    if args.coverage_file:
-        _plot_coverage_wig(args.coverage_file, vars(args))
-    if args.exom_coverage:
-        _plot_exom_coverage(args.exom_coverage, vars(args))
-    if args.hozysnp_file:
-        _plot_homosnp_wig(args.hozysnp_file, vars(args))
-    if args.ideofile:
-        _plot_ideogram(args.ideofile, vars(args))
-    if args.upd_regions:
-        _plot_upd_regions(args.upd_regions, vars(args))
-    if args.upd_sites:
-        _plot_upd_sites(args.upd_sites, vars(args))
+    MATPLOTLIB_RC["agg.path.chunksize"] = args.chunk or DEFAULT_SETTING["agg_chunk_size"]
+
+    options = _flag_options(vars(args))
+    with timing.recording(args.profile_json):  # one file for all operations
+        for name, dest in OPERATION_DESTS.items():
+            if options[dest]:
+                try:
+                    OPERATIONS[name](options[dest], options)
+                except NoDataError as error:
+                    LOG.warning("%s", error)
+                    sys.exit(0)  # nothing to draw is not an error
+        failed = args.batch and _run_batch(args.batch, vars(args))
+    if failed:
+        sys.exit(1)
     if len(sys.argv[1:]) == 0:
         parser.print_help()
         parser.exit()
@@ -0,0 +1,82 @@
+"""INCREMENTAL
+
+Opt-in skipping of inputs whose images are up to date. After rendering,
+a manifest `<input>.chromograph.json` is written to the output directory
+with a content hash of the input, the effective settings, the Chromograph
+version and the files written. A later run with the same hash, settings
+and version skips rendering if all those files still exist, costing a
+hash of the input and a stat per output file.
+"""
+
+import hashlib
+import json
+import os
+import tempfile
+
+MANIFEST_SUFFIX = ".chromograph.json"
+# settings that don't change the images
+IGNORED_SETTINGS = (
+    "jobs",
+    "cache_dir",
+    "incremental",
+    "memory",
+    "profile_json",
+    "in_memory",
+    "output_format",
+)
+HASH_BLOCK = 1 << 20
+
+
+def manifest_path(outd, filepath):
+    """Return path of the manifest of 'filepath' in 'outd'"""
+    return os.path.join(outd, os.path.basename(filepath) + MANIFEST_SUFFIX)
+
+
+def file_digest(filepath):
+    """Return SHA-256 hex digest of the contents of 'filepath'"""
+    digest = hashlib.sha256()
+    with open(filepath, "rb") as filestream:
+        for block in iter(lambda: filestream.read(HASH_BLOCK), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _record(filepath, operation, settings, version):
+    """Return what a manifest must match for outputs to be up to date"""
+    kept = {key: value for key, value in settings.items() if key not in IGNORED_SETTINGS}
+    return {
+        "input": os.path.basename(filepath),
+        "sha256": file_digest(filepath),
+        "operation": operation,
+        "settings": json.loads(json.dumps(kept, default=str)),
+        "version": version,
+    }
+
+
+def up_to_date(filepath, operation, settings, version):
+    """Return paths of the outputs of 'filepath' if they were rendered from
+    the same input with the same settings and version and all exist, else
+    None"""
+    outd = settings["outd"]
+    try:
+        with open(manifest_path(outd, filepath)) as filestream:
+            manifest = json.load(filestream)
+    except (OSError, ValueError):
+        return None
+    outputs = manifest.pop("outputs", None)
+    if not isinstance(outputs, list) or manifest != _record(filepath, operation, settings, version):
+        return None
+    outfiles = [os.path.join(outd, name) for name in outputs]
+    if not all(os.path.isfile(outfile) for outfile in outfiles):
+        return None
+    return outfiles
+
+
+def write_manifest(filepath, operation, settings, version, outfiles):
+    """Write manifest of the outputs of 'filepath' to the output directory"""
+    manifest = _record(filepath, operation, settings, version)
+    manifest["outputs"] = [os.path.basename(outfile) for outfile in outfiles]
+    outd = settings["outd"] or "."
+    with tempfile.NamedTemporaryFile("w", dir=outd, suffix=".tmp", delete=False) as filestream:
+        json.dump(manifest, filestream, indent=1)
+    os.replace(filestream.name, manifest_path(outd, filepath))
@@ -0,0 +1,71 @@
+"""INMEMORY
+
+Render to PNG bytes instead of files, for services answering with the
+images, from a path, an open file, bytes or a table:
+
+    from chromograph.chromograph import render_upd_sites
+    images = render_upd_sites(upload)  # {"1": b"\x89PNG...", "2": ...}
+
+Images are keyed by chromosome as in the file names plot functions write,
+e.g. "chr1" or "1", "combined" for combined graphs. Nothing is written.
+
+Inputs that are not paths are put in an anonymous in-memory file, Linux
+memfd, so every reader, of text, bigWig or track pyramids, reads them as
+files without touching the filesystem. Elsewhere a temporary file is
+used. Tables, anything pandas.DataFrame takes with the columns of the
+input in order, are written as tab separated text: BED columns of the
+operation, bedGraph (chrom, start, end, value) for coverage tracks.
+"""
+
+import io
+import os
+import tempfile
+from contextlib import contextmanager
+from .lazy import lazy_import
+
+pandas = lazy_import("pandas")
+
+
+def is_path(source):
+    """Return True if 'source' is a path rather than data"""
+    return isinstance(source, (str, os.PathLike))
+
+
+def source_bytes(source, header=True):
+    """Return contents of an open file, bytes or a table. Tables get a
+    header line, skipped by the readers, if 'header'."""
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        return bytes(source)
+    if hasattr(source, "read"):
+        data = source.read()
+        return data.encode() if isinstance(data, str) else data
+    table = pandas.DataFrame(source)
+    text = io.StringIO()
+    if header:
+        text.write("#" + "\t".join(str(column) for column in table.columns) + "\n")
+    table.to_csv(text, sep="\t", header=False, index=False)
+    return text.getvalue().encode()
+
+
+@contextmanager
+def input_path(source, header=True):
+    """Yield a path to read 'source' from, 'source' itself if it is a path,
+    else a file of its contents that is removed after the block"""
+    if is_path(source):
+        yield os.fspath(source)
+        return
+    data = source_bytes(source, header)
+    if hasattr(os, "memfd_create"):
+        fd = os.memfd_create("chromograph-input")
+        try:
+            with open(fd, "wb", closefd=False) as filestream:
+                filestream.write(data)
+            yield "/proc/self/fd/{}".format(fd)
+        finally:
+            os.close(fd)
+        return
+    with tempfile.TemporaryDirectory() as tmpdir:
+        path = os.path.join(tmpdir, "input")
+        with open(path, "wb") as filestream:
+            filestream.write(data)
+        yield path
@@ -0,0 +1,23 @@
+"""LAZY
+
+Import modules on first attribute access instead of at import time, so
+`import chromograph`, `chromograph --help` and `chromograph --version`
+don't wait for numpy and pandas to load.
+"""
+
+import importlib.util
+import sys
+
+
+def lazy_import(name):
+    """Return module 'name', executed the first time one of its attributes
+    is used. Modules already imported are returned as they are."""
+    if name in sys.modules:
+        return sys.modules[name]
+    spec = importlib.util.find_spec(name)
+    loader = importlib.util.LazyLoader(spec.loader)
+    spec.loader = loader
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[name] = module
+    loader.exec_module(module)
+    return module
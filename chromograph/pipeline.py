@@ -0,0 +1,130 @@
+"""PIPELINE
+
+Overlap drawing the next chromosome with encoding and writing the last.
+Within a writing() block images handed to write() are encoded, if given
+as a function doing so, and written by a small pool of threads, while
+the calling thread goes on drawing. zlib and file I/O release the GIL.
+
+    with pipeline.writing():
+        for chrom in chromosomes:
+            image = draw(chrom)
+            pipeline.write(outfile(chrom), lambda image=image: encode(image))
+
+At most 'threads' x QUEUE_PER_THREAD images wait to be written, write()
+blocks when that many do, capping memory. Every file is flushed and
+fsynced by its thread. Leaving the block is a barrier: it waits for all
+writes, syncs the directories written to and raises the first error of
+any of them. Outside a block write() encodes and writes right away.
+
+Matplotlib encodes while drawing in savefig, of figures reused for the
+next chromosome, so only writing is handed over for that engine.
+"""
+
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from . import timing
+
+DEFAULT_THREADS = min(4, os.cpu_count() or 1)
+QUEUE_PER_THREAD = 2
+
+_WRITER = None  # Writer of the writing() block, if any
+
+
+class Writer:
+    """Thread pool encoding and writing files, with a bounded queue"""
+
+    def __init__(self, threads=DEFAULT_THREADS):
+        self._executor = ThreadPoolExecutor(threads, thread_name_prefix="chromograph-write")
+        self._slots = threading.BoundedSemaphore(threads * QUEUE_PER_THREAD)
+        self._futures = []
+        self.pid = os.getpid()  # forked worker processes write themselves
+
+    def submit(self, outfile, data):
+        """Encode, if 'data' is a function returning bytes, and write
+        'outfile' on a thread, blocking while the queue is full"""
+        self._raise_failed()
+        self._slots.acquire()
+        try:
+            future = self._executor.submit(_write, outfile, data, timing.current_fields())
+        except BaseException:
+            self._slots.release()
+            raise
+        future.add_done_callback(lambda _future: self._slots.release())
+        self._futures.append(future)
+
+    def _raise_failed(self):
+        for future in self._futures:
+            if future.done() and future.exception() is not None:
+                raise future.exception()
+
+    def close(self):
+        """Wait for all writes, sync their directories, raise the first error"""
+        try:
+            written = [future.result() for future in self._futures]
+            for directory in {os.path.dirname(os.path.abspath(path)) for path in written}:
+                _sync_directory(directory)
+        finally:
+            self._executor.shutdown(wait=True, cancel_futures=True)
+
+
+def _write(outfile, data, fields):
+    """Encode and write 'outfile', timed with 'fields' of the submitting thread"""
+    if callable(data):
+        with timing.detached_stage("encode", **fields):
+            data = data()
+    with timing.detached_stage("write", **fields), open(outfile, "wb") as filestream:
+        filestream.write(data)
+        filestream.flush()
+        os.fsync(filestream.fileno())
+    return outfile
+
+
+def _sync_directory(directory):
+    """Make new entries of 'directory' durable, where directories can be synced"""
+    try:
+        fd = os.open(directory, os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass  # e.g. not supported by the filesystem
+    finally:
+        os.close(fd)
+
+
+@contextmanager
+def writing(threads=DEFAULT_THREADS, enabled=True):
+    """Hand writes of the block to a Writer, see above. Nested blocks, or
+    blocks not 'enabled', write as the block around them."""
+    global _WRITER  # pylint: disable=global-statement
+    if _WRITER is not None or not enabled:
+        yield
+        return
+    _WRITER = Writer(threads)
+    try:
+        yield
+    except BaseException:
+        writer, _WRITER = _WRITER, None
+        try:
+            writer.close()
+        except Exception:  # pylint: disable=broad-except
+            pass  # the error of the block is raised
+        raise
+    writer, _WRITER = _WRITER, None
+    writer.close()
+
+
+def write(outfile, data):
+    """Write 'data', PNG bytes or a function returning them, to 'outfile',
+    on the threads of the writing() block if in one"""
+    if _WRITER is not None and _WRITER.pid == os.getpid():
+        _WRITER.submit(outfile, data)
+        return
+    if callable(data):
+        with timing.stage("encode"):
+            data = data()
+    with timing.stage("write"), open(outfile, "wb") as filestream:
+        filestream.write(data)
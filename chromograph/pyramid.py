@@ -0,0 +1,256 @@
+"""PYRAMID
+
+Multi-resolution summaries of a track, written once by 'chromograph index'
+and read at the resolution of the image being drawn:
+
+    $ chromograph index sample.wig            # writes sample.pyramid
+    $ chromograph --coverage sample.pyramid
+
+Every chromosome has levels of bins of power-of-two bases, from the finest
+the input resolves up to one bin for the whole chromosome. A bin holds the
+minimum, maximum and mean value of the track over its bases, as float32.
+The file is
+
+    8 bytes   MAGIC
+    4 bytes   version, little-endian uint32
+    4 bytes   length of the header, little-endian uint32
+    header    JSON, {"track": "area" | "bars", "source": <input name>,
+              "chromosomes": [{"name": "chr1", "end": 248946000,
+              "levels": [{"bin": 8192, "bins": 30389, "offset": 0}, ...]}]}
+    data      one little-endian float32 array of shape (bins, 3) per level,
+              at 'offset' bytes from the start of the data, which starts
+              at the first multiple of 16 bytes after the header
+
+so any chromosome and level can be memory-mapped without reading the rest.
+A render reads the coarsest level giving BINS_PER_COLUMN bins per pixel
+column, a few hundred KB for a genome at screen resolution. Area tracks
+are drawn through the minimum, mean and maximum of every bin, bar tracks
+as the maximum.
+"""
+
+import json
+import struct
+from argparse import ArgumentParser
+from .lazy import lazy_import
+from .region import same_chromosome
+
+numpy = lazy_import("numpy")
+
+MAGIC = b"CHROMPYR"
+VERSION = 1
+PREAMBLE = "<8sII"  # magic, version, header length
+ALIGNMENT = 16
+MIN_BIN = 256  # bases, finest bin written
+BINS_PER_COLUMN = 4
+MIN, MAX, MEAN = range(3)  # fields of a bin
+
+
+def is_pyramid(filepath):
+    """Return True if 'filepath' is a track pyramid"""
+    with open(filepath, "rb") as filestream:
+        return filestream.read(len(MAGIC)) == MAGIC
+
+
+def read_header(filepath):
+    """Return the JSON header of a track pyramid, with 'data', the offset
+    of the data in the file, added"""
+    with open(filepath, "rb") as filestream:
+        magic, version, length = struct.unpack(PREAMBLE, filestream.read(struct.calcsize(PREAMBLE)))
+        if magic != MAGIC:
+            raise ValueError("not a track pyramid: {}".format(filepath))
+        if version != VERSION:
+            raise ValueError("unsupported track pyramid version {}: {}".format(version, filepath))
+        header = json.loads(filestream.read(length))
+    header["data"] = _aligned(struct.calcsize(PREAMBLE) + length)
+    return header
+
+
+def chromosome_names(filepath):
+    """Return names of the chromosomes of a track pyramid, in file order"""
+    return [chromosome["name"] for chromosome in read_header(filepath)["chromosomes"]]
+
+
+def _aligned(offset):
+    return -(-offset // ALIGNMENT) * ALIGNMENT
+
+
+def finest_bin(spacing):
+    """Return the smallest power-of-two bin of at least 'spacing' bases and MIN_BIN"""
+    bin_size = MIN_BIN
+    while bin_size < spacing:
+        bin_size *= 2
+    return bin_size
+
+
+def summarize_area(x, y, bin_size, end):
+    """Return (bins, 3) float32 array of min, max and mean of the polyline
+    (x, y), sorted on x, over bins of 'bin_size' from 0 to 'end'. The
+    polyline is 0 outside x. Means are exact integrals, extremes include
+    the values where segments cross bin borders."""
+    x = numpy.asarray(x, dtype=float)
+    y = numpy.asarray(y, dtype=float)
+    n_bins = max(1, -(-int(end) // bin_size))
+    edges = numpy.arange(n_bins + 1) * float(bin_size)
+    edge_values = numpy.interp(edges, x, y, left=0, right=0)
+
+    # integral from 0 to every edge, of trapezoids up to the vertex before it
+    areas = numpy.concatenate([[0.0], numpy.cumsum(numpy.diff(x) * (y[1:] + y[:-1]) / 2)])
+    before = numpy.clip(numpy.searchsorted(x, edges, "right") - 1, 0, len(x) - 1)
+    partial = (edges - x[before]) * (y[before] + edge_values) / 2
+    integral = numpy.where(edges > x[-1], areas[-1], 0.0)
+    inside = (edges >= x[0]) & (edges <= x[-1])
+    integral[inside] = areas[before[inside]] + partial[inside]
+
+    lows = numpy.minimum(edge_values[:-1], edge_values[1:])
+    highs = numpy.maximum(edge_values[:-1], edge_values[1:])
+    bins, firsts = numpy.unique(numpy.minimum(x // bin_size, n_bins - 1), return_index=True)
+    bins = bins.astype(int)
+    lows[bins] = numpy.minimum(lows[bins], numpy.minimum.reduceat(y, firsts))
+    highs[bins] = numpy.maximum(highs[bins], numpy.maximum.reduceat(y, firsts))
+    return numpy.column_stack([lows, highs, numpy.diff(integral) / bin_size]).astype(numpy.float32)
+
+
+def summarize_bars(starts, ends, heights, bin_size, end):
+    """Return (bins, 3) float32 array as summarize_area of opaque bars
+    [starts, ends), each bin taking the height of the highest bar covering
+    it as min, max and mean"""
+    n_bins = max(1, -(-int(end) // bin_size))
+    first = numpy.clip(numpy.asarray(starts) // bin_size, 0, n_bins - 1).astype(int)
+    last = numpy.clip(-(-numpy.asarray(ends) // bin_size), first + 1, n_bins).astype(int)
+    counts = last - first
+    covered = numpy.repeat(first - numpy.cumsum(counts) + counts, counts)
+    covered += numpy.arange(counts.sum())
+    skyline = numpy.zeros(n_bins)
+    numpy.maximum.at(skyline, covered, numpy.repeat(heights, counts))
+    return numpy.column_stack([skyline, skyline, skyline]).astype(numpy.float32)
+
+
+def coarsen(summaries):
+    """Return summaries of bins twice as large, bins beyond the end are 0"""
+    if len(summaries) % 2:
+        summaries = numpy.concatenate([summaries, numpy.zeros((1, 3), numpy.float32)])
+    pairs = summaries.reshape(-1, 2, 3)
+    return numpy.column_stack(
+        [
+            pairs[:, :, MIN].min(axis=1),
+            pairs[:, :, MAX].max(axis=1),
+            pairs[:, :, MEAN].mean(axis=1),
+        ]
+    )
+
+
+def build_levels(summaries, bin_size):
+    """Return [(bin size, summaries)] from the finest 'summaries' of
+    'bin_size' up to a single bin"""
+    levels = [(bin_size, summaries)]
+    while len(levels[-1][1]) > 1:
+        bin_size, summaries = levels[-1]
+        levels.append((bin_size * 2, coarsen(summaries)))
+    return levels
+
+
+def write_pyramid(outfile, chromosomes, track, source):
+    """Write track pyramid of 'chromosomes', list of (name, end, levels) with
+    levels as by build_levels, of a 'track' of kind 'area' or 'bars'"""
+    header = {"track": track, "source": source, "chromosomes": []}
+    offset = 0
+    for name, end, levels in chromosomes:
+        entry = {"name": name, "end": int(end), "levels": []}
+        for bin_size, summaries in levels:
+            entry["levels"].append({"bin": bin_size, "bins": len(summaries), "offset": offset})
+            offset += _aligned(summaries.nbytes)
+        header["chromosomes"].append(entry)
+    data = json.dumps(header).encode()
+    preamble = struct.pack(PREAMBLE, MAGIC, VERSION, len(data))
+    with open(outfile, "wb") as filestream:
+        filestream.write(preamble + data)
+        filestream.write(b"\0" * (_aligned(filestream.tell()) - filestream.tell()))
+        for _, _, levels in chromosomes:
+            for _, summaries in levels:
+                raw = summaries.astype("<f4").tobytes()
+                filestream.write(raw + b"\0" * (_aligned(len(raw)) - len(raw)))
+    return outfile
+
+
+def pick_level(levels, column_width=None):
+    """Return the coarsest level with BINS_PER_COLUMN bins per pixel column
+    of 'column_width' bases, the finest if there is none"""
+    fitting = [
+        level for level in levels if level["bin"] * BINS_PER_COLUMN <= (column_width or 0)
+    ]
+    return max(fitting, key=lambda level: level["bin"]) if fitting else levels[0]
+
+
+def read_level(filepath, header, level):
+    """Return memory-mapped (bins, 3) summaries of 'level' of a track pyramid"""
+    return numpy.memmap(
+        filepath,
+        dtype="<f4",
+        mode="r",
+        offset=header["data"] + level["offset"],
+        shape=(level["bins"], 3),
+    )
+
+
+def read_levels(filepath, column_width=None, chrom=None):
+    """Yield (name, bin size, memory-mapped summaries) of every chromosome
+    of a track pyramid, or of 'chrom' only, at the level picked for
+    'column_width'. Only that level is read."""
+    header = read_header(filepath)
+    for chromosome in header["chromosomes"]:
+        if chrom is not None and not same_chromosome(chromosome["name"], chrom):
+            continue
+        level = pick_level(chromosome["levels"], column_width)
+        yield chromosome["name"], level["bin"], read_level(filepath, header, level)
+
+
+def profile(summaries, bin_size):
+    """Return polyline (x, y) falling across every bin from its maximum,
+    through a middle value, to its minimum. The middle value gives the bin
+    the area of its mean, as far as it can within minimum and maximum.
+    Pixel columns spanning a few bins then look as those of the full track
+    when drawn as an area."""
+    lows, highs, means = (numpy.asarray(summaries[:, field], dtype=float) for field in range(3))
+    middles = numpy.clip(2 * means - (lows + highs) / 2, lows, highs)
+    starts = numpy.arange(len(summaries)) * bin_size
+    x = numpy.column_stack([starts, starts + bin_size // 2, starts + bin_size]).ravel()
+    return x, numpy.column_stack([highs, middles, lows]).ravel()
+
+
+def read_intervals(filepath, column_width=None, field=MAX, chrom=None):
+    """Return (names, chrom codes, starts, ends, values) of the bins with a
+    non-zero 'field' at the level picked for 'column_width', as
+    bigwig.read_intervals"""
+    names, codes, starts, ends, values = [], [], [], [], []
+    levels = read_levels(filepath, column_width, chrom)
+    for code, (name, bin_size, summaries) in enumerate(levels):
+        field_values = numpy.array(summaries[:, field], dtype=float)
+        kept = numpy.flatnonzero(field_values)
+        names.append(name)
+        codes.append(numpy.full(len(kept), code))
+        starts.append(kept * bin_size)
+        ends.append(starts[-1] + bin_size)
+        values.append(field_values[kept])
+    if not names:
+        empty = numpy.array([], dtype=numpy.int64)
+        return names, empty, empty, empty, numpy.array([])
+    return (names,) + tuple(numpy.concatenate(part) for part in (codes, starts, ends, values))
+
+
+def main(argv=None):
+    """Run 'chromograph index'"""
+    from .chromograph import index_track  # pylint: disable=import-outside-toplevel
+
+    parser = ArgumentParser(prog="chromograph index", description=__doc__.split("\n\n")[1])
+    parser.add_argument("input", help="WIG, bedGraph or bigWig track, or exom BED with --exom")
+    parser.add_argument(
+        "-o",
+        "--output",
+        help="track pyramid to write (default the input with suffix .pyramid)",
+        metavar="FILE",
+    )
+    parser.add_argument("--exom", help="input is exom coverage BED", action="store_true")
+    parser.add_argument("--step", type=int, help="fixed step size of WIG input")
+    parser.add_argument("--memory", type=int, help="MB per chunk of BED input", metavar="MB")
+    args = parser.parse_args(argv)
+    index_track(args.input, args.output, args.exom, args.step, args.memory)
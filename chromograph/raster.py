@@ -0,0 +1,298 @@
+"""RASTER
+
+Draw Chromograph's track images straight into a numpy RGBA buffer and
+encode them as PNG with zlib, bypassing Matplotlib. Images look like the
+ones Matplotlib's Agg backend saves for the same shapes: a transparent
+background, anti-aliased filled areas and rectangles snapped to whole
+pixels.
+
+Coordinates are given in pixels, x from the left and y from the bottom
+of the image.
+
+Track images hold a few colors, so PNGs can also be written with an
+indexed palette of at most 256 RGBA entries, at 1 to 8 bits per pixel,
+with the zlib level, PNG filter and zlib strategy given by PngOptions.
+"""
+
+import struct
+import zlib
+from collections import namedtuple
+from .lazy import lazy_import
+
+numpy = lazy_import("numpy")
+
+BACKGROUND = (255, 255, 255, 0)  # transparent, as saved by Matplotlib
+PNG_SIGNATURE = b"\x89PNG\r\n\x1a\n"
+INCH_PER_METER = 39.3700787
+FILTERS = {"none": 0, "sub": 1, "up": 2}
+STRATEGIES = {"default": zlib.Z_DEFAULT_STRATEGY, "filtered": zlib.Z_FILTERED, "rle": zlib.Z_RLE}
+FAST_LEVEL = 1
+MAX_COLORS = 256  # entries of a PNG palette
+
+# How to encode a PNG, fields left None take the defaults of encode_png.
+# 'palette' is the colors to quantize to if an image has too many for one.
+PngOptions = namedtuple("PngOptions", ["palette", "level", "filter", "strategy"])
+
+
+def hex_to_rgb(color):
+    """Return (r, g, b) of a color on format '#RRGGBB'"""
+    color = color.lstrip("#")
+    return tuple(int(color[i : i + 2], 16) for i in (0, 2, 4))
+
+
+def _pixel(rgba):
+    """Return an RGBA color as one uint32, to fill images four bytes at a time"""
+    return numpy.array(rgba, dtype=numpy.uint8).view(numpy.uint32)[0]
+
+
+def new_image(width, height):
+    """Return a transparent RGBA image"""
+    image = numpy.full((height, width), _pixel(BACKGROUND), dtype=numpy.uint32)
+    return image.view(numpy.uint8).reshape(height, width, 4)
+
+
+def _snap(values, limit):
+    """Return coordinates rounded to the nearest pixel edge within [0, limit]"""
+    return numpy.clip(numpy.floor(numpy.asarray(values, dtype=float) + 0.5), 0, limit).astype(int)
+
+
+def fill_rectangles(image, x0, x1, y0, y1, colors):
+    """Fill rectangles [x0, x1) x [y0, y1) in the order given, without
+    anti-aliasing; edges are snapped to whole pixels like Agg does for
+    rectilinear paths. 'colors' is one color or one per rectangle."""
+    height, width = image.shape[:2]
+    left, right, bottom, top = numpy.broadcast_arrays(
+        numpy.atleast_1d(_snap(x0, width)),
+        _snap(x1, width),
+        _snap(y0, height),
+        _snap(y1, height),
+    )
+    if isinstance(colors, str):
+        colors = [colors] * len(left)
+    pixels = {color: _pixel(hex_to_rgb(color) + (255,)) for color in set(colors)}
+    canvas = image.view(numpy.uint32)[..., 0]
+    for i in numpy.flatnonzero((right > left) & (top > bottom)):
+        canvas[height - top[i] : height - bottom[i], left[i] : right[i]] = pixels[colors[i]]
+
+
+def _row_integral(u):
+    """Integral of clip(s, 0, 1) from 0 to u"""
+    return numpy.where(u < 1, numpy.clip(u, 0, 1) ** 2 / 2, u - 0.5)
+
+
+def fill_area(image, x, y, color):
+    """Fill the area between y = 0 and the polyline (x, y), anti-aliased"""
+    height, width = image.shape[:2]
+    coverage = area_coverage(x, y, width, height)
+    coverage *= 255
+    coverage += 0.5
+    alpha = coverage[::-1].astype(numpy.uint8)
+
+    image.view(numpy.uint32)[alpha > 0] = _pixel(hex_to_rgb(color) + (0,))
+    image[..., 3] = alpha
+
+
+def area_coverage(x, y, width, height):
+    """Return the fraction of every pixel of a 'width' x 'height' image
+    covered by the area between y = 0 and the polyline (x, y), as rows
+    from the bottom of the image.
+
+    The polyline is cut at every pixel column border and the exact area
+    of each piece is summed per pixel. A piece covers the rows below it
+    fully, the rows it crosses linearly and its lowest and highest rows
+    partly. Everything is accumulated as second differences along rows,
+    so the work does not depend on how many rows a piece crosses."""
+    x = numpy.asarray(x, dtype=float)
+    y = numpy.clip(numpy.asarray(y, dtype=float), 0, height)
+    if len(x) < 2:
+        return numpy.zeros((height, width))
+    borders = numpy.arange(max(numpy.ceil(x[0]), 0), numpy.floor(min(x[-1], width)) + 1)
+    borders = borders[~numpy.isin(borders, x)]  # keep vertical edges, x may repeat
+    positions = numpy.searchsorted(x, borders)
+    xs = numpy.insert(x, positions, borders)
+    ys = numpy.insert(y, positions, numpy.interp(borders, x, y))
+    widths = numpy.diff(xs)
+    columns = numpy.floor((xs[1:] + xs[:-1]) / 2).astype(int)
+    low = numpy.minimum(ys[1:], ys[:-1])
+    high = numpy.maximum(ys[1:], ys[:-1])
+    inside = (widths > 0) & (columns >= 0) & (columns < width) & (high > 0)
+    widths, columns, low, high = widths[inside], columns[inside], low[inside], high[inside]
+    if len(widths) == 0:
+        return numpy.zeros((height, width))
+    low_row = numpy.floor(low).astype(int)
+    high_row = numpy.floor(high).astype(int)
+    rise = numpy.maximum(high - low, 1e-12)
+    same_row = low_row == high_row
+
+    # lowest and highest row are partly covered, the same row if the piece is flat
+    low_part = widths * numpy.where(
+        same_row,
+        (low + high) / 2 - low_row,
+        (_row_integral(high - low_row) - _row_integral(low - low_row)) / rise,
+    )
+    high_part = widths * numpy.where(
+        same_row, 0, (_row_integral(high - high_row) - _row_integral(low - high_row)) / rise
+    )
+    # rows in between get widths * (high - 0.5 - row) / rise, a ramp from
+    # the row above low_row up to the row below high_row
+    crossed = high_row - low_row > 1
+    slope = numpy.where(crossed, -widths / rise, 0)
+    ramp_start = numpy.where(crossed, widths * (high - 1.5 - low_row) / rise, 0)
+    ramp_end = ramp_start + slope * (high_row - low_row - 1)
+
+    # second differences of the coverage: rows below the piece (widths
+    # from row 0 to low_row), the two partial rows and the ramp
+    rows = numpy.concatenate([low_row + i for i in range(3)] + [high_row + i for i in range(3)])
+    weights = numpy.concatenate(
+        [
+            low_part - widths,
+            widths - 2 * low_part + ramp_start,
+            low_part + slope - ramp_start,
+            high_part - ramp_end,
+            ramp_end - slope - 2 * high_part,
+            high_part,
+        ]
+    )
+    coverage = numpy.bincount(
+        rows * width + numpy.tile(columns, 6), weights, minlength=(height + 3) * width
+    ).reshape(height + 3, width)
+    per_column = numpy.bincount(columns, widths, minlength=width)
+    coverage[0] += per_column
+    coverage[1] -= per_column
+    coverage = coverage[:height]
+    for _ in range(2):  # adding whole rows in place beats numpy.cumsum along axis 0
+        for row in range(1, height):
+            coverage[row] += coverage[row - 1]
+    return numpy.clip(coverage, 0, 1, out=coverage)
+
+
+def png_options(palette=None, level=None, png_filter=None, strategy=None):
+    """Return PngOptions of the values given, None if none is. Raise
+    ValueError of values encode_png does not know."""
+    if level is not None and not 0 <= level <= 9:
+        raise ValueError("PNG level must be 0 to 9")
+    if png_filter is not None and png_filter not in FILTERS:
+        raise ValueError("PNG filter must be one of {}".format(tuple(FILTERS)))
+    if strategy is not None and strategy not in STRATEGIES:
+        raise ValueError("PNG strategy must be one of {}".format(tuple(STRATEGIES)))
+    if palette is None and level is None and png_filter is None and strategy is None:
+        return None
+    return PngOptions(palette and tuple(palette), level, png_filter, strategy)
+
+
+def _png_chunk(kind, data):
+    chunk = kind + data
+    return struct.pack(">I", len(data)) + chunk + struct.pack(">I", zlib.crc32(chunk))
+
+
+def _distinct_colors(image):
+    """Return (colors, index) of an RGBA image: its distinct colors as sorted
+    uint32 and the position in them of the color of every pixel. Only the
+    first pixel of every run of equal pixels is looked up, track images are
+    mostly runs."""
+    flat = numpy.ascontiguousarray(image).view(numpy.uint32).ravel()
+    starts = numpy.flatnonzero(numpy.concatenate(([True], flat[1:] != flat[:-1])))
+    colors, inverse = numpy.unique(flat[starts], return_inverse=True)
+    index = numpy.repeat(inverse, numpy.diff(numpy.append(starts, len(flat))))
+    return colors, index.reshape(image.shape[:2])
+
+
+def quantize(colors, palette):
+    """Return RGBA 'colors', as uint32, replaced by the nearest color of
+    'palette' in RGB with alpha rounded to as many levels as fit in a PNG
+    palette. Colors rounded to no alpha become the background."""
+    rgba = colors.view(numpy.uint8).reshape(-1, 4)
+    rgb = numpy.array([hex_to_rgb(color) for color in palette])
+    distances = ((rgba[:, None, :3].astype(int) - rgb[None]) ** 2).sum(axis=2)
+    levels = max((MAX_COLORS - 1) // len(palette), 1)
+    alpha = numpy.round(numpy.round(rgba[:, 3] * (levels / 255)) * (255 / levels))
+    quantized = numpy.empty_like(rgba)
+    quantized[:, :3] = rgb[distances.argmin(axis=1)]
+    quantized[:, 3] = alpha
+    quantized[quantized[:, 3] == 0] = BACKGROUND
+    return quantized.view(numpy.uint32).ravel()
+
+
+def _indexed(image, palette):
+    """Return (colors, index) of 'image' for a PNG palette, quantized to
+    the colors of 'palette' if it has more than fit"""
+    colors, index = _distinct_colors(image)
+    if len(colors) > MAX_COLORS:
+        colors, inverse = numpy.unique(quantize(colors, palette), return_inverse=True)
+        index = inverse[index]
+    return colors, index.astype(numpy.uint8)
+
+
+def _pack(index, bits):
+    """Return rows of palette indices packed 'bits' to a byte, first pixel highest"""
+    if bits == 8:
+        return index
+    height, width = index.shape
+    per_byte = 8 // bits
+    padded = numpy.zeros((height, -(-width // per_byte) * per_byte), dtype=numpy.uint8)
+    padded[:, :width] = index
+    shifts = numpy.arange(per_byte - 1, -1, -1, dtype=numpy.uint8) * bits
+    return numpy.bitwise_or.reduce(padded.reshape(height, -1, per_byte) << shifts, axis=2)
+
+
+def _scanlines(rows, filter_type, bpp):
+    """Return 'rows' of bytes filtered with PNG filter 'filter_type', each
+    prefixed by its type. 'bpp' is bytes per pixel, at least one."""
+    height, length = rows.shape
+    scanlines = numpy.empty((height, length + 1), dtype=numpy.uint8)
+    scanlines[:, 0] = filter_type
+    if filter_type == FILTERS["up"]:
+        scanlines[0, 1:] = rows[0]
+        numpy.subtract(rows[1:], rows[:-1], out=scanlines[1:, 1:])
+    elif filter_type == FILTERS["sub"]:
+        scanlines[:, 1 : bpp + 1] = rows[:, :bpp]
+        numpy.subtract(rows[:, bpp:], rows[:, :-bpp], out=scanlines[:, bpp + 1 :])
+    else:
+        scanlines[:, 1:] = rows
+    return scanlines
+
+
+def encode_png(image, dpi=None, png=None):
+    """Return an RGBA image as PNG bytes, compressed with zlib, as given by
+    PngOptions 'png'. By default rows are stored as differences to the row
+    above (PNG filter type 2, 'Up'); track images are mostly vertical edges,
+    so that compresses well even at a fast compression level. With a
+    'palette' pixels are stored as indices into the colors of the image,
+    compressed as runs (zlib strategy 'rle') by default."""
+    png = png or PngOptions(None, None, None, None)
+    height, width = image.shape[:2]
+    chunks = []
+    if png.palette:
+        colors, index = _indexed(image, png.palette)
+        bits = next(bits for bits in (1, 2, 4, 8) if len(colors) <= 2**bits)
+        rows, bpp = _pack(index, bits), 1
+        entries = colors.view(numpy.uint8).reshape(-1, 4)
+        header = struct.pack(">IIBBBBB", width, height, bits, 3, 0, 0, 0)
+        chunks.append(_png_chunk(b"PLTE", entries[:, :3].tobytes()))
+        alpha = entries[:, 3].tobytes().rstrip(b"\xff")  # opaque colors sort last
+        if alpha:
+            chunks.append(_png_chunk(b"tRNS", alpha))
+    else:
+        rows, bpp = image.reshape(height, width * 4), 4
+        header = struct.pack(">IIBBBBB", width, height, 8, 6, 0, 0, 0)
+    if dpi:
+        pixels_per_meter = int(round(dpi * INCH_PER_METER))
+        resolution = struct.pack(">IIB", pixels_per_meter, pixels_per_meter, 1)
+        chunks.append(_png_chunk(b"pHYs", resolution))
+    scanlines = _scanlines(rows, FILTERS[png.filter or "up"], bpp)
+    compressor = zlib.compressobj(
+        FAST_LEVEL if png.level is None else png.level,
+        zlib.DEFLATED,
+        zlib.MAX_WBITS,
+        zlib.DEF_MEM_LEVEL,
+        STRATEGIES[png.strategy or ("rle" if png.palette else "default")],
+    )
+    data = compressor.compress(scanlines.tobytes()) + compressor.flush()
+    png_bytes = PNG_SIGNATURE + _png_chunk(b"IHDR", header) + b"".join(chunks)
+    return png_bytes + _png_chunk(b"IDAT", data) + _png_chunk(b"IEND", b"")
+
+
+def write_png(image, outfile, dpi=None, png=None):
+    """Write an RGBA image to 'outfile' as PNG"""
+    with open(outfile, "wb") as filestream:
+        filestream.write(encode_png(image, dpi, png))
@@ -0,0 +1,173 @@
+"""REGION
+
+Draw one chromosome, or a window of one, of any input:
+
+    $ chromograph --sites upd_sites.bed --region chr15
+    $ chromograph --coverage sample.wig --region chr15:20,000,000-30,000,000
+
+A window is drawn stretched over the whole x-axis. Where the input
+allows it, only the part covering the region is read:
+
+  - BED compressed with bgzip and indexed with tabix, '<input>.tbi': the
+    BGZF blocks listed in the index for the bins of the region
+  - WIG: the lines following the declarations of the chromosome, found
+    by a byte offset index of the declarations, without parsing values.
+    The index is kept in the cache, if one is given, so later runs skip
+    the scan of the file; without a cache it is built on every run
+  - bigWig and track pyramids: the data of the chromosome
+
+Other inputs are read whole, keeping only the rows of the chromosome.
+"""
+
+import mmap
+import re
+import struct
+from collections import namedtuple
+from . import bgzf
+from .cache import cached_dataframe
+from .lazy import lazy_import
+
+pandas = lazy_import("pandas")
+
+REGION = re.compile(r"^(\w+)(?::([\d,]+)-([\d,]+))?$")
+WIG_DECLARATIONS = (b"fixedStep", b"variableStep")
+TABIX_MAGIC = b"TBI\x01"
+TABIX_HEADER = "<4s8i"  # magic, references, format, columns, meta, skip, names length
+TABIX_WINDOW = 14  # bits of the 16 kb windows of the linear index
+TABIX_LEVELS = ((26, 1), (23, 9), (20, 73), (17, 585), (14, 4681))  # bits, first bin
+TABIX_MAX_END = 1 << 29
+
+Region = namedtuple("Region", ["chrom", "start", "end"])
+
+
+def parse_region(text):
+    """Return Region of 'CHROM' or 'CHROM:START-END', 1-based and inclusive
+    as in samtools and tabix, as 0-based and half-open. Start and end are
+    None for a whole chromosome."""
+    match = REGION.match(text.strip())
+    if match is None:
+        raise ValueError("region must be CHROM or CHROM:START-END, not {}".format(text))
+    chrom, start, end = match.groups()
+    if start is None:
+        return Region(chrom, None, None)
+    start, end = int(start.replace(",", "")) - 1, int(end.replace(",", ""))
+    if start < 0 or end <= start:
+        raise ValueError("empty region: {}".format(text))
+    return Region(chrom, start, end)
+
+
+def same_chromosome(name, chrom):
+    """Return True if 'name' and 'chrom' name the same chromosome, as '15' or 'chr15'"""
+    return name.replace("chr", "", 1) == chrom.replace("chr", "", 1)
+
+
+def wig_blocks(data):
+    """Return [(chrom, start, end)] byte offsets of every declaration of a
+    WIG file and the values following it, in 'data'"""
+    declarations = []
+    position = data.find(b"Step")
+    while position >= 0:
+        line_start = data.rfind(b"\n", 0, position) + 1
+        line_end = data.find(b"\n", position)
+        line = data[line_start : line_end if line_end >= 0 else len(data)]
+        if line.startswith(WIG_DECLARATIONS) and b"chrom=" in line:
+            chrom = line.split(b"chrom=")[1].split()[0].decode()
+            declarations.append((chrom, line_start))
+        position = data.find(b"Step", line_end) if line_end >= 0 else -1
+    ends = [start for _, start in declarations[1:]] + [len(data)]
+    return [(chrom, start, end) for (chrom, start), end in zip(declarations, ends)]
+
+
+def read_wig_region(filepath, region, cache_dir=None):
+    """Return bytes of the declarations and values of the chromosome of
+    'region' in a WIG file. Values of plain files are not read at all for
+    other chromosomes, and their offset index is kept in 'cache_dir' if
+    given. Compressed files are decompressed whole."""
+    if bgzf.is_gzip(filepath):
+        data = bgzf.read_input(filepath)
+        return _wig_region(data, wig_blocks(data), region)
+    with open(filepath, "rb") as filestream:
+        if not filestream.seek(0, 2):
+            return b""
+        with mmap.mmap(filestream.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            blocks = cached_dataframe(
+                cache_dir,
+                filepath,
+                lambda: pandas.DataFrame(wig_blocks(data), columns=["chrom", "start", "end"]),
+                "wig_blocks",
+            )
+            return _wig_region(data, zip(blocks.chrom, blocks.start, blocks.end), region)
+
+
+def _wig_region(data, blocks, region):
+    return b"".join(
+        data[start:end] for chrom, start, end in blocks if same_chromosome(chrom, region.chrom)
+    )
+
+
+def read_tabix(indexfile):
+    """Return {reference name: (bins, linear index)} of a tabix index, with
+    bins mapping bin number to chunks (start, end) of virtual offsets"""
+    data = bgzf.read_input(indexfile)
+    magic, n_refs, *_, names_length = struct.unpack_from(TABIX_HEADER, data)
+    if magic != TABIX_MAGIC:
+        raise ValueError("not a tabix index: {}".format(indexfile))
+    position = struct.calcsize(TABIX_HEADER)
+    names = data[position : position + names_length].split(b"\0")[:n_refs]
+    position += names_length
+    references = {}
+    for name in names:
+        bins = {}
+        (n_bins,) = struct.unpack_from("<i", data, position)
+        position += 4
+        for _ in range(n_bins):
+            number, n_chunks = struct.unpack_from("<Ii", data, position)
+            offsets = struct.unpack_from("<{}Q".format(2 * n_chunks), data, position + 8)
+            bins[number] = list(zip(offsets[::2], offsets[1::2]))
+            position += 8 + 16 * n_chunks
+        (n_windows,) = struct.unpack_from("<i", data, position)
+        linear = struct.unpack_from("<{}Q".format(n_windows), data, position + 4)
+        position += 4 + 8 * n_windows
+        references[name.decode()] = (bins, linear)
+    return references
+
+
+def tabix_bins(start, end):
+    """Return numbers of the bins that may hold records overlapping [start, end)"""
+    numbers = [0]
+    for bits, first in TABIX_LEVELS:
+        numbers.extend(range(first + (start >> bits), first + ((end - 1) >> bits) + 1))
+    return numbers
+
+
+def tabix_chunks(references, region):
+    """Return merged chunks (start, end) of virtual offsets of the records
+    that may overlap 'region', from a tabix index"""
+    names = [name for name in references if same_chromosome(name, region.chrom)]
+    if not names:
+        return []
+    bins, linear = references[names[0]]
+    start = region.start or 0
+    end = region.end or TABIX_MAX_END
+    window = min(start >> TABIX_WINDOW, len(linear) - 1)
+    lowest = linear[window] if linear else 0
+    chunks = sorted(
+        chunk
+        for number in tabix_bins(start, end)
+        for chunk in bins.get(number, [])
+        if chunk[1] > lowest
+    )
+    merged = []
+    for chunk_start, chunk_end in chunks:
+        if merged and chunk_start <= merged[-1][1]:
+            merged[-1][1] = max(merged[-1][1], chunk_end)
+        else:
+            merged.append([max(chunk_start, lowest), chunk_end])
+    return [tuple(chunk) for chunk in merged]
+
+
+def read_tabix_region(filepath, region, threads=None):
+    """Return bytes of the lines of a bgzip compressed, tabix indexed file
+    that may overlap 'region'"""
+    chunks = tabix_chunks(read_tabix(filepath + ".tbi"), region)
+    return b"".join(bgzf.read_virtual(filepath, start, end, threads) for start, end in chunks)
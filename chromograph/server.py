@@ -0,0 +1,291 @@
+"""SERVER
+
+Long-lived local HTTP server rendering Chromograph images, for callers
+like Scout that would otherwise start the command line for every image.
+
+    $ chromograph serve --port 8765 --workers 4
+
+Jobs run in a pool of worker processes that import Chromograph and
+Matplotlib once, when the server starts. At most 'workers + queue' jobs are accepted
+at a time, further requests get 503 and a Retry-After header.
+
+    POST /render   {"operation": "coverage", "input": "/data/s1.wig",
+                    "outd": "/data/png", "options": {"engine": "raster"},
+                    "return": "paths" | "png"}
+    GET  /health   {"status": "ok", ...}
+    GET  /metrics  request counters and seconds per operation
+
+Operations and options are named as in batch manifests. A render returns
+{"outfiles": [...], "seconds": ...}. If "return" is "png" the images are
+rendered in memory and nothing is written; it returns {"images": ...,
+"seconds": ...}, "images" mapping the paths the files would have had to
+base64 encoded PNGs.
+"""
+
+import base64
+import json
+import logging
+import multiprocessing
+import os
+import sys
+import threading
+import time
+from argparse import ArgumentParser
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+LOG = logging.getLogger(__name__)
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8765
+DEFAULT_QUEUE = 16
+RETRY_AFTER = 1  # seconds
+START_TIMEOUT = 120  # seconds for all workers to start
+
+_STARTED = None  # barrier of the workers of a pool, set in each worker
+
+
+class QueueFull(Exception):
+    """Raised when a job is submitted to a service running at capacity"""
+
+
+def _warm_worker(started):
+    """Import Chromograph and Matplotlib once per worker process"""
+    global _STARTED  # pylint: disable=global-statement
+    from . import chromograph  # pylint: disable=import-outside-toplevel
+
+    chromograph.MATPLOTLIB_RC["agg.path.chunksize"] = chromograph.DEFAULT_SETTING["agg_chunk_size"]
+    chromograph._pyplot()
+    _STARTED = started
+
+
+def _wait_started():
+    """Return once every worker of the pool runs this job"""
+    _STARTED.wait(START_TIMEOUT)
+
+
+def render_job(operation, filepath, options, inline=False):
+    """Run one plot operation, return list of files written, or if 'inline'
+    {path the file would have had: PNG bytes} of images rendered in memory"""
+    # pylint: disable=import-outside-toplevel
+    from .chromograph import OPERATIONS, _flag_options, _render
+    from .chr_utils import outpath
+
+    options = _flag_options(dict(options, jobs=1))  # the pool already renders in parallel
+    if not inline:
+        return OPERATIONS[operation](filepath, options)
+    images = _render(OPERATIONS[operation], filepath, options)
+    outd = options.get("outd") or os.path.dirname(filepath)
+    return {outpath(outd, filepath, label): png for label, png in images.items()}
+
+
+class RenderService:
+    """Pool of warm worker processes accepting a bounded number of jobs"""
+
+    def __init__(self, workers=1, queue=DEFAULT_QUEUE):
+        self.workers = workers
+        self._executor = self._new_executor()
+        self._slots = threading.BoundedSemaphore(workers + queue)
+        self._capacity = workers + queue
+        self._lock = threading.Lock()
+        self._started = time.time()
+        self._counts = defaultdict(int)
+        self._operations = defaultdict(lambda: {"jobs": 0, "failed": 0, "seconds": 0.0})
+
+    def _new_executor(self):
+        # workers are started by a fork server, not forked from the calling
+        # thread while other threads of the HTTP server may hold locks
+        context = multiprocessing.get_context("forkserver")
+        return ProcessPoolExecutor(
+            max_workers=self.workers,
+            mp_context=context,
+            initializer=_warm_worker,
+            initargs=(context.Barrier(self.workers),),
+        )
+
+    def start(self):
+        """Start and warm all worker processes, so no request waits for them"""
+        # while no worker is idle the pool starts a new one for every job
+        futures = [self._executor.submit(_wait_started) for _ in range(self.workers)]
+        for future in futures:
+            future.result()
+
+    def submit(self, operation, filepath, options, inline=False):
+        """Return future of a render job, see render_job, raise QueueFull if at capacity"""
+        if not self._slots.acquire(blocking=False):
+            self._count("rejected")
+            raise QueueFull("{} jobs in progress".format(self._capacity))
+        start = time.perf_counter()
+        try:
+            future = self._submit(operation, filepath, options, inline)
+        except BaseException:
+            self._slots.release()
+            raise
+        self._count("accepted")
+        future.add_done_callback(lambda done: self._finish(operation, done, start))
+        return future
+
+    def _submit(self, *args):
+        executor = self._executor
+        try:
+            return executor.submit(render_job, *args)
+        except BrokenProcessPool:
+            # a worker died, e.g. killed by the OS; start a new pool, unless
+            # another thread already replaced the broken one
+            with self._lock:
+                if self._executor is executor:
+                    self._executor = self._new_executor()
+                    executor.shutdown(wait=False, cancel_futures=True)
+                executor = self._executor
+            return executor.submit(render_job, *args)
+
+    def _count(self, name):
+        with self._lock:
+            self._counts[name] += 1
+
+    def _finish(self, operation, future, start):
+        with self._lock:
+            stat = self._operations[operation]
+            stat["jobs"] += 1
+            stat["seconds"] += time.perf_counter() - start
+            if future.exception() is not None:
+                stat["failed"] += 1
+        self._slots.release()
+
+    def metrics(self):
+        """Return counters of the service as a dict"""
+        with self._lock:
+            done = sum(stat["jobs"] for stat in self._operations.values())
+            return {
+                "uptime": time.time() - self._started,
+                "workers": self.workers,
+                "capacity": self._capacity,
+                "in_progress": self._counts["accepted"] - done,
+                "accepted": self._counts["accepted"],
+                "rejected": self._counts["rejected"],
+                "operations": {name: dict(stat) for name, stat in self._operations.items()},
+            }
+
+    def shutdown(self):
+        """Stop worker processes"""
+        self._executor.shutdown(cancel_futures=True)
+
+
+class RenderHandler(BaseHTTPRequestHandler):
+    """HTTP front of a RenderService, set as 'service' on the server"""
+
+    def _send_json(self, status, body, headers=None):
+        data = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):  # pylint: disable=redefined-builtin
+        """Log requests through LOG instead of writing them to stderr"""
+        LOG.info("%s %s", self.address_string(), format % args)
+
+    def do_GET(self):  # pylint: disable=invalid-name
+        """Serve /health and /metrics"""
+        service = self.server.service
+        if self.path == "/health":
+            self._send_json(200, {"status": "ok", "workers": service.workers})
+        elif self.path == "/metrics":
+            self._send_json(200, service.metrics())
+        else:
+            self._send_json(404, {"error": "not found: {}".format(self.path)})
+
+    def do_POST(self):  # pylint: disable=invalid-name
+        """Serve /render"""
+        if self.path != "/render":
+            self._send_json(404, {"error": "not found: {}".format(self.path)})
+            return
+        try:
+            length = int(self.headers.get("Content-Length", 0))
+            request = json.loads(self.rfile.read(length) or b"{}")
+            operation, filepath, options, inline = _parse_request(request)
+        except ValueError as error:
+            self._send_json(400, {"error": str(error)})
+            return
+
+        start = time.perf_counter()
+        try:
+            result = self.server.service.submit(operation, filepath, options, inline).result()
+        except QueueFull as error:
+            self._send_json(503, {"error": str(error)}, {"Retry-After": str(RETRY_AFTER)})
+            return
+        except Exception as error:  # pylint: disable=broad-except
+            message = "{}: {}".format(type(error).__name__, error)
+            LOG.error("Error: %s %s failed: %s", operation, filepath, message)
+            self._send_json(500, {"error": message})
+            return
+        if inline:
+            images = {path: base64.b64encode(png).decode() for path, png in result.items()}
+            body = {"images": images, "seconds": time.perf_counter() - start}
+        else:
+            body = {"outfiles": result, "seconds": time.perf_counter() - start}
+        self._send_json(200, body)
+
+
+def _parse_request(request):
+    """Return operation, input, options and whether to return images of a
+    render request. Raise ValueError if it is malformed."""
+    from .chromograph import OPERATIONS  # pylint: disable=import-outside-toplevel
+
+    if not isinstance(request, dict):
+        raise ValueError("expected a JSON object")
+    if request.get("operation") not in OPERATIONS:
+        raise ValueError("operation must be one of {}".format(sorted(OPERATIONS)))
+    if not isinstance(request.get("input"), str):
+        raise ValueError("input must be a file path")
+    options = request.get("options") or {}
+    if not isinstance(options, dict):
+        raise ValueError("options must be an object")
+    if request.get("outd"):
+        options = dict(options, outd=request["outd"])
+    if request.get("return", "paths") not in ("paths", "png"):
+        raise ValueError("return must be 'paths' or 'png'")
+    return request["operation"], request["input"], options, request.get("return") == "png"
+
+
+def make_server(host=DEFAULT_HOST, port=DEFAULT_PORT, workers=1, queue=DEFAULT_QUEUE):
+    """Return an HTTP server with a RenderService of started workers, not yet serving"""
+    server = ThreadingHTTPServer((host, port), RenderHandler)
+    server.daemon_threads = True
+    server.service = RenderService(workers, queue)
+    server.service.start()
+    return server
+
+
+def main(argv=None):
+    """Run 'chromograph serve' until interrupted"""
+    parser = ArgumentParser(prog="chromograph serve", description=__doc__.split("\n\n")[1])
+    parser.add_argument("--host", default=DEFAULT_HOST, help="address to bind")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT, help="port to bind")
+    parser.add_argument(
+        "-w", "--workers", type=int, default=1, help="worker processes (default 1)", metavar="N"
+    )
+    parser.add_argument(
+        "--queue",
+        type=int,
+        default=DEFAULT_QUEUE,
+        help="jobs accepted beyond those running (default {})".format(DEFAULT_QUEUE),
+        metavar="N",
+    )
+    args = parser.parse_args(argv)
+    logging.basicConfig(stream=sys.stdout, format="%(message)s", level=logging.INFO)
+
+    server = make_server(args.host, args.port, args.workers, args.queue)
+    LOG.info("Serving on http://%s:%s", *server.server_address[:2])
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        server.service.shutdown()
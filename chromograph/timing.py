@@ -0,0 +1,172 @@
+"""TIMING
+
+Opt-in record of the wall and CPU time of every stage of a render:
+
+    $ chromograph --coverage sample.wig --profile-json profile.json
+
+or, from Python, `plot_coverage_wig("sample.wig", profile_json="profile.json")`,
+or to get the records without a file:
+
+    with timing.recording() as stages:
+        plot_coverage_wig("sample.wig")
+
+Stages are
+
+    plot       one operation on one input, all of the below
+    read       parsing the input, or loading it from the cache; rows
+    transform  filtering and reshaping the tracks, per chromosome the
+               shapes to draw with decimation; vertices
+    render     drawing one chromosome, the three below and setting up the
+               figure the first time; vertices
+    draw       filling the image, for Matplotlib drawing and encoding
+    encode     PNG encoding, raster engine only
+    write      writing the PNG
+
+Rendering in one process, encoding and writing are done on threads while
+the next chromosome is drawn, see pipeline.py, and are not part of the
+render stage; "cpu" of those stages is that of the whole process.
+
+Every record holds the fields of the stages it is part of, e.g. operation,
+input and chrom, plus "wall" and "cpu" seconds. Stages nest, so times of
+a stage include those of the stages within it. Renders in worker
+processes are recorded there and returned with their images; "cpu" is
+then the CPU time of the worker.
+
+The JSON file is {"stages": [records in the order they ended],
+"totals": {stage: {"count", "wall", "cpu"}}}. Outside of a recording
+stages cost a check of a global.
+"""
+
+import json
+import time
+from contextlib import contextmanager
+
+_STAGES = None  # records while recording
+_FIELDS = []  # fields of the stages being timed, innermost last
+_END = object()
+
+
+def recording_active():
+    """Return True if stages are being recorded"""
+    return _STAGES is not None
+
+
+@contextmanager
+def recording(outfile=None):
+    """Record stages within the block, yielding the list of records. They
+    are written as JSON to 'outfile' if given. Within another recording the
+    records go to the outer one, which writes them."""
+    global _STAGES  # pylint: disable=global-statement
+    if _STAGES is not None:
+        yield _STAGES
+        return
+    _STAGES = []
+    try:
+        yield _STAGES
+    finally:
+        stages, _STAGES = _STAGES, None
+        if outfile:
+            write_profile(outfile, stages)
+
+
+def _record(name, wall, cpu, fields):
+    merged = {"stage": name, **current_fields(), **fields}
+    merged["wall"] = time.perf_counter() - wall
+    merged["cpu"] = time.process_time() - cpu
+    _STAGES.append(merged)
+
+
+@contextmanager
+def stage(name, **fields):
+    """Time the block as stage 'name' with 'fields', e.g. chrom or rows.
+    Yields the dict of fields, counts known only within the block can be
+    added to it."""
+    if _STAGES is None:
+        yield fields
+        return
+    wall, cpu = time.perf_counter(), time.process_time()
+    _FIELDS.append(fields)
+    try:
+        yield fields
+    finally:
+        _FIELDS.pop()
+        _record(name, wall, cpu, fields)
+
+
+@contextmanager
+def detached_stage(name, **fields):
+    """Time the block as stage 'name' with 'fields' only, for blocks run on
+    other threads than the stages they are part of. Pass the fields of
+    current_fields() taken when the work was handed over."""
+    stages = _STAGES
+    if stages is None:
+        yield fields
+        return
+    wall, cpu = time.perf_counter(), time.process_time()
+    try:
+        yield fields
+    finally:
+        record = {"stage": name, **fields}
+        record["wall"] = time.perf_counter() - wall
+        record["cpu"] = time.process_time() - cpu
+        stages.append(record)
+
+
+def timed(name, items, fields):
+    """Yield 'items', timing the making of each as stage 'name' with
+    fields(item), for generators doing their work lazily"""
+    if _STAGES is None:
+        yield from items
+        return
+    iterator = iter(items)
+    while True:
+        wall, cpu = time.perf_counter(), time.process_time()
+        item = next(iterator, _END)
+        if item is _END:
+            return
+        _record(name, wall, cpu, fields(item))
+        yield item
+
+
+def current_fields():
+    """Return the fields of the stages being timed, merged"""
+    merged = {}
+    for fields in _FIELDS:
+        merged.update(fields)
+    return merged
+
+
+def call_recorded(function, args, fields):
+    """Return (function(*args), records of its stages, every one with
+    'fields'), for calls run in worker processes while the main process
+    records"""
+    global _STAGES, _FIELDS  # pylint: disable=global-statement
+    outer = _STAGES, _FIELDS  # forked workers inherit those of the main process
+    _STAGES, _FIELDS = [], [fields]
+    try:
+        return function(*args), _STAGES
+    finally:
+        _STAGES, _FIELDS = outer
+
+
+def add_records(records):
+    """Add records made in another process to the recording"""
+    if _STAGES is not None:
+        _STAGES.extend(records)
+
+
+def totals(stages):
+    """Return {stage: {"count", "wall", "cpu"}} summed over 'stages'"""
+    summed = {}
+    for record in stages:
+        total = summed.setdefault(record["stage"], {"count": 0, "wall": 0.0, "cpu": 0.0})
+        total["count"] += 1
+        total["wall"] += record["wall"]
+        total["cpu"] += record["cpu"]
+    return summed
+
+
+def write_profile(outfile, stages):
+    """Write records of 'stages' and their totals as JSON to 'outfile'"""
+    with open(outfile, "w") as filestream:
+        json.dump({"stages": stages, "totals": totals(stages)}, filestream, indent=1, default=str)
@@ -40,7 +40,7 @@ setup(
     description='tool for plotting genetic data',
     author='mikaell',
     author_email='mikael.laaksonen@scilifelab.se',
-    packages=find_packages(exclude=('tests*', 'docs', 'examples')),
+    packages=find_packages(exclude=('tests*', 'benchmarks*', 'docs', 'examples')),
     include_package_data=True,
     zip_safe=False,
     install_requires=REQUIRED,
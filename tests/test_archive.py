@@ -0,0 +1,73 @@
+"""Pytests for Chromograph's archive output"""
+import os
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+import pytest
+import chromograph.chromograph as chrom
+from chromograph import archive, upd_regions_example, upd_sites_example
+
+WRITES = 40  # per process writing to one archive
+
+
+@pytest.mark.parametrize("output_format", archive.FORMATS)
+def test_plot_to_archive(tmpdir, output_format):
+    # GIVEN UPD sites and regions plotted to files
+    outfiles = chrom.plot_upd_sites(upd_sites_example, outd=str(tmpdir.join("png")), euploid=True)
+    # WHEN plotting them to an archive
+    outd = str(tmpdir.join("archive"))
+    options = {"outd": outd, "euploid": True, "output_format": output_format}
+    written = chrom.plot_upd_sites(upd_sites_example, **options)
+    chrom.plot_upd_regions(upd_regions_example, **options)
+    # THEN one archive holds the images of both, named as the files
+    path = archive.archive_path(outd, output_format)
+    assert written == [path] and tmpdir.join("archive").listdir() == [path]
+    names = archive.list_images(path)
+    assert len(names) == 2 * len(chrom.CHROMOSOMES)
+    assert "upd_regions_12.png" in names
+    for outfile in outfiles:
+        with open(outfile, "rb") as filestream:
+            assert archive.read_image(path, os.path.basename(outfile)) == filestream.read()
+    with pytest.raises(KeyError):
+        archive.read_image(path, "upd_sites_Q.png")
+
+
+def test_zip_deduplicates(tmpdir):
+    # GIVEN images of which two are the same
+    path = str(tmpdir.join("chromograph.zip"))
+    archive.write_images(path, "zip", {"a_1.png": b"one", "a_2.png": b"two", "a_Y.png": b"one"})
+    # WHEN a later write replaces one
+    archive.write_images(path, "zip", {"a_2.png": b"one"})
+    # THEN every image is stored once and names read the latest image
+    with zipfile.ZipFile(path) as zipped:
+        assert sum(name.startswith("blobs/") for name in zipped.namelist()) == 2
+    assert archive.list_images(path) == ["a_1.png", "a_2.png", "a_Y.png"]
+    assert archive.read_image(path, "a_2.png") == b"one"
+
+
+def test_archive_rejects_file_options(tmpdir):
+    # GIVEN an option writing other files
+    # THEN writing an archive fails
+    with pytest.raises(ValueError, match="atlas"):
+        chrom.plot_upd_sites(upd_sites_example, outd=str(tmpdir), atlas=True, output_format="zip")
+
+
+def _write_many(path, writer):
+    for i in range(WRITES):
+        name = "{}_{}.png".format(writer, i)
+        archive.write_images(path, "zip", {name: name.encode()})
+
+
+def test_zip_concurrent_writers(tmpdir):
+    # GIVEN two processes adding images to one zip archive at once
+    path = str(tmpdir.join("chromograph.zip"))
+    with ProcessPoolExecutor(2) as executor:
+        for future in [executor.submit(_write_many, path, writer) for writer in "ab"]:
+            future.result()
+    # THEN the archive is intact, with an index of its own for every write
+    with zipfile.ZipFile(path) as zipped:
+        assert zipped.testzip() is None
+        indexes = [name for name in zipped.namelist() if name.startswith("index/")]
+    assert len(set(indexes)) == len(indexes) == 2 * WRITES
+    # AND holds the images of both
+    assert len(archive.list_images(path)) == 2 * WRITES
+    assert archive.read_image(path, "b_7.png") == b"b_7.png"
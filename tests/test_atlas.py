@@ -0,0 +1,36 @@
+"""Pytests for Chromograph's atlas output"""
+import json
+import numpy
+from matplotlib.pyplot import imread
+import chromograph.chromograph as chrom
+from chromograph import upd_regions_example
+
+
+def test_atlas(tmpdir):
+    # GIVEN UPD regions on a few chromosomes, drawn one file per chromosome
+    single = tmpdir.mkdir("single")
+    atlas = tmpdir.mkdir("atlas")
+    singles = chrom.plot_upd_regions(upd_regions_example, outd=str(single))
+    for engine in ["matplotlib", "raster"]:
+        # WHEN drawing them to an atlas
+        outfiles = chrom.plot_upd_regions(
+            upd_regions_example, outd=str(atlas), atlas=True, engine=engine
+        )
+        # THEN one PNG and its index are written, with a slot per chromosome
+        assert outfiles == [str(atlas.join("upd_regions_atlas.png")),
+                            str(atlas.join("upd_regions_atlas.json"))]
+        with open(outfiles[1]) as filestream:
+            index = json.load(filestream)
+        assert index["image"] == "upd_regions_atlas.png"
+        assert len(index["chromosomes"]) == len(chrom.CHROMOSOMES)
+        image = imread(outfiles[0])
+        assert image.shape[:2] == (index["height"], index["width"])
+        # and every slot holds the image of its chromosome, or nothing
+        for label, slot in index["chromosomes"].items():
+            area = image[slot["y"] : slot["y"] + slot["height"], : slot["width"]]
+            outfile = str(single.join("upd_regions_{}.png".format(label)))
+            assert slot["empty"] == (outfile not in singles)
+            if slot["empty"]:
+                assert area[..., 3].max() == 0
+            elif engine == "matplotlib":
+                assert numpy.array_equal(area, imread(outfile))
@@ -0,0 +1,92 @@
+"""Pytests for Chromograph's batch manifests"""
+import logging
+import os
+import pytest
+from chromograph.batch import read_manifest, run_batch
+from chromograph.chromograph import _run_batch
+
+EXAMPLE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "example_files")
+
+
+def test_read_manifest(tmpdir):
+    # GIVEN a manifest with defaults and job options
+    manifest = tmpdir.join("manifest.yaml")
+    manifest.write(
+        "defaults: {engine: raster, step: 500}\n"
+        "jobs:\n"
+        "  - {operation: coverage, input: a.wig, outd: out, options: {step: 100}}\n"
+        "  - {operation: ideogram, input: /data/b.bed}\n"
+    )
+    # WHEN reading it
+    jobs = read_manifest(str(manifest))
+    # THEN paths are relative to the manifest and job options win over defaults
+    assert jobs[0]["input"] == str(tmpdir.join("a.wig"))
+    assert jobs[0]["outd"] == str(tmpdir.join("out"))
+    assert jobs[0]["options"] == {"engine": "raster", "step": 100}
+    assert jobs[1]["input"] == "/data/b.bed"
+    assert jobs[1]["outd"] is None
+
+
+def test_read_manifest_malformed(tmpdir):
+    # GIVEN a manifest with a job lacking an input
+    manifest = tmpdir.join("manifest.yaml")
+    manifest.write("- operation: coverage\n")
+    # THEN reading it fails
+    with pytest.raises(ValueError):
+        read_manifest(str(manifest))
+
+
+def test_run_batch_continues_after_failure(tmpdir, caplog):
+    # GIVEN a manifest where the second job fails
+    manifest = tmpdir.join("manifest.yaml")
+    tmpdir.join("a.bed").write("")
+    tmpdir.join("c.bed").write("")
+    manifest.write(
+        "- {operation: plot, input: a.bed}\n"
+        "- {operation: plot, input: missing.bed}\n"
+        "- {operation: other, input: c.bed}\n"
+    )
+    calls = []
+    operations = {"plot": lambda filepath, options: calls.append(filepath)}
+    # WHEN running the batch
+    with caplog.at_level(logging.INFO, logger="chromograph.batch"):
+        failed = run_batch(str(manifest), operations)
+    # THEN every job is tried, failures are logged as errors and summarized
+    assert failed == 2
+    assert calls == [str(tmpdir.join("a.bed"))]
+    errors = [record.getMessage() for record in caplog.records if record.levelno == logging.ERROR]
+    assert errors[0].startswith("Error: job 2") and errors[1].startswith("Error: job 3")
+    assert "plot" in caplog.messages[-2] and "other" in caplog.messages[-1]
+
+
+def test_run_batch_renders(tmpdir):
+    # GIVEN a manifest rendering ideograms and UPD regions with the raster engine
+    manifest = tmpdir.join("manifest.yaml")
+    manifest.write(
+        "defaults: {{engine: raster, euploid: true}}\n"
+        "jobs:\n"
+        "  - {{operation: ideogram, input: {0}/cytoband.bed, outd: ideo}}\n"
+        "  - {{operation: regions, input: {0}/upd_regions.bed, outd: upd}}\n".format(EXAMPLE_DIR)
+    )
+    # WHEN running it as from the command line
+    failed = _run_batch(str(manifest), {"batch": str(manifest), "jobs": None})
+    # THEN all jobs succeed and output is written to each job's directory
+    assert failed == 0
+    assert "cytoband_chr1.png" in os.listdir(str(tmpdir.join("ideo")))
+    assert "upd_regions_X.png" in os.listdir(str(tmpdir.join("upd")))
+
+
+def test_run_batch_empty_input(tmpdir, caplog):
+    # GIVEN a manifest whose first job has an empty input
+    manifest = tmpdir.join("manifest.yaml")
+    tmpdir.join("empty.bed").write("")
+    manifest.write(
+        "- {{operation: sites, input: empty.bed, outd: empty}}\n"
+        "- {{operation: ideogram, input: {}/cytoband.bed, outd: ideo}}\n".format(EXAMPLE_DIR)
+    )
+    # WHEN running it as from the command line
+    failed = _run_batch(str(manifest), {"batch": str(manifest), "engine": "raster"})
+    # THEN the empty job fails and the next one still runs
+    assert failed == 1
+    assert "NoDataError" in caplog.text
+    assert "cytoband_chr1.png" in os.listdir(str(tmpdir.join("ideo")))
@@ -0,0 +1,49 @@
+"""Pytests for Chromograph's benchmark suite"""
+import os
+from benchmarks import generate, run
+
+
+def test_generate_deterministic(tmpdir):
+    # GIVEN every input written twice with the same seed, once with another
+    for name in generate.INPUTS:
+        one = generate.generate(name, str(tmpdir.join("one")), 0.001)
+        again = generate.generate(name, str(tmpdir.join("again")), 0.001)
+        other = generate.generate(name, str(tmpdir.join("other")), 0.001, seed=1)
+        # THEN equal seeds write equal bytes, other seeds other bytes
+        with open(one, "rb") as first, open(again, "rb") as second, open(other, "rb") as third:
+            data = first.read()
+            assert data == second.read()
+            assert data != third.read()
+    # THEN record counts follow the scale
+    sites = tmpdir.join("one", "sites.bed").readlines()
+    assert len(sites) - 1 == sum(
+        generate._records("sites", 0.001, length)
+        for length in generate.CHROMOSOME_LENGTHS.values()
+    )
+
+
+def test_run_case(tmpdir):
+    # GIVEN a small synthetic UPD sites file
+    filepath = generate.generate("sites.bed", str(tmpdir), 0.001)
+    # WHEN timing its plot
+    measures = run.run_case("plot_upd_sites", filepath, str(tmpdir.join("out")), "raster")
+    # THEN throughput, peak memory and stages are measured
+    assert measures["rows"] == len(open(filepath).readlines()) - 1
+    assert measures["seconds"] > 0 and measures["rss_mb"] > 0
+    assert {"read", "transform", "render"} <= set(measures["stages"])
+    assert len(os.listdir(str(tmpdir.join("out")))) == 24
+
+
+def test_compare_baseline(tmpdir):
+    # GIVEN a baseline stored for a scale and engine
+    path = str(tmpdir.join("baseline.json"))
+    key = run.baseline_key(0.01, "raster")
+    run.update_baseline(path, key, {"sites": {"seconds": 1.0, "rss_mb": 100.0}})
+    baseline = run.read_baseline(path, key)
+    # THEN results over the tolerance are regressions, others not
+    results = {"sites": {"seconds": 1.2, "rss_mb": 140.0}}
+    assert run.compare(results, baseline, 0.25) == [
+        "sites: rss_mb 140.000 > 125.000, baseline 100.000"
+    ]
+    assert run.compare(results, baseline, 0.5) == []
+    assert run.read_baseline(path, run.baseline_key(1.0, "raster")) == {}
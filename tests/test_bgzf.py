@@ -0,0 +1,97 @@
+"""Pytests for Chromograph's gzip and BGZF input"""
+import gzip
+import os
+import struct
+import zlib
+import pytest
+import chromograph.chromograph as chrom
+from chromograph import bgzf, coverage_example, cytoband_example, upd_regions_example
+
+EOF_BLOCK = bytes.fromhex("1f8b08040000000000ff0600424302001b0003000000000000000000")
+
+
+def write_bgzf(path, data, block_size=65280):
+    """Write 'data' as BGZF blocks of 'block_size' uncompressed bytes, as bgzip"""
+    with open(path, "wb") as filestream:
+        for start in range(0, len(data), block_size):
+            block = data[start : start + block_size]
+            compressor = zlib.compressobj(6, zlib.DEFLATED, -15)
+            deflated = compressor.compress(block) + compressor.flush()
+            header = bytes.fromhex("1f8b08040000000000ff0600") + b"BC"
+            header += struct.pack("<HH", 2, len(deflated) + 25)
+            filestream.write(header + deflated + struct.pack("<II", zlib.crc32(block), len(block)))
+        filestream.write(EOF_BLOCK)
+
+
+def test_inflate_blocks(tmpdir, monkeypatch):
+    # GIVEN a BGZF file of many blocks, read in batches of a few blocks
+    data = b"".join(b"chr1\t%d\t%d\n" % (i, i * 7 % 1000) for i in range(50000))
+    path = str(tmpdir.join("data.bgz"))
+    write_bgzf(path, data, block_size=4000)
+    monkeypatch.setattr(bgzf, "BATCH_BYTES", 10000)
+    # THEN it is detected and inflated in order on several threads
+    assert bgzf.is_gzip(path) and bgzf.is_bgzf(path)
+    assert b"".join(bgzf.inflate_blocks(path, threads=3)) == data
+    assert bgzf.read_input(path, threads=3) == data
+    with bgzf.open_input(path, threads=3) as filestream:
+        assert filestream.readline() == "chr1\t0\t0\n"
+        assert filestream.read() == data.decode()[len("chr1\t0\t0\n") :]
+
+
+def test_open_input(tmpdir):
+    # GIVEN the same lines plain, gzip and BGZF compressed
+    data = b"track\n1\t2\t3\n"
+    plain, gz, bgz = (str(tmpdir.join(name)) for name in ("a.bed", "a.bed.gz", "a.bed.bgz"))
+    with open(plain, "wb") as filestream:
+        filestream.write(data)
+    with gzip.open(gz, "wb") as filestream:
+        filestream.write(data)
+    write_bgzf(bgz, data)
+    # THEN all of them read the same in text and binary mode
+    for path in (plain, gz, bgz):
+        with bgzf.open_input(path) as filestream:
+            assert filestream.readlines() == ["track\n", "1\t2\t3\n"]
+        assert bgzf.read_input(path) == data
+    assert not bgzf.is_bgzf(gz)
+
+
+def test_corrupt_block(tmpdir):
+    # GIVEN a BGZF file with a damaged checksum
+    path = str(tmpdir.join("bad.bgz"))
+    write_bgzf(path, b"1\t2\t3\n" * 100)
+    with open(path, "r+b") as filestream:
+        filestream.seek(-len(EOF_BLOCK) - 8, 2)
+        filestream.write(b"\0\0\0\0")
+    # THEN reading it fails
+    with pytest.raises(ValueError, match="corrupt BGZF block"):
+        bgzf.read_input(path)
+
+
+def _write_gzip(path, data):
+    with gzip.open(path, "wb") as filestream:
+        filestream.write(data)
+
+
+@pytest.mark.parametrize(
+    "plot, example, suffix, compress",
+    [
+        (chrom.plot_coverage_wig, coverage_example, ".bgz", write_bgzf),
+        (chrom.plot_ideogram, cytoband_example, ".gz", write_bgzf),
+        (chrom.plot_upd_regions, upd_regions_example, ".gz", _write_gzip),
+    ],
+)
+def test_plot_compressed(tmpdir, plot, example, suffix, compress):
+    # GIVEN an example input, compressed
+    with open(example, "rb") as filestream:
+        compressed = str(tmpdir.join(os.path.basename(example) + suffix))
+        compress(compressed, filestream.read())
+    # WHEN plotting it and the plain file
+    plain_files = plot(example, outd=str(tmpdir.join("plain")), engine="raster")
+    outfiles = plot(compressed, outd=str(tmpdir), engine="raster")
+    # THEN the same images are written, named as those of the plain file
+    assert [os.path.basename(path) for path in outfiles] == [
+        os.path.basename(path) for path in plain_files
+    ]
+    for plain_file, outfile in zip(plain_files, outfiles):
+        with open(plain_file, "rb") as one, open(outfile, "rb") as other:
+            assert one.read() == other.read()
@@ -0,0 +1,180 @@
+"""Pytests for Chromograph's bigWig reader"""
+import struct
+import zlib
+import numpy
+import chromograph.chromograph as chrom
+from chromograph import bigwig
+from chromograph.chr_utils import parse_track_header
+
+CHROM_SIZES = {"chr1": 20000, "chr2": 8000}
+INTERVALS = [
+    ("chr1", 0, 100, 1.0),
+    ("chr1", 100, 300, 2.5),
+    ("chr1", 1000, 1500, 4.0),
+    ("chr1", 1500, 1600, 8.0),
+    ("chr1", 15000, 16000, 3.0),
+    ("chr2", 50, 250, 6.0),
+    ("chr2", 7000, 7100, 1.5),
+]
+
+
+def _summaries(intervals, size, level):
+    """Zoom records of 'level' bases per summary, as written by UCSC tools"""
+    records = []
+    for bin_start in range(0, size, level):
+        bin_end = min(bin_start + level, size)
+        covered = [(min(end, bin_end) - max(start, bin_start), value)
+                   for start, end, value in intervals if start < bin_end and end > bin_start]
+        if covered:
+            valid = sum(width for width, _ in covered)
+            total = sum(width * value for width, value in covered)
+            squares = sum(width * value ** 2 for width, value in covered)
+            values = [value for _, value in covered]
+            records.append((bin_start, bin_end, valid, min(values), max(values), total, squares))
+    return records
+
+
+def _r_tree(order, offset, blocks, per_leaf=2):
+    """R-tree index at 'offset' of 'blocks' (start chrom, start, end chrom,
+    end, offset, size), a root node over leaves of 'per_leaf' blocks"""
+    leaves = [blocks[i : i + per_leaf] for i in range(0, len(blocks), per_leaf)]
+    root_size = 4 + 24 * len(leaves)
+    leaf_offset = offset + 48 + root_size
+    root, nodes = struct.pack(order + "BBH", 0, 0, len(leaves)), b""
+    for leaf in leaves:
+        root += struct.pack(order + "IIIIQ", *leaf[0][:2], *leaf[-1][2:4],
+                            leaf_offset + len(nodes))
+        nodes += struct.pack(order + "BBH", 1, 0, len(leaf))
+        nodes += b"".join(struct.pack(order + "IIIIQQ", *block) for block in leaf)
+    header = struct.pack(order + "IIQIIIIQII", bigwig.R_TREE_MAGIC, 256, len(blocks),
+                         *blocks[0][:2], *blocks[-1][2:4], 0, 512, 0)
+    return header + root + nodes
+
+
+def write_bigwig(path, intervals, zoom_levels=(), order="<", per_block=2, shared_zoom=False):
+    """Write a bigWig file of bedGraph sections of 'per_block' intervals,
+    zlib compressed, with zoom levels of the given bases per summary. Zoom
+    records of all chromosomes share one block per level if 'shared_zoom'."""
+    names = list(CHROM_SIZES)
+    blocks = {None: []}  # raw blocks by zoom level, None is the full data
+    for chrom_id, name in enumerate(names):
+        items = [(start, end, value) for c, start, end, value in intervals if c == name]
+        for i in range(0, len(items), per_block):
+            part = items[i : i + per_block]
+            data = struct.pack(order + bigwig.SECTION_HEADER, chrom_id, part[0][0], part[-1][1],
+                               0, 0, bigwig.BEDGRAPH, 0, len(part))
+            data += b"".join(struct.pack(order + "IIf", *item) for item in part)
+            blocks[None].append((chrom_id, part[0][0], chrom_id, part[-1][1], data))
+        for level in zoom_levels:
+            records = _summaries(items, CHROM_SIZES[name], level)
+            data = b"".join(struct.pack(order + "IIIIffff", chrom_id, *r) for r in records)
+            block = (chrom_id, records[0][0], chrom_id, records[-1][1], data)
+            level_blocks = blocks.setdefault(level, [])
+            if shared_zoom and level_blocks:
+                level_blocks[0] = level_blocks[0][:2] + block[2:4] + (level_blocks[0][4] + data,)
+            else:
+                level_blocks.append(block)
+
+    key_size = max(len(name) for name in names)
+    offset = 64 + 24 * len(zoom_levels) + 40
+    chrom_tree = struct.pack(order + "IIIIQQ", bigwig.CHROM_TREE_MAGIC, 256, key_size, 8,
+                             len(names), 0)
+    chrom_tree += struct.pack(order + "BBH", 1, 0, len(names))
+    for chrom_id, name in enumerate(names):
+        chrom_tree += name.encode().ljust(key_size, b"\0")
+        chrom_tree += struct.pack(order + "II", chrom_id, CHROM_SIZES[name])
+    body, offset = chrom_tree, offset + len(chrom_tree)
+    sections = {}  # (data offset, index offset) by zoom level
+    for level, raw_blocks in blocks.items():
+        data_offset = offset
+        data = struct.pack(order + "Q", len(raw_blocks))
+        located = []
+        for *span, raw in raw_blocks:
+            compressed = zlib.compress(raw)
+            located.append((*span, data_offset + len(data), len(compressed)))
+            data += compressed
+        index = _r_tree(order, data_offset + len(data), located)
+        sections[level] = (data_offset, data_offset + len(data))
+        body += data + index
+        offset += len(data) + len(index)
+
+    buffer_size = max(len(raw) for raw_blocks in blocks.values() for *_, raw in raw_blocks)
+    header = struct.pack(order + bigwig.HEADER, bigwig.BIGWIG_MAGIC, 4, len(zoom_levels),
+                         64 + 24 * len(zoom_levels) + 40, sections[None][0], sections[None][1],
+                         0, 0, 0, 64 + 24 * len(zoom_levels), buffer_size, 0)
+    for level in zoom_levels:
+        header += struct.pack(order + bigwig.ZOOM_HEADER, level, 0, *sections[level])
+    header += struct.pack(order + "Qdddd", 0, 0, 0, 0, 0)  # total summary, not read
+    with open(path, "wb") as filestream:
+        filestream.write(header + body)
+
+
+def test_read_full_data(tmpdir):
+    # GIVEN bigWig files without zoom levels, in both byte orders
+    for order in "<>":
+        path = str(tmpdir.join("cov{}.bw".format(order == ">")))
+        write_bigwig(path, INTERVALS, order=order)
+        # WHEN reading them
+        names, codes, starts, ends, values = bigwig.read_intervals(path)
+        # THEN all intervals are read back
+        assert names == ["chr1", "chr2"]
+        read = [(names[c], s, e, v) for c, s, e, v in zip(codes, starts, ends, values)]
+        assert read == INTERVALS
+
+
+def test_zoom_level_matches_resolution(tmpdir):
+    # GIVEN a bigWig file with summaries per 100 and per 1000 bases
+    path = str(tmpdir.join("cov.bw"))
+    write_bigwig(path, INTERVALS, zoom_levels=(100, 1000))
+    # THEN the coarsest level with a summary per pixel column is read, or
+    # the full data if pixel columns are narrower than any level
+    for column_width, level in [(50, None), (100, 100), (999, 100), (5000, 1000)]:
+        names, codes, starts, ends, values = bigwig.read_intervals(path, column_width)
+        if level is None:
+            assert len(values) == len(INTERVALS)
+            continue
+        expected = [
+            (name, record[0], record[1], record[5] / record[2])
+            for name in CHROM_SIZES
+            for record in _summaries([i[1:] for i in INTERVALS if i[0] == name],
+                                     CHROM_SIZES[name], level)
+        ]
+        assert [(names[c], s, e) for c, s, e in zip(codes, starts, ends)] == \
+            [record[:3] for record in expected]
+        assert numpy.allclose(values, [record[3] for record in expected])
+
+
+def test_plot_bigwig(tmpdir):
+    # GIVEN a bigWig file with a zoom level finer than the pixel columns
+    path = str(tmpdir.join("cov.bw"))
+    write_bigwig(path, INTERVALS, zoom_levels=(100,))
+    # THEN it is detected and plotted as coverage
+    assert parse_track_header(path) == {"format": "bigWig", "chrom": "str", "step": None}
+    outfiles = chrom.plot_coverage_wig(path, outd=str(tmpdir), engine="raster")
+    assert [str(tmpdir.join(name)) for name in ["cov_chr1.png", "cov_chr2.png"]] == outfiles
+
+
+def test_read_chromosome(tmpdir):
+    # GIVEN a bigWig file of two chromosomes
+    path = str(tmpdir.join("cov.bw"))
+    write_bigwig(path, INTERVALS)
+    # WHEN reading one of them, named without 'chr'
+    names, codes, starts, ends, values = bigwig.read_intervals(path, chrom="2")
+    # THEN only its intervals are read
+    assert names == ["chr2"]
+    read = [(names[c], s, e, v) for c, s, e, v in zip(codes, starts, ends, values)]
+    assert read == INTERVALS[-2:]
+
+
+def test_read_chromosome_of_shared_block(tmpdir):
+    # GIVEN a bigWig file whose zoom block holds summaries of both chromosomes
+    path = str(tmpdir.join("cov.bw"))
+    write_bigwig(path, INTERVALS, zoom_levels=(1000,), shared_zoom=True)
+    # WHEN reading either chromosome from it
+    for name in CHROM_SIZES:
+        names, codes, starts, ends, _ = bigwig.read_intervals(path, 1000, chrom=name)
+        # THEN only summaries of that chromosome are read
+        intervals = [i[1:] for i in INTERVALS if i[0] == name]
+        expected = [record[:2] for record in _summaries(intervals, CHROM_SIZES[name], 1000)]
+        assert names == [name] and list(codes) == [0] * len(expected)
+        assert list(zip(starts, ends)) == expected
@@ -0,0 +1,72 @@
+"""Pytests for Chromograph's cache of parsed input"""
+import os
+import pandas as pd
+from chromograph.cache import cached_dataframe, clear_cache, load_dataframe
+
+
+def _reader(calls):
+    def read():
+        calls.append(1)
+        return pd.DataFrame({"chrom": ["1", "2", None], "start": [1, 2, 3]}, index=[0, 2, 5])
+    return read
+
+
+def test_cached_dataframe(tmpdir):
+    # GIVEN an input file and an empty cache directory
+    infile = tmpdir.join("test.bed")
+    infile.write("1\t1\t2\n")
+    cache_dir = str(tmpdir.join("cache"))
+    calls = []
+    # WHEN reading the file twice
+    first = cached_dataframe(cache_dir, str(infile), _reader(calls), "bed")
+    second = cached_dataframe(cache_dir, str(infile), _reader(calls), "bed")
+    # THEN the reader is only called once and the cached frame is identical
+    assert len(calls) == 1
+    pd.testing.assert_frame_equal(first, second)
+
+
+def test_cache_invalidated_on_change(tmpdir):
+    # GIVEN a cached input file
+    infile = tmpdir.join("test.bed")
+    infile.write("1\t1\t2\n")
+    cache_dir = str(tmpdir.join("cache"))
+    cached_dataframe(cache_dir, str(infile), _reader([]), "bed")
+    # WHEN the file changes
+    infile.write("1\t1\t2\n2\t1\t2\n")
+    # THEN the entry is not used and it is replaced when caching again
+    assert load_dataframe(cache_dir, str(infile), "bed") is None
+    cached_dataframe(cache_dir, str(infile), _reader([]), "bed")
+    assert len(os.listdir(cache_dir)) == 1
+    clear_cache(cache_dir, str(infile))
+    assert os.listdir(cache_dir) == []
+
+
+def test_cache_bypassed(tmpdir):
+    # GIVEN no cache directory
+    infile = tmpdir.join("test.bed")
+    infile.write("1\t1\t2\n")
+    calls = []
+    # THEN the reader is called every time
+    cached_dataframe(None, str(infile), _reader(calls), "bed")
+    cached_dataframe(None, str(infile), _reader(calls), "bed")
+    assert len(calls) == 2
+
+
+def test_cached_categorical(tmpdir):
+    # GIVEN a track with categorical chromosomes and colors and 32 bit columns
+    infile = tmpdir.join("test.bed")
+    infile.write("1\t1\t2\n")
+    cache_dir = str(tmpdir.join("cache"))
+    frame = pd.DataFrame(
+        {
+            "chrom": pd.Categorical(["2", "1", "2"], categories=["1", "2", "X"], ordered=True),
+            "start": pd.array([1, 2, 3], dtype="int32"),
+            "colors": pd.Categorical(["#aa2200", "#0044ff", "#aa2200"]),
+            "value": pd.array([0.5, 1, 2], dtype="float32"),
+        }
+    )
+    # WHEN caching and reading it back
+    cached_dataframe(cache_dir, str(infile), lambda: frame, "bed")
+    cached = load_dataframe(cache_dir, str(infile), "bed")
+    # THEN dtypes and categories are kept
+    pd.testing.assert_frame_equal(cached, frame)
@@ -1,14 +1,23 @@
 """Pytests for Chromograph """
+import io
 import os
 import unittest.mock as mock
 from unittest.mock import mock_open
+import numpy
 import pandas as pd
-from chromograph.chr_utils import (chr_type_format, cast, filter_dataframe,
-                                   png_filename, outpath, parse_wig_declaration,
-                                   make_dict)
+import pytest
+from PIL import Image
+import chromograph.chromograph as chrom
+from chromograph.chr_utils import (chr_type_format, cast, decimate_area, decimate_bars,
+                                   factorize_lines, filter_dataframe, png_filename, outpath,
+                                   parse_track_header, parse_wig_declaration, make_dict)
+from chromograph.raster import area_coverage
 
 
 
+DECIMATED_ALPHA_DELTA = 1  # of 255 levels
+AGG_ALPHA_DELTA = 8
+
 WIG_HEAD="""123
 312312
 12321
@@ -80,3 +89,106 @@ def test_parse_wig_declaration(mock_file):
 
 # TODO: add test to catch warning('declarationNotFound') when declaration
 # is missing, test_parse_wig_declaration_warn()
+
+
+def test_parse_track_header(tmpdir):
+    # GIVEN coverage tracks on fixedStep, variableStep and bedGraph format
+    tracks = {
+        "fixedStep": "track type=wiggle_0\nfixedStep chrom=1 start=1 step=10000\n1\n",
+        "variableStep": "track type=wiggle_0\nvariableStep chrom=chr1 span=25\n101 1\n",
+        "bedGraph": "track type=bedGraph\n#comment\nchr1\t100\t125\t1.5\n",
+    }
+    for track_format, text in tracks.items():
+        track = tmpdir.join(track_format)
+        track.write(text)
+        # THEN the format and chromosome naming are detected
+        header = parse_track_header(str(track))
+        assert header["format"] == track_format
+        assert header["chrom"] == ("int" if track_format == "fixedStep" else "str")
+    assert parse_track_header(str(tmpdir.join("fixedStep")))["step"] == 10000
+
+
+def test_factorize_lines():
+    # GIVEN lines where some are repeated, one is longer than a hashed word
+    # and the last one lacks a newline
+    data = b"1.5\nNaN\n1.5\nfixedStep chrom=chr1 start=1 step=10\n\nNaN"
+    # THEN identical lines share the same code
+    starts, ends, codes, first_lines = factorize_lines(data)
+    lines = [data[start:end] for start, end in zip(starts, ends)]
+    assert lines == [b"1.5", b"NaN", b"1.5", b"fixedStep chrom=chr1 start=1 step=10", b"", b"NaN"]
+    assert len(set(codes)) == 4
+    assert codes[0] == codes[2] and codes[1] == codes[5]
+    # AND every code points at the first line holding it
+    assert list(first_lines[codes]) == [0, 1, 0, 3, 4, 1]
+
+
+def test_decimate_area():
+    # GIVEN a zigzag of 40 points per pixel column over 10 columns, two rows high
+    x = numpy.arange(401) / 4
+    y = numpy.where(numpy.arange(401) % 2, 3.0, 1.0)
+    # THEN every column is reduced to a falling staircase
+    dec_x, dec_y = decimate_area(x, y, 10, 1.5, 3)
+    assert len(dec_x) < len(x) / 2
+    assert (numpy.diff(dec_x) >= 0).all()
+    assert dec_x[0] == 0 and dec_x[-1] == 100
+    # AND every pixel is covered as much as before
+    before = area_coverage(x / 10, y / 1.5, 10, 2)
+    after = area_coverage(dec_x / 10, dec_y / 1.5, 10, 2)
+    assert numpy.abs(after - before).max() < 1e-9
+    # AND so is the area below the line
+    area = lambda x, y: ((y[1:] + y[:-1]) / 2 * numpy.diff(x)).sum()
+    assert area(dec_x, dec_y) == pytest.approx(area(x, y))
+
+
+def test_decimate_area_sparse():
+    # GIVEN fewer points than pixel columns
+    x, y = [0, 15, 30], [1, 2, 1]
+    # THEN points are returned as they are
+    dec_x, dec_y = decimate_area(x, y, 10, 1, 2)
+    assert list(dec_x) == x and list(dec_y) == y
+
+
+@pytest.mark.parametrize("size", ["small", "medium"])
+def test_decimated_area_looks_the_same(tmpdir, monkeypatch, size):
+    # GIVEN a coverage track of many points per pixel column
+    values = 30 + 20 * numpy.sin(numpy.arange(124500) / 2500)
+    values += numpy.random.default_rng(1).normal(0, 1, len(values))
+    wig = tmpdir.join("cov.wig")
+    wig.write("fixedStep chrom=chr1 start=1 step=2000\n" +
+              "".join("{:.1f}\n".format(value) for value in numpy.clip(values, 0, 70)))
+    alpha = lambda engine: numpy.asarray(Image.open(io.BytesIO(
+        chrom.render_coverage_wig(str(wig), engine=engine, **{size: True})["chr1"]
+    )).convert("RGBA"))[..., 3].astype(int)
+    # WHEN drawing it at 100 and 300 DPI with Matplotlib, with its points
+    # reduced and with all of them, and with the raster engine
+    reduced = []
+    decimate = chrom.decimate_area
+
+    def recorded(x, y, *args):
+        dec_x, dec_y = decimate(x, y, *args)
+        reduced.append(len(dec_x) < len(x) / 2)
+        return dec_x, dec_y
+
+    monkeypatch.setattr(chrom, "decimate_area", recorded)
+    decimated = alpha("matplotlib")
+    exact = alpha("raster")  # covers every pixel exactly from all points
+    monkeypatch.setattr(chrom, "decimate_area", lambda x, y, *args: (x, y))
+    full = alpha("matplotlib")
+    # THEN points are reduced and no pixel differs by more than a level of alpha from exact
+    assert reduced == [True]
+    assert numpy.abs(decimated - exact).max() <= DECIMATED_ALPHA_DELTA
+    # AND Matplotlib's drawing of all points is that close but for Agg
+    # storing vertices in 1/256 of a pixel
+    assert numpy.abs(decimated - full).max() <= AGG_ALPHA_DELTA
+
+
+def test_decimate_bars():
+    # GIVEN overlapping bars, three columns wide, centered on x, one hidden
+    x = [15, 25, 35, 25, 95]
+    heights = [1, 3, 2, 0.5, 1]
+    widths = [30, 30, 30, 30, 30]
+    # THEN bars are merged into the highest bar covering every column
+    dec_x, dec_heights, dec_widths = decimate_bars(x, heights, widths, 10)
+    assert list(dec_heights) == [1, 3, 2, 1]
+    assert list(dec_x - dec_widths / 2) == [0, 10, 40, 80]
+    assert list(dec_x + dec_widths / 2) == [10, 40, 50, 110]
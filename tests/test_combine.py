@@ -0,0 +1,31 @@
+"""Pytests for Chromograph's genome-wide combined images"""
+from matplotlib.pyplot import imread
+import chromograph.chromograph as chrom
+from chromograph import cytoband_example
+
+
+def test_combined_coverage(tmpdir):
+    # GIVEN a wig file with two chromosomes
+    wig = tmpdir.join("cov.wig")
+    wig.write("fixedStep chrom=chr1 start=1 step=5000\n" + "10\n" * 4000 +
+              "fixedStep chrom=chr2 start=1 step=5000\n" + "40\n" * 2000)
+    # WHEN plotting them combined
+    outfiles = chrom.plot_coverage_wig(str(wig), "combine", outd=str(tmpdir), engine="raster")
+    # THEN one image shows chr1 and then chr2, in proportion to their lengths
+    assert outfiles == [str(tmpdir.join("cov_combined.png"))]
+    alpha = imread(outfiles[0])[..., 3]
+    columns = alpha.shape[1]
+    assert alpha[:, : columns * 2 // 3 - 2].sum(axis=0).std() < 1e-6
+    assert alpha[:, columns * 2 // 3 + 2 :].sum(axis=0).mean() > 3 * alpha[:, 0].sum()
+
+
+def test_combined_ideogram(tmpdir):
+    # GIVEN a cytoband bed file
+    # WHEN plotting it combined, as a flag given to the library function
+    outfiles = chrom.plot_ideogram(cytoband_example, "combine", outd=str(tmpdir))
+    # THEN one image of all chromosomes is written
+    assert outfiles == [str(tmpdir.join("cytoband_combined.png"))]
+    assert imread(outfiles[0])[..., 3].max() > 0
+    # AND it is rendered in memory the same way
+    images = chrom.render_ideogram(cytoband_example, combine=True)
+    assert images == {"combined": tmpdir.join("cytoband_combined.png").read_binary()}
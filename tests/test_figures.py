@@ -0,0 +1,21 @@
+"""Pytests for Chromograph's reuse of figures across chromosomes"""
+import chromograph.chromograph as chrom
+
+
+def test_reused_figures_identical(tmpdir):
+    # GIVEN a long and a short chromosome, and the short one on its own
+    both = tmpdir.mkdir("both").join("cov.wig")
+    both.write("fixedStep chrom=chr1 start=1 step=5000\n" +
+               "".join("{}\n".format(i % 70) for i in range(9000)) +
+               "fixedStep chrom=chr2 start=1 step=5000\n" +
+               "".join("{}\n".format(i % 20) for i in range(500)))
+    alone = tmpdir.mkdir("alone").join("cov.wig")
+    alone.write("fixedStep chrom=chr2 start=1 step=5000\n" +
+                "".join("{}\n".format(i % 20) for i in range(500)))
+    # WHEN chr2 is drawn after chr1 on the same figure, and on a new figure
+    chrom.plot_coverage_wig(str(both))
+    chrom._FIGURES.clear()
+    chrom.plot_coverage_wig(str(alone))
+    # THEN nothing of chr1 is left in the image of chr2
+    assert tmpdir.join("both", "cov_chr2.png").read_binary() == \
+        tmpdir.join("alone", "cov_chr2.png").read_binary()
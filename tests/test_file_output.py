@@ -54,10 +54,3 @@ def test_upd_sites():
     with open("tests/example_files/upd_sites_1.png", "rb") as f:
         assert f.read() # read file as bytes
         f.close()
-
-    
-
-
-    
-
-    
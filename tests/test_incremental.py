@@ -0,0 +1,29 @@
+"""Pytests for Chromograph's incremental rendering"""
+import os
+import chromograph.chromograph as chrom
+from chromograph import cytoband_example
+
+
+def test_incremental(tmpdir):
+    # GIVEN ideograms rendered incrementally
+    outd = tmpdir.mkdir("out")
+    bed = tmpdir.join("cytoband.bed")
+    bed.write_binary(open(cytoband_example, "rb").read())
+    outfiles = chrom.plot_ideogram(str(bed), outd=str(outd), incremental=True)
+    assert outd.join("cytoband.bed.chromograph.json").check()
+    mtime = os.path.getmtime(outfiles[0])
+    # WHEN rendering again with unchanged input and settings
+    # THEN nothing is rendered and the same files are returned
+    assert chrom.plot_ideogram(str(bed), outd=str(outd), incremental=True, jobs=2) == outfiles
+    assert os.path.getmtime(outfiles[0]) == mtime
+    # WHEN the input, the outputs or the settings change
+    # THEN the images are rendered again
+    for change in ["input", "output", "settings"]:
+        os.utime(outfiles[0], (0, 0))
+        if change == "input":
+            bed.write("chr1\t0\t2300000\tp36.33\tgpos25\n", mode="a")
+        if change == "output":
+            os.remove(outfiles[0])
+        small = change == "settings"
+        chrom.plot_ideogram(str(bed), outd=str(outd), incremental=True, small=small)
+        assert os.path.getmtime(outfiles[0]) != 0
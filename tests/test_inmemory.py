@@ -0,0 +1,59 @@
+"""Pytests for Chromograph's in-memory rendering"""
+import os
+import pandas
+import pytest
+import chromograph.chromograph as chrom
+from chromograph import coverage_example, upd_regions_example, upd_sites_example
+
+
+@pytest.mark.parametrize("engine", ["matplotlib", "raster"])
+def test_render_same_as_files(tmpdir, engine):
+    # GIVEN UPD sites plotted to files
+    outfiles = chrom.plot_upd_sites(upd_sites_example, outd=str(tmpdir), engine=engine)
+    # WHEN rendering them in memory from an open file
+    with open(upd_sites_example, "rb") as filestream:
+        images = chrom.render_upd_sites(filestream, engine=engine, euploid=True)
+    # THEN the images are the bytes of the files, with placeholders for other chromosomes
+    with open(outfiles[0], "rb") as filestream:
+        assert images["1"] == filestream.read()
+    assert len(images) == len(chrom.CHROMOSOMES)
+    assert images["Y"] == chrom.TRANSPARENT_PNG
+    assert len(tmpdir.listdir()) == 1
+
+
+def test_render_sources(tmpdir):
+    # GIVEN coverage as a path, as bytes and as a table of bedGraph columns
+    with open(coverage_example, "rb") as filestream:
+        data = filestream.read()
+    table = {
+        "chrom": ["chr1", "chr1", "chr2"],
+        "start": [0, 1000000, 0],
+        "end": [1000000, 5000000, 3000000],
+        "value": [10.0, 30.0, 5.0],
+    }
+    # THEN all of them render without writing files
+    from_path = chrom.render_coverage_wig(coverage_example, engine="raster", outd=str(tmpdir))
+    assert chrom.render_coverage_wig(data, engine="raster") == from_path
+    assert list(chrom.render_coverage_wig(table, engine="raster")) == ["chr1", "chr2"]
+    assert list(chrom.render_coverage_wig(data, "combine", engine="raster")) == ["combined"]
+    assert tmpdir.listdir() == []
+    # THEN UPD regions are read from a table without a header line
+    regions = pandas.read_csv(upd_regions_example, sep="\t", header=None)
+    assert list(chrom.render_upd_regions(regions, engine="raster")) == ["12"]
+
+
+def test_render_rejects_file_options():
+    # GIVEN options that write files besides the images
+    # THEN rendering in memory fails
+    with pytest.raises(ValueError, match="atlas"):
+        chrom.render_upd_sites(upd_sites_example, atlas=True)
+    with pytest.raises(ValueError, match="incremental"):
+        chrom.render_upd_sites(upd_sites_example, incremental=True)
+    assert not os.path.exists(upd_sites_example + ".chromograph.json")
+
+
+def test_render_empty_input():
+    # GIVEN input without any rows
+    # THEN rendering it raises an error naming what was given, not the file it was put in
+    with pytest.raises(chrom.NoDataError, match="<bytes>"):
+        chrom.render_upd_sites(b"")
@@ -0,0 +1,18 @@
+"""Pytests for Chromograph's rendering in a pool of processes"""
+import chromograph.chromograph as chrom
+
+
+def test_parallel_rendering_identical(tmpdir):
+    # GIVEN a wig file with several chromosomes
+    wig = tmpdir.join("multi.wig")
+    wig.write("".join("fixedStep chrom=chr{} start=1 step=5000\n".format(name) +
+                      "".join("{}\n".format(i % 40) for i in range(2000)) for name in ["1", "2", "3"]))
+    serial = tmpdir.join("serial")
+    parallel = tmpdir.join("parallel")
+    # WHEN rendering in one process and in a pool of processes
+    chrom.plot_coverage_wig(str(wig), outd=str(serial))
+    chrom.plot_coverage_wig(str(wig), outd=str(parallel), jobs=2)
+    # THEN output files are byte identical
+    for name in ["chr1", "chr2", "chr3"]:
+        filename = "multi_{}.png".format(name)
+        assert serial.join(filename).read_binary() == parallel.join(filename).read_binary()
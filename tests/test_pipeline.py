@@ -0,0 +1,62 @@
+"""Pytests for Chromograph's pipelined writing"""
+import threading
+import pytest
+import chromograph.chromograph as chrom
+from chromograph import pipeline, timing, upd_sites_example
+
+
+def test_write_bounded(tmpdir):
+    # GIVEN a writer of one thread with room for two images, encoding slowly
+    release = threading.Event()
+    submitted = []
+
+    def encode():
+        release.wait(5)
+        return b"png"
+
+    def submit_all():
+        with pipeline.writing(threads=1):
+            for number in range(4):
+                pipeline.write(str(tmpdir.join("{}.png".format(number))), encode)
+                submitted.append(number)
+
+    # WHEN writing four images
+    thread = threading.Thread(target=submit_all)
+    thread.start()
+    thread.join(0.2)
+    # THEN the third waits until the first is written
+    assert submitted == [0, 1]
+    release.set()
+    thread.join(5)
+    assert submitted == [0, 1, 2, 3]
+    assert sorted(path.basename for path in tmpdir.listdir()) == [
+        "{}.png".format(number) for number in range(4)
+    ]
+
+
+def test_write_errors_raised(tmpdir):
+    # GIVEN writes of which one fails
+    def encode():
+        raise ValueError("broken image")
+
+    # THEN the error is raised when leaving the block, after the other writes are done
+    with pytest.raises(ValueError, match="broken image"):
+        with pipeline.writing():
+            pipeline.write(str(tmpdir.join("good.png")), b"png")
+            pipeline.write(str(tmpdir.join("bad.png")), encode)
+    assert tmpdir.join("good.png").read_binary() == b"png"
+    with pytest.raises(FileNotFoundError):
+        with pipeline.writing():
+            pipeline.write(str(tmpdir.join("missing", "a.png")), b"png")
+
+
+def test_plot_pipelined(tmpdir):
+    # GIVEN UPD sites drawn with the raster engine, recording stages
+    with timing.recording() as stages:
+        outfiles = chrom.plot_upd_sites(upd_sites_example, outd=str(tmpdir), engine="raster")
+    # THEN the image is encoded and written on a writer thread, outside its render stage
+    assert tmpdir.join("upd_sites_1.png").read_binary().startswith(b"\x89PNG")
+    assert outfiles == [str(tmpdir.join("upd_sites_1.png"))]
+    by_stage = {record["stage"]: record for record in stages}
+    assert by_stage["encode"]["chrom"] == by_stage["write"]["chrom"] == "1"
+    assert by_stage["write"]["operation"] == "sites"
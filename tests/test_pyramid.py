@@ -0,0 +1,82 @@
+"""Pytests for Chromograph's track pyramids"""
+import numpy
+import pytest
+import chromograph.chromograph as chrom
+from chromograph import coverage_example, pyramid
+from chromograph.chr_utils import parse_track_header
+
+EXOM_LINES = [
+    "1\t10000\t10200\t.\t.\t.\t.\t100\t30.0\t1\t1\t1\t1\t1\tS1",
+    "1\t10300\t10500\t.\t.\t.\t.\t100\t10.0\t1\t1\t1\t1\t1\tS1",
+    "1\t5000000\t5000200\t.\t.\t.\t.\t100\t50.0\t1\t1\t1\t1\t1\tS1",
+    "2\t300000\t300400\t.\t.\t.\t.\t100\t20.0\t1\t1\t1\t1\t1\tS1",
+]
+
+
+def test_summaries():
+    # GIVEN a polyline rising from 0 to 4 over 0..1024, then falling to 0 at 2048
+    x, y = numpy.array([0, 1024, 2048]), numpy.array([0.0, 4.0, 0.0])
+    # WHEN summarized in bins of 512 and coarsened
+    summaries = pyramid.summarize_area(x, y, 512, 2048)
+    levels = pyramid.build_levels(summaries, 512)
+    # THEN every bin holds its exact min, max and mean
+    assert summaries.tolist() == [[0, 2, 1], [2, 4, 3], [2, 4, 3], [0, 2, 1]]
+    assert [(bin_size, len(level)) for bin_size, level in levels] == [
+        (512, 4),
+        (1024, 2),
+        (2048, 1),
+    ]
+    assert levels[-1][1].tolist() == [[0, 4, 2]]
+    # THEN the profile drawn of every bin keeps its extremes and area
+    profile_x, profile_y = (part.reshape(-1, 3) for part in pyramid.profile(summaries, 512))
+    assert profile_y.max(axis=1).tolist() == [2, 4, 4, 2]
+    areas = (numpy.diff(profile_x) * (profile_y[:, 1:] + profile_y[:, :-1]) / 2).sum(axis=1) / 512
+    assert numpy.allclose(areas, summaries[:, pyramid.MEAN])
+
+
+def test_index_coverage(tmpdir):
+    # GIVEN a track pyramid of a WIG file
+    outfile = chrom.index_track(coverage_example, str(tmpdir.join("coverage.pyramid")))
+    header = pyramid.read_header(outfile)
+    # THEN every chromosome has power-of-two levels up to one bin, aligned
+    for chromosome in header["chromosomes"]:
+        bins = [level["bin"] for level in chromosome["levels"]]
+        assert bins == [bins[0] * 2 ** i for i in range(len(bins))]
+        assert chromosome["levels"][-1]["bins"] == 1
+        assert all(level["offset"] % pyramid.ALIGNMENT == 0 for level in chromosome["levels"])
+    # THEN it is detected and plotted as the WIG file would be
+    assert parse_track_header(outfile)["format"] == "pyramid"
+    outfiles = chrom.plot_coverage_wig(outfile, outd=str(tmpdir), engine="raster")
+    assert str(tmpdir.join("coverage_chr1.png")) in outfiles
+
+
+def test_level_matches_resolution():
+    # GIVEN levels of 256 to 4096 bases per bin
+    levels = [{"bin": 256 * 2 ** i} for i in range(5)]
+    # THEN the coarsest level with BINS_PER_COLUMN bins per pixel column is
+    # picked, or the finest if the columns are narrower
+    for column_width, bin_size in [(None, 256), (100, 256), (1024, 256), (5000, 1024)]:
+        assert pyramid.pick_level(levels, column_width)["bin"] == bin_size
+
+
+def test_index_exom(tmpdir):
+    # GIVEN a track pyramid of exom coverage
+    bed = tmpdir.join("exom.bed")
+    bed.write("\n".join(["#chrom\tstart\tend"] + EXOM_LINES) + "\n")
+    outfile = chrom.index_track(str(bed), exom=True)
+    # THEN the bars are as high as the highest bar over them
+    bars = chrom._exom_bars(str(bed))
+    names, codes, starts, ends, heights = pyramid.read_intervals(outfile)
+    assert names == ["1", "2"]
+    assert numpy.isclose(heights.max(), bars["bar_height"].max())
+    # THEN it is plotted as exom coverage
+    outfiles = chrom.plot_exom_coverage(outfile, outd=str(tmpdir), engine="raster")
+    assert outfiles == [str(tmpdir.join("exom_1.png")), str(tmpdir.join("exom_2.png"))]
+
+
+def test_bed_operations_reject_pyramid(tmpdir):
+    # GIVEN a track pyramid
+    outfile = chrom.index_track(coverage_example, str(tmpdir.join("coverage.pyramid")))
+    # THEN operations reading BED records refuse it
+    with pytest.raises(ValueError, match="track pyramid"):
+        chrom.plot_ideogram(outfile, outd=str(tmpdir))
@@ -0,0 +1,145 @@
+"""Pytests for Chromograph's raster engine"""
+import io
+import struct
+import zlib
+import numpy
+import pytest
+from PIL import Image
+from matplotlib.pyplot import imread
+import chromograph.chromograph as chrom
+from chromograph import upd_regions_example, upd_sites_example
+from chromograph.raster import (
+    FILTERS,
+    encode_png,
+    fill_area,
+    fill_rectangles,
+    new_image,
+    png_options,
+    quantize,
+)
+
+
+def _decode_png(data):
+    """Return RGBA pixels of a PNG written by encode_png"""
+    assert data[:8] == b"\x89PNG\r\n\x1a\n"
+    chunks, pos = {}, 8
+    while pos < len(data):
+        length, kind = struct.unpack(">I4s", data[pos : pos + 8])
+        chunk = data[pos + 4 : pos + 8 + length]
+        assert struct.unpack(">I", data[pos + 8 + length : pos + 12 + length])[0] == zlib.crc32(chunk)
+        chunks[kind] = chunk[4:]
+        pos += 12 + length
+    width, height = struct.unpack(">II", chunks[b"IHDR"][:8])
+    rows = numpy.frombuffer(zlib.decompress(chunks[b"IDAT"]), dtype=numpy.uint8)
+    rows = rows.reshape(height, width * 4 + 1)
+    assert (rows[:, 0] == 2).all()  # filter 'Up'
+    pixels = numpy.cumsum(rows[:, 1:], axis=0, dtype=numpy.uint8)
+    return pixels.reshape(height, width, 4), chunks
+
+
+def test_encode_png():
+    # GIVEN an image with a few rectangles
+    image = new_image(7, 3)
+    fill_rectangles(image, [0, 2.4], [1, 6.6], [0, 1], [3, 2], ["#000000", "#DB6400"])
+    # WHEN encoding it as PNG
+    pixels, chunks = _decode_png(encode_png(image, dpi=300))
+    # THEN the pixels read back are the same and dpi is given in pixels per meter
+    assert (pixels == image).all()
+    assert struct.unpack(">IIB", chunks[b"pHYs"]) == (11811, 11811, 1)
+
+
+def test_fill_rectangles_snap_to_pixels():
+    # GIVEN a transparent image
+    image = new_image(6, 2)
+    # WHEN filling a rectangle with edges between pixels
+    fill_rectangles(image, 1.4, 4.6, 0, 1.2, "#DB6400")
+    # THEN whole pixels are painted, nearest the edges, counting rows from the bottom
+    assert image[..., 3].tolist() == [[0, 0, 0, 0, 0, 0], [0, 255, 255, 255, 255, 0]]
+    assert image[1, 1].tolist() == [219, 100, 0, 255]
+    assert image[0, 0].tolist() == [255, 255, 255, 0]
+
+
+def test_fill_area_exact_coverage():
+    # GIVEN a polyline rising from 0.5 to 2 over the first pixel column, then flat
+    image = new_image(3, 3)
+    # WHEN filling the area below it
+    fill_area(image, [0, 1, 3], [0.5, 2, 2], "#DB6400")
+    # THEN every pixel gets alpha of the exact area covered
+    alpha = image[::-1, :, 3] / 255  # rows from the bottom
+    numpy.testing.assert_allclose(alpha[:, 0], [11 / 12, 1 / 3, 0], atol=0.5 / 255)
+    numpy.testing.assert_allclose(alpha[:, 1:], [[1, 1], [1, 1], [0, 0]], atol=0.5 / 255)
+
+
+@pytest.mark.parametrize("png_filter", list(FILTERS))
+def test_encode_png_palette(png_filter):
+    # GIVEN an image of two colors, one of them anti-aliased
+    image = new_image(13, 4)
+    fill_rectangles(image, [0, 9], [4, 13], 0, 4, "#0044ff")
+    fill_area(image, [4, 9], [0, 3], "#DB6400")
+    # WHEN encoding it with a palette
+    data = encode_png(image, png=png_options(["#DB6400"], 9, png_filter))
+    # THEN it is stored indexed, as few bits per pixel as fit the colors, and reads back the same
+    decoded = Image.open(io.BytesIO(data))
+    assert decoded.mode == "P"
+    assert (numpy.asarray(decoded.convert("RGBA")) == image).all()
+    colors = len(numpy.unique(image.reshape(-1, 4), axis=0))
+    assert 2 ** (data[24] // 2) < colors <= 2 ** data[24]  # bit depth of IHDR
+    two_colors = new_image(13, 4)
+    fill_rectangles(two_colors, 0, 4, 0, 4, "#0044ff")
+    assert encode_png(two_colors, png=png_options(["#0044ff"]))[24] == 1
+
+
+def test_quantize():
+    # GIVEN more colors than fit in a palette, shades of two colors
+    colors = numpy.array(
+        [[250, 100, 0, alpha] for alpha in range(256)]
+        + [[0, 60, 250, 255], [255, 255, 255, 0]],
+        dtype=numpy.uint8,
+    ).view(numpy.uint32).ravel()
+    # WHEN quantizing them to a palette of the two
+    quantized = quantize(colors, ["#DB6400", "#0044ff"]).view(numpy.uint8).reshape(-1, 4)
+    # THEN colors are the nearest of the palette, alpha rounded and transparent as background
+    assert len(numpy.unique(quantized, axis=0)) <= 256
+    assert quantized[255].tolist() == [219, 100, 0, 255]
+    assert quantized[-2].tolist() == [0, 68, 255, 255]
+    assert quantized[0].tolist() == quantized[-1].tolist() == [255, 255, 255, 0]
+    assert abs(int(quantized[100, 3]) - 100) <= 255 / 127 / 2 + 1
+
+
+@pytest.mark.parametrize("engine", ["matplotlib", "raster"])
+def test_plot_palette(tmpdir, engine):
+    # GIVEN UPD sites plotted as RGBA PNG
+    rgba = chrom.render_upd_sites(upd_sites_example, engine=engine)["1"]
+    # WHEN plotting them with a palette
+    outd = str(tmpdir)
+    outfiles = chrom.plot_upd_sites(upd_sites_example, outd=outd, engine=engine, palette=True)
+    # THEN the file is smaller and has the same pixels
+    with open(outfiles[0], "rb") as filestream:
+        indexed = filestream.read()
+    assert len(indexed) < len(rgba) / 2
+    pixels = [Image.open(io.BytesIO(data)).convert("RGBA") for data in (rgba, indexed)]
+    assert (numpy.asarray(pixels[0]) == numpy.asarray(pixels[1])).all()
+    with pytest.raises(ValueError, match="level"):
+        chrom.plot_upd_sites(upd_sites_example, outd=outd, png_level=10)
+
+
+def test_raster_engine_matches_matplotlib(tmpdir):
+    # GIVEN a coverage wig file and a bed file of UPD regions
+    wig = tmpdir.join("cov.wig")
+    wig.write("fixedStep chrom=chr1 start=1 step=50000\n" +
+              "".join("{}\n".format((i * 7) % 60) for i in range(4000)))
+    mpl = tmpdir.join("matplotlib")
+    raster = tmpdir.join("raster")
+    # WHEN drawing them with Matplotlib and with the raster engine
+    for outd, engine in [(mpl, "matplotlib"), (raster, "raster")]:
+        chrom.plot_coverage_wig(str(wig), outd=str(outd), engine=engine)
+        chrom.plot_upd_regions(upd_regions_example, outd=str(outd), engine=engine)
+    # THEN images are the same size, filled areas differ by at most a
+    # few levels of alpha and bars are identical
+    for filename, tolerance in [("cov_chr1.png", 4), ("upd_regions_12.png", 0)]:
+        expected = imread(str(mpl.join(filename)))
+        image = imread(str(raster.join(filename)))
+        assert image.shape == expected.shape
+        assert numpy.abs(image[..., 3] - expected[..., 3]).max() * 255 <= tolerance + 0.5
+        painted = expected[..., 3] > 0
+        assert numpy.abs(image[painted, :3] - expected[painted, :3]).max() * 255 < 0.5
@@ -0,0 +1,24 @@
+"""Pytests for Chromograph's chunked BED reader"""
+import numpy
+import chromograph.chromograph as chrom
+
+
+def test_read_dataframe_chunked(tmpdir):
+    # GIVEN a bed file of UPD sites, one on a contig not drawn
+    bed = tmpdir.join("sites.bed")
+    bed.write("#chrom\tstart\tend\tupdType\n" +
+              "".join("chr{}\t{}\t{}\tPATERNAL\n".format(c, i, i + 1)
+                      for c in ["1", "Un", "2"] for i in range(0, 300, 3)))
+    # WHEN reading it whole and a few rows at a time
+    whole = chrom._read_dataframe(str(bed), chrom.UPD_FORMAT, derive=chrom._upd_site_bars)
+    chunked = chrom._read_dataframe(str(bed), chrom.UPD_FORMAT, derive=chrom._upd_site_bars,
+                                    memory=0.001)
+    # THEN both hold the same bars, of drawn chromosomes only
+    assert chrom._chunk_rows(chrom.UPD_FORMAT, 0.001) < 10
+    assert chunked.equals(whole)
+    assert list(chunked.columns) == ["chrom", "start", "width", "colors"]
+    assert set(chunked.chrom) == {"chr1", "chr2"}
+    assert list(chunked.chrom.cat.categories) == ["chr" + c for c in chrom.CHROMOSOMES]
+    assert chunked.start.dtype == chunked.width.dtype == numpy.int32
+    assert list(chunked.colors.cat.categories) == list(dict.fromkeys(chrom.get_color.values()))
+    assert (chunked.width == 1 + chrom.PADDING).all()
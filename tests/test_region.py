@@ -0,0 +1,167 @@
+"""Pytests for Chromograph's region-scoped rendering"""
+import os
+import struct
+import numpy
+import pytest
+import chromograph.chromograph as chrom
+from chromograph import bgzf, coverage_example, region, upd_sites_example
+from matplotlib.pyplot import imread
+from test_bgzf import write_bgzf
+
+SITES = [
+    ("1", 1000, 5000, "ANTI_UPD"),
+    ("1", 40000, 90000, "PB_HETEROZYGOUS"),
+    ("2", 1000, 2000000, "ANTI_UPD"),
+    ("2", 30000000, 30500000, "PB_HETEROZYGOUS"),
+    ("3", 5000, 6000, "ANTI_UPD"),
+]
+
+
+def _tabix_bin(start, end):
+    """Return the smallest tabix bin holding [start, end)"""
+    end -= 1
+    for bits, first in reversed(region.TABIX_LEVELS):
+        if start >> bits == end >> bits:
+            return first + (start >> bits)
+    return 0
+
+
+def write_tabix(path, lines, block_size=64):
+    """Write BED 'lines' of (chrom, start, end, ...) bgzip compressed in small
+    blocks, indexed as by 'tabix -p bed' in 'path'.tbi"""
+    texts = [("\t".join(str(field) for field in line) + "\n").encode() for line in lines]
+    data = b"".join(texts)
+    write_bgzf(path, data, block_size)
+    with open(path, "rb") as filestream:
+        compressed = filestream.read()
+    block_offsets, position = [], 0
+    while position < len(compressed):
+        block_offsets.append(position)
+        position += bgzf._block_size(compressed, position)
+
+    def virtual(offset):
+        return block_offsets[offset // block_size] << 16 | offset % block_size
+
+    references = {}
+    offset = 0
+    for line, text in zip(lines, texts):
+        bins, linear = references.setdefault(line[0], ({}, {}))
+        chunk = [virtual(offset), virtual(offset + len(text))]
+        chunks = bins.setdefault(_tabix_bin(line[1], line[2]), [])
+        if chunks and chunks[-1][1] == chunk[0]:
+            chunks[-1][1] = chunk[1]
+        else:
+            chunks.append(chunk)
+        for window in range(line[1] >> 14, ((line[2] - 1) >> 14) + 1):
+            linear.setdefault(window, chunk[0])
+        offset += len(text)
+
+    names = b"".join(name.encode() + b"\0" for name in references)
+    index = struct.pack("<4s8i", b"TBI\x01", len(references), 0, 1, 2, 3, ord("#"), 0, len(names))
+    index += names
+    for bins, linear in references.values():
+        index += struct.pack("<i", len(bins))
+        for number, chunks in bins.items():
+            index += struct.pack("<Ii", number, len(chunks))
+            index += b"".join(struct.pack("<QQ", *chunk) for chunk in chunks)
+        windows = [linear.get(window, 0) for window in range(max(linear) + 1)]
+        index += struct.pack("<i{}Q".format(len(windows)), len(windows), *windows)
+    write_bgzf(path + ".tbi", index)
+
+
+def test_parse_region():
+    # GIVEN regions as written for samtools and tabix
+    # THEN they are 0-based and half-open, whole chromosomes without window
+    assert region.parse_region("chr15") == ("chr15", None, None)
+    assert region.parse_region("15:20,000,001-30,000,000") == ("15", 20000000, 30000000)
+    for text in ("chr15:", "chr15:30-20", "15:0-10"):
+        with pytest.raises(ValueError):
+            region.parse_region(text)
+    with pytest.raises(ValueError, match="unknown chromosome"):
+        chrom.plot_upd_sites(upd_sites_example, region="chrQ")
+
+
+def test_wig_blocks(tmpdir):
+    # GIVEN a WIG file of two chromosomes
+    wig = tmpdir.join("two.wig")
+    wig.write(
+        "track x\nfixedStep chrom=chr1 start=1 step=10\n1\n2\n"
+        "fixedStep chrom=chr2 start=1 step=10\n3\n"
+    )
+    data = wig.read_binary()
+    # THEN the declarations are found without parsing the values
+    blocks = region.wig_blocks(data)
+    assert [(name, data[start:end].count(b"\n")) for name, start, end in blocks] == [
+        ("chr1", 3),
+        ("chr2", 2),
+    ]
+    chr2 = data[data.index(b"fixedStep chrom=chr2") :]
+    assert region.read_wig_region(str(wig), region.parse_region("2")) == chr2
+
+
+def test_wig_offsets_cached(tmpdir, monkeypatch):
+    # GIVEN a WIG file of two chromosomes read by region with a cache
+    wig = tmpdir.join("two.wig")
+    wig.write("fixedStep chrom=chr1 start=1 step=10\n1\nfixedStep chrom=chr2 start=1 step=10\n3\n")
+    cache_dir = str(tmpdir.join("cache"))
+    chr2 = region.read_wig_region(str(wig), region.parse_region("2"), cache_dir)
+    # WHEN reading regions again, also after the whole file is cached
+    monkeypatch.setattr(region, "wig_blocks", lambda data: pytest.fail("file scanned again"))
+    assert region.read_wig_region(str(wig), region.parse_region("chr2"), cache_dir) == chr2
+    chrom.plot_coverage_wig(str(wig), outd=str(tmpdir), engine="raster", cache_dir=cache_dir)
+    # THEN the offsets are read from the cache instead of scanning the file
+    assert region.read_wig_region(str(wig), region.parse_region("1"), cache_dir).count(b"\n") == 2
+    assert len(os.listdir(cache_dir)) == 2
+
+
+def test_tabix_region(tmpdir):
+    # GIVEN sites bgzip compressed in blocks of a few lines and indexed with tabix
+    path = str(tmpdir.join("sites.bed.gz"))
+    write_tabix(path, SITES)
+    # THEN only the lines that may overlap a region are read
+    lines = bgzf.read_input(path).splitlines(keepends=True)
+    assert region.read_tabix_region(path, region.parse_region("chr2")) == b"".join(lines[2:4])
+    window = region.parse_region("2:29,000,001-31,000,000")
+    assert region.read_tabix_region(path, window) == lines[3]
+    assert region.read_tabix_region(path, region.parse_region("chr7")) == b""
+
+
+def test_plot_region(tmpdir):
+    # GIVEN sites indexed with tabix
+    path = str(tmpdir.join("sites.bed.gz"))
+    write_tabix(path, SITES)
+    # WHEN drawing chromosome 2 of them
+    outfiles = chrom.plot_upd_sites(
+        path, outd=str(tmpdir), engine="raster", region="chr2", euploid=True
+    )
+    # THEN only its image is written, named as for the whole input
+    assert outfiles == [str(tmpdir.join("sites_2.png"))]
+    # WHEN drawing a window of 2 Mb around the second site
+    outfiles = chrom.plot_upd_sites(
+        path, outd=str(tmpdir), engine="raster", region="2:29000001-31000000"
+    )
+    # THEN the site, with its padding, is drawn from the middle to 85% of the width
+    alpha = imread(outfiles[0])[0, :, 3]
+    assert numpy.isclose(alpha.mean(), 0.35, atol=0.01)
+    width = len(alpha)
+    assert alpha[width // 2 + 1 : width * 17 // 20 - 1].all()
+    assert not alpha[: width // 2 - 1].any() and not alpha[width * 17 // 20 + 1 :].any()
+
+
+def test_plot_coverage_region(tmpdir):
+    # GIVEN a window of the coverage of chromosome 1
+    window = "chr1:100,000,001-100,500,000"
+    # WHEN drawing it from WIG
+    outfiles = chrom.plot_coverage_wig(
+        coverage_example, outd=str(tmpdir), engine="raster", region=window
+    )
+    # THEN the window is stretched over the image
+    image = imread(outfiles[0])
+    assert outfiles == [str(tmpdir.join("coverage_chr1.png"))]
+    assert image[-1, :, 3].all()  # coverage all through, no drop at the data end
+    # THEN a track pyramid of it draws the same
+    indexed = chrom.index_track(coverage_example, str(tmpdir.join("coverage.pyramid")))
+    pyramid_files = chrom.plot_coverage_wig(
+        indexed, outd=str(tmpdir.join("pyramid")), engine="raster", region=window
+    )
+    assert numpy.abs(imread(pyramid_files[0]) - image)[:, :, 3].mean() < 0.05
@@ -0,0 +1,161 @@
+"""Pytests for Chromograph's render server"""
+import base64
+import json
+import logging
+import os
+import signal
+import threading
+import time
+import urllib.error
+import urllib.request
+import pytest
+from chromograph import cytoband_example, upd_regions_example
+from chromograph.server import QueueFull, RenderService, make_server
+
+
+@pytest.fixture(scope="module")
+def server_url():
+    server = make_server(port=0, workers=2, queue=2)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield "http://{}:{}".format(*server.server_address[:2])
+    server.shutdown()
+    server.server_close()
+    server.service.shutdown()
+
+
+def _request(url, body=None):
+    data = json.dumps(body).encode() if body is not None else None
+    try:
+        with urllib.request.urlopen(url, data) as response:
+            return response.status, json.loads(response.read())
+    except urllib.error.HTTPError as error:
+        return error.code, json.loads(error.read())
+
+
+def test_health(server_url):
+    # THEN the server reports being up
+    assert _request(server_url + "/health") == (200, {"status": "ok", "workers": 2})
+
+
+def test_render_paths(server_url, tmpdir):
+    # GIVEN a request for ideograms
+    request = {
+        "operation": "ideogram",
+        "input": os.path.abspath(cytoband_example),
+        "outd": str(tmpdir),
+        "options": {"engine": "raster"},
+    }
+    # WHEN rendering
+    status, body = _request(server_url + "/render", request)
+    # THEN the written files are returned
+    assert status == 200
+    assert str(tmpdir.join("cytoband_chr1.png")) in body["outfiles"]
+    assert all(os.path.exists(outfile) for outfile in body["outfiles"])
+
+
+def test_render_png(server_url, tmpdir):
+    # GIVEN concurrent requests for UPD regions as PNG
+    request = {
+        "operation": "regions",
+        "input": os.path.abspath(upd_regions_example),
+        "outd": str(tmpdir),
+        "return": "png",
+    }
+    results = []
+    threads = [
+        threading.Thread(target=lambda: results.append(_request(server_url + "/render", request)))
+        for _ in range(2)
+    ]
+    # WHEN rendering
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    # THEN both get the images as PNG bytes, rendered without writing files
+    for status, body in results:
+        assert status == 200
+        image = base64.b64decode(body["images"][str(tmpdir.join("upd_regions_12.png"))])
+        assert image.startswith(b"\x89PNG")
+    assert tmpdir.listdir() == []
+    metrics = _request(server_url + "/metrics")[1]
+    assert metrics["operations"]["regions"]["jobs"] >= 2
+
+
+def test_render_bad_request(server_url, caplog):
+    # GIVEN requests with an unknown operation and a missing input file
+    status, body = _request(server_url + "/render", {"operation": "nope", "input": "x"})
+    assert status == 400 and "operation" in body["error"]
+    status, body = _request(server_url + "/render", {"operation": "sites", "input": "/no.bed"})
+    assert status == 500 and "FileNotFoundError" in body["error"]
+    # THEN failed renders are logged as errors
+    errors = [record for record in caplog.records if record.levelno == logging.ERROR]
+    assert errors and "/no.bed" in errors[-1].getMessage()
+
+
+def test_service_rejects_when_full(tmpdir):
+    # GIVEN a service with room for one job
+    service = RenderService(workers=1, queue=0)
+    try:
+        options = {"engine": "raster", "outd": str(tmpdir)}
+        future = service.submit("ideogram", cytoband_example, options)
+        # THEN a second job is rejected until the first is done
+        with pytest.raises(QueueFull):
+            service.submit("ideogram", cytoband_example, {})
+        future.result()
+        assert service.metrics()["rejected"] == 1
+    finally:
+        service.shutdown()
+
+
+def test_service_starts_workers():
+    # GIVEN a service with two workers
+    service = RenderService(workers=2, queue=0)
+    try:
+        # WHEN starting it
+        service.start()
+        # THEN both workers run before any job is submitted
+        processes = service._executor._processes
+        assert len(processes) == 2
+        assert all(process.is_alive() for process in processes.values())
+    finally:
+        service.shutdown()
+
+
+def test_service_releases_slot_on_failed_submit(monkeypatch):
+    # GIVEN a service with room for one job, whose pool fails to take jobs
+    service = RenderService(workers=1, queue=0)
+    try:
+
+        def fail(*args):
+            raise RuntimeError("pool is shut down")
+
+        monkeypatch.setattr(service._executor, "submit", fail)
+        # THEN the error is raised and the job does not keep its slot
+        for _ in range(2):
+            with pytest.raises(RuntimeError):
+                service.submit("ideogram", cytoband_example, {})
+        assert service.metrics()["rejected"] == 0
+    finally:
+        service.shutdown()
+
+
+def test_service_replaces_broken_pool(tmpdir):
+    # GIVEN a started service whose worker is killed
+    service = RenderService(workers=1, queue=0)
+    try:
+        service.start()
+        broken = service._executor
+        for pid in broken._processes:
+            os.kill(pid, signal.SIGKILL)
+        deadline = time.time() + 10
+        while not broken._broken and time.time() < deadline:
+            time.sleep(0.05)
+        # WHEN submitting a job
+        options = {"engine": "raster", "outd": str(tmpdir)}
+        future = service.submit("ideogram", cytoband_example, options)
+        # THEN it is rendered by a new pool
+        assert str(tmpdir.join("cytoband_chr1.png")) in future.result()
+        assert service._executor is not broken
+    finally:
+        service.shutdown()
@@ -0,0 +1,61 @@
+"""Pytests for Chromograph's startup time"""
+import os
+import subprocess
+import sys
+import time
+import pytest
+
+STARTUP_BUDGET = 0.25  # seconds on top of starting a bare interpreter
+HEAVY_MODULES = ("matplotlib", "numpy", "pandas")
+# lazy_import registers numpy and pandas in sys.modules unloaded, these are loaded with them
+LOADED_MODULES = ("matplotlib", "numpy.linalg", "pandas.core.frame")
+timed = pytest.mark.skipif(
+    not os.environ.get("CHROMOGRAPH_TIMING_TESTS"),
+    reason="wall time depends on the machine, set CHROMOGRAPH_TIMING_TESTS=1 to run",
+)
+
+
+def _imported(code, modules):
+    """Return those of 'modules' in sys.modules after running 'code' in a new interpreter"""
+    code += "\nimport sys; print([m for m in {!r} if m in sys.modules])".format(modules)
+    result = subprocess.run([sys.executable, "-c", code], check=True, capture_output=True)
+    return result.stdout.decode().strip().splitlines()[-1]
+
+
+def _run_time(*args):
+    """Best wall time of three runs of the interpreter with 'args'"""
+    times = []
+    for _ in range(3):
+        start = time.perf_counter()
+        subprocess.run([sys.executable, *args], check=True, capture_output=True)
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+def test_import_is_lazy():
+    # GIVEN the package is imported
+    # THEN numpy, pandas and Matplotlib are not imported
+    assert _imported("import chromograph", HEAVY_MODULES) == "[]"
+    # THEN importing the command line module, or printing the version, loads none of them
+    assert _imported("import chromograph.chromograph", LOADED_MODULES) == "[]"
+    version = (
+        "import sys; sys.argv[1:] = ['--version']\n"
+        "from chromograph.chromograph import main\n"
+        "try:\n    main()\nexcept SystemExit:\n    pass"
+    )
+    assert _imported(version, LOADED_MODULES) == "[]"
+
+
+@timed
+def test_import_time():
+    # THEN importing chromograph stays within budget
+    bare = _run_time("-c", "pass")
+    assert _run_time("-c", "import chromograph") - bare < STARTUP_BUDGET
+
+
+@timed
+def test_version_time():
+    # THEN 'chromograph --version' stays within budget
+    bare = _run_time("-c", "pass")
+    version = _run_time("-c", "from chromograph.chromograph import main; main()", "--version")
+    assert version - bare < STARTUP_BUDGET
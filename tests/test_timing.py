@@ -0,0 +1,69 @@
+"""Pytests for Chromograph's stage timing"""
+import json
+import chromograph.chromograph as chrom
+from chromograph import coverage_example, timing
+
+
+def test_stages_nest():
+    # GIVEN stages timed within a recording
+    with timing.recording() as stages:
+        with timing.stage("plot", input="a.bed"):
+            with timing.stage("read") as fields:
+                fields["rows"] = 10
+            list(timing.timed("transform", ["chr1", "chr2"], lambda chrom: {"chrom": chrom}))
+    # THEN every record holds the fields of the stages around it
+    assert [(record["stage"], record.get("chrom")) for record in stages] == [
+        ("read", None),
+        ("transform", "chr1"),
+        ("transform", "chr2"),
+        ("plot", None),
+    ]
+    assert stages[0]["rows"] == 10 and all(record["input"] == "a.bed" for record in stages)
+    assert stages[-1]["wall"] >= stages[0]["wall"] and stages[-1]["cpu"] >= 0
+    # THEN stages outside of a recording are not recorded
+    with timing.stage("read"):
+        pass
+    assert not timing.recording_active() and len(stages) == 4
+
+
+def test_profile_json(tmpdir, capsys):
+    # GIVEN a coverage plot timed to a JSON file
+    profile = str(tmpdir.join("profile.json"))
+    chrom.plot_coverage_wig(
+        coverage_example, outd=str(tmpdir), engine="raster", profile_json=profile
+    )
+    with open(profile) as filestream:
+        recorded = json.load(filestream)
+    # THEN every stage is recorded, the chromosome drawn with its vertices
+    assert set(recorded["totals"]) == {
+        "plot",
+        "read",
+        "transform",
+        "render",
+        "draw",
+        "encode",
+        "write",
+    }
+    (render,) = [record for record in recorded["stages"] if record["stage"] == "render"]
+    assert render["operation"] == "coverage" and render["chrom"] == "chr1"
+    assert render["vertices"] > 0 and render["wall"] > 0
+    (read,) = [record for record in recorded["stages"] if record["stage"] == "read"]
+    assert read["rows"] > 50000
+    # THEN nothing is printed
+    assert capsys.readouterr().out == ""
+
+
+def test_profile_workers(tmpdir):
+    # GIVEN ideograms of three chromosomes drawn in two processes
+    bed = tmpdir.join("cytoband.bed")
+    bed.write("#chrom\n" + "".join("chr{}\t0\t1000\tp1\tgneg\n".format(name) for name in "235"))
+    with timing.recording() as stages:
+        chrom.plot_ideogram(str(bed), outd=str(tmpdir), engine="raster", jobs=2)
+    # THEN the renders of the workers are recorded once per chromosome
+    renders = [record for record in stages if record["stage"] == "render"]
+    assert [(record["operation"], record["chrom"]) for record in renders] == [
+        ("ideogram", "chr2"),
+        ("ideogram", "chr3"),
+        ("ideogram", "chr5"),
+    ]
+    assert len([record for record in stages if record["stage"] == "read"]) == 1
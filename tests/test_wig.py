@@ -0,0 +1,46 @@
+"""Pytests for Chromograph's WIG and bedGraph readers"""
+import os
+import chromograph.chromograph as chrom
+
+
+def test_wig_to_dataframe(tmpdir):
+    # GIVEN a wig file with a NaN, a value above WIG_MAX and two chromosomes
+    wig = tmpdir.join("test.wig")
+    wig.write("track type=wiggle_0\nfixedStep chrom=chr1 start=1 step=10\n1.5\nNaN\n"
+              "99\nfixedStep chrom=chr2 start=1 step=10\n2\n")
+    # THEN NaN is read as 0, values are clamped and chromosomes followed by
+    # another declaration are padded with zeros
+    frame = chrom.wig_to_dataframe(str(wig), 10, chrom.WIG_FORMAT)
+    chr1 = frame[frame.chrom == "chr1"]
+    assert list(chr1.coverage) == [1.5, 0, chrom.WIG_MAX, 0, 0]
+    assert list(chr1.pos) == [0, 10, 20, 31, chrom.CHROM_END_POS]
+    chr2 = frame[frame.chrom == "chr2"]
+    assert list(chr2.coverage) == [2.0]
+    assert list(chr2.pos) == [0]
+
+
+def test_sparse_tracks(tmpdir):
+    # GIVEN the same sparse track on variableStep and bedGraph format
+    wig = tmpdir.join("sparse.wig")
+    wig.write("variableStep chrom=chr2 span=10\n1 5\n11 7\n"
+              "variableStep chrom=chr1 span=10\n101 NaN\n201 99\n")
+    bedgraph = tmpdir.join("sparse.bedgraph")
+    bedgraph.write("track type=bedGraph\nchr2\t0\t10\t5\nchr2\t10\t20\t7\n"
+                   "chr1\t200\t210\t99\nchr1\t100\t110\tNaN\n")
+    # WHEN reading them
+    frames = [chrom.variable_step_to_dataframe(str(wig), chrom.WIG_FORMAT),
+              chrom.bedgraph_to_dataframe(str(bedgraph), chrom.WIG_FORMAT)]
+    # THEN every interval is a flat top between drops to 0, in order
+    for frame in frames:
+        chr1 = frame[frame.chrom == "chr1"]
+        assert list(chr1.pos) == [100, 100, 110, 110, 200, 200, 210, 210]
+        assert list(chr1.coverage) == [0, 0, 0, 0, 0, chrom.WIG_MAX, chrom.WIG_MAX, 0]
+        chr2 = frame[frame.chrom == "chr2"]
+        assert list(chr2.pos) == [0, 0, 10, 10, 10, 10, 20, 20]
+        assert list(chr2.coverage) == [0, 5, 5, 0, 0, 7, 7, 0]
+    # AND both are plotted the same way
+    outfiles = [chrom.plot_coverage_wig(str(track), outd=str(tmpdir.join(track.ext[1:])))
+                for track in (wig, bedgraph)]
+    assert [os.path.basename(f) for f in outfiles[0]] == ["sparse_chr1.png", "sparse_chr2.png"]
+    for wig_png, bedgraph_png in zip(*outfiles):
+        assert open(wig_png, "rb").read() == open(bedgraph_png, "rb").read()